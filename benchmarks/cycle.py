@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+End-to-end cycle benchmark: replay a recorded auto-fix or feature cycle
+with no npm and no network (see fetti_replay.py).
+
+  # 1) record once, for real (npm + API keys), in a scratch worktree at HEAD
+  python3 benchmarks/cycle.py record /tmp/bundle --target auto
+
+  # 2) replay as often as you like
+  python3 benchmarks/cycle.py replay /tmp/bundle --target auto [--repeat 5] [--latency 1]
+
+Targets: auto = fetti_auto_ai.run_plan_once(), feature = fetti_feature_agent.run_plan().
+
+Every run starts from a clean worktree at the bundle's commit with the
+current fetti*.py copied in (so a replay measures today's tools against
+yesterday's npm/model behaviour), FETTI_LEDGER=0 and FETTI_HISTORY=0 so
+no earlier state skips or reorders steps. node_modules and .env are
+symlinked in from this checkout when recording.
+
+A replay reports wall and in-process cycle times, and fails (exit 1) if
+the bundle runs out of events or if two repetitions leave different
+results or working-tree diffs – replays must be deterministic.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULT_TAG = "FETTI_CYCLE_RESULT "
+TARGETS = {
+    "auto": ("fetti_auto_ai", "run_plan_once"),
+    "feature": ("fetti_feature_agent", "run_plan"),
+}
+
+CHILD = """
+import json, sys, time, traceback
+module, func = sys.argv[1], sys.argv[2]
+started = time.perf_counter()
+ok, error = None, None
+try:
+    ok = bool(getattr(__import__(module), func)())
+except BaseException as e:
+    error = "".join(traceback.format_exception_only(type(e), e)).strip()
+print(%r + json.dumps({"ok": ok, "error": error, "cycle_ms": round((time.perf_counter() - started) * 1000, 3)}))
+""" % RESULT_TAG
+
+
+def _git(*args: str, cwd: Path = PROJECT_ROOT) -> str:
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+
+def prepare(worktree: Path, commit: str, link_deps: bool) -> None:
+    """Check out `commit` into a clean worktree and copy the current tools in."""
+    if not (worktree / ".git").exists():
+        if worktree.exists():
+            shutil.rmtree(worktree)
+        _git("worktree", "add", "--detach", str(worktree), commit)
+    _git("checkout", "--quiet", "--force", "--detach", commit, cwd=worktree)
+    _git("clean", "-fdxq", cwd=worktree)
+    for tool in PROJECT_ROOT.glob("fetti*.py"):
+        shutil.copy2(tool, worktree / tool.name)
+    if link_deps:
+        for name in ("node_modules", ".env"):
+            if (PROJECT_ROOT / name).exists():
+                os.symlink(PROJECT_ROOT / name, worktree / name)
+
+
+def tree_digest(worktree: Path) -> str:
+    """Hash of what the cycle changed: the tracked diff plus untracked files."""
+    h = hashlib.sha256(_git("diff", "HEAD", "--binary", cwd=worktree).encode())
+    for rel in sorted(_git("ls-files", "--others", "--exclude-standard", cwd=worktree).splitlines()):
+        path = worktree / rel
+        if path.is_file() and not path.is_symlink():
+            h.update(rel.encode() + b"\0" + path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def run_once(worktree: Path, target: str, env: Dict[str, str], verbose: bool) -> Dict[str, Any]:
+    module, func = TARGETS[target]
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD, module, func],
+        cwd=worktree,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if verbose:
+        sys.stderr.write(proc.stdout)
+    lines = [l for l in proc.stdout.splitlines() if l.startswith(RESULT_TAG)]
+    result = json.loads(lines[-1][len(RESULT_TAG):]) if lines else {
+        "ok": None, "error": f"child exited {proc.returncode} without a result", "cycle_ms": None
+    }
+    result["wall_ms"] = round(wall_ms, 3)
+    result["tree"] = tree_digest(worktree)
+    return result
+
+
+def _stats(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def _env(**extra: str) -> Dict[str, str]:
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("FETTI_RECORD", "FETTI_REPLAY"))}
+    env.update(FETTI_HISTORY="0", FETTI_LEDGER="0", FETTI_DAEMON="0", **extra)
+    return env
+
+
+def record(args: argparse.Namespace, worktree: Path) -> int:
+    bundle = args.bundle.resolve()
+    if (bundle / "events.jsonl").exists():
+        print(f"[CYCLE] {bundle} already holds a recording; pick a new directory.", file=sys.stderr)
+        return 2
+    bundle.mkdir(parents=True, exist_ok=True)
+    commit = _git("rev-parse", "HEAD").strip()
+    prepare(worktree, commit, link_deps=True)
+    result = run_once(worktree, args.target, _env(FETTI_RECORD=str(bundle)), verbose=True)
+    manifest = json.loads((bundle / "manifest.json").read_text()) if (bundle / "manifest.json").exists() else {
+        "version": 1, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "dirty": False
+    }
+    # The worktree carries the current tools, so pin the replay to the commit we checked out.
+    manifest.update(commit=commit, target=args.target, result=result)
+    (bundle / "manifest.json").write_text(json.dumps(manifest, indent=2) + "\n")
+    print(json.dumps(result, indent=2))
+    return 0 if result["error"] is None else 1
+
+
+def replay(args: argparse.Namespace, worktree: Path) -> int:
+    bundle = args.bundle.resolve()
+    manifest = json.loads((bundle / "manifest.json").read_text())
+    commit = manifest.get("commit")
+    if not commit:
+        print(f"[CYCLE] {bundle}/manifest.json has no commit to replay from.", file=sys.stderr)
+        return 2
+    target = args.target or manifest.get("target") or "auto"
+
+    runs = []
+    for i in range(max(1, args.repeat)):
+        prepare(worktree, commit, link_deps=False)
+        env = _env(
+            FETTI_REPLAY=str(bundle),
+            FETTI_REPLAY_SESSION=f"cycle-{uuid.uuid4().hex[:8]}",
+            FETTI_REPLAY_LATENCY=str(args.latency),
+        )
+        result = run_once(worktree, target, env, verbose=args.verbose)
+        runs.append(result)
+        print(f"[CYCLE] run {i + 1}: ok={result['ok']} wall {result['wall_ms']:.0f}ms tree {result['tree']}"
+              + (f" error: {result['error']}" if result["error"] else ""), file=sys.stderr)
+    shutil.rmtree(bundle / "cursors", ignore_errors=True)
+
+    failures = [f"run {i + 1}: {r['error']}" for i, r in enumerate(runs) if r["error"]]
+    if len({(r["ok"], r["tree"]) for r in runs}) > 1:
+        failures.append("repetitions disagree on the result or the resulting tree")
+    recorded = manifest.get("result") or {}
+    if recorded.get("ok") is not None and runs[0]["ok"] != recorded["ok"]:
+        failures.append(f"replay returned ok={runs[0]['ok']} but the recording returned ok={recorded['ok']}")
+
+    report = {
+        "bundle": str(bundle),
+        "commit": commit,
+        "target": target,
+        "latency": args.latency,
+        "runs": runs,
+        "wall": _stats([r["wall_ms"] for r in runs]),
+        "cycle": _stats([r["cycle_ms"] for r in runs if r["cycle_ms"] is not None] or [0.0]),
+        "recorded_cycle_ms": recorded.get("cycle_ms"),
+        "failures": failures,
+    }
+    print(json.dumps(report, indent=2))
+    for failure in failures:
+        print(f"[CYCLE] ❌ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Record or replay a Fetti auto-fix / feature cycle")
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("bundle", type=Path)
+    parser.add_argument("--target", choices=list(TARGETS), help="Default: auto (replay: the recorded target).")
+    parser.add_argument("--repeat", type=int, default=3, help="Replay repetitions.")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Sleep for the recorded durations times this factor (0 = as fast as possible).")
+    parser.add_argument("--workdir", type=Path, default=Path(tempfile.gettempdir()) / "fetti-cycle")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch worktree afterwards.")
+    parser.add_argument("--verbose", action="store_true", help="Echo the cycle's output while replaying.")
+    args = parser.parse_args(argv)
+    if args.mode == "record" and not args.target:
+        args.target = "auto"
+
+    worktree = args.workdir.resolve() / "worktree"
+    worktree.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        return record(args, worktree) if args.mode == "record" else replay(args, worktree)
+    finally:
+        if not args.keep and worktree.exists():
+            subprocess.run(["git", "worktree", "remove", "--force", str(worktree)], cwd=PROJECT_ROOT,
+                           capture_output=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
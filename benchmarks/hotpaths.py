@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Hot-path timings, run *inside* a synthetic repo (see synth.py / run.py).
+
+run.py copies the fetti_*.py tools and this file into the synthetic tree,
+so every module's PROJECT_ROOT points at it exactly as in a real checkout.
+Each benchmark runs `warmup` untimed and `repeat` timed iterations; setup
+work (cache resets, restoring edited files) happens outside the timer.
+Prints one JSON object: {name: {n, min_ms, median_ms, mean_ms, stdev_ms, p90_ms}}.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import fetti_ai_log  # noqa: E402
+import fetti_brain  # noqa: E402
+import fetti_brain_loader  # noqa: E402
+import fetti_error_logger  # noqa: E402
+import fetti_feature_agent  # noqa: E402
+import fetti_plan  # noqa: E402
+import fetti_repo_map  # noqa: E402
+from fetti_git import git_state  # noqa: E402
+
+
+def bench(
+    fn: Callable[[], Any],
+    repeat: int,
+    warmup: int = 1,
+    setup: Optional[Callable[[], Any]] = None,
+) -> Dict[str, float]:
+    times: List[float] = []
+    sink = io.StringIO()
+    for i in range(warmup + repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(sink):
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+        sink.seek(0)
+        sink.truncate()
+        if i >= warmup:
+            times.append(elapsed * 1000)
+    ordered = sorted(times)
+    return {
+        "n": len(times),
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "stdev_ms": round(statistics.stdev(ordered), 3) if len(ordered) > 1 else 0.0,
+        "p90_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 3),
+    }
+
+
+def _edit_batch(paths: List[str], count: int = 20) -> List[dict]:
+    edits = []
+    for rel in paths[:count]:
+        text = (ROOT / rel).read_text()
+        before = text.splitlines()[0]
+        edits.append({"file": rel, "before": before, "after": before + " // bench"})
+    return edits
+
+
+def run(repeat: int, only: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+    files = [p for p in git_state().git("ls-files").splitlines() if p.startswith(("app/", "components/", "lib/"))]
+    build_log = (ROOT / "logs" / "build_sample.log").read_text()
+    log_tail = build_log[-20000:]
+    # What the doctor keeps per step (fetti_doctor.TAIL_LINES); `fetti_brain
+    # scan` and the learner match whole logs, hence brain_match_build_log.
+    doctor_tail = "\n".join(build_log.splitlines()[-400:])
+    edits = _edit_batch([p for p in files if p.endswith(".ts")])
+    originals = {e["file"]: (ROOT / e["file"]).read_text() for e in edits}
+    candidates = files[::max(1, len(files) // 50)][:50]
+
+    def restore() -> None:
+        for rel, text in originals.items():
+            (ROOT / rel).write_text(text)
+
+    def reset_brain() -> None:
+        fetti_brain._CACHE.clear()
+
+    def reset_plan() -> None:
+        fetti_plan._CACHE.clear()
+
+    def reset_digest() -> None:
+        fetti_brain_loader._DIGEST_CACHE = None
+
+    def reset_repo_map() -> None:
+        fetti_repo_map._CACHE.clear()
+
+    cases: Dict[str, Callable[[], Dict[str, float]]] = {
+        "tree_hash_first": lambda: bench(git_state().tree_hash, 1, warmup=0),
+        "tree_hash_warm": lambda: bench(git_state().tree_hash, repeat),
+        "repo_hint": lambda: bench(fetti_feature_agent.build_repo_hint, repeat),
+        "repo_hint_cold": lambda: bench(fetti_feature_agent.build_repo_hint, repeat, setup=reset_repo_map),
+        "search_code_rare": lambda: bench(lambda: fetti_feature_agent.search_code("useLeadStatus"), repeat),
+        "search_code_common": lambda: bench(lambda: fetti_feature_agent.search_code("NextResponse"), repeat),
+        "apply_json_edits_20": lambda: bench(lambda: fetti_feature_agent.apply_json_edits(edits), repeat, setup=restore),
+        "plan_parse_cold": lambda: bench(fetti_plan.load_plan, repeat, setup=reset_plan),
+        "plan_parse_warm": lambda: bench(fetti_plan.load_plan, repeat),
+        "brain_load_cold": lambda: bench(lambda: fetti_brain.get_brain().matcher, repeat, setup=reset_brain),
+        "brain_context_all": lambda: bench(fetti_brain_loader.build_brain_context, repeat),
+        "brain_context_selected": lambda: bench(
+            lambda: fetti_brain_loader.build_brain_context(candidate_files=candidates, log_text=log_tail, task="leads"),
+            repeat,
+        ),
+        "brain_match_doctor_tail": lambda: bench(lambda: fetti_brain.recommendations_for(doctor_tail), repeat),
+        "brain_match_build_log": lambda: bench(
+            lambda: fetti_brain.get_brain().matcher.scan_file(ROOT / "logs" / "build_sample.log"), repeat
+        ),
+        "error_record": lambda: bench(
+            lambda: fetti_error_logger.record_error("bench", "Build", log_tail, exit_code=1), repeat
+        ),
+        "error_digest_cold": lambda: bench(fetti_brain_loader.error_digest, repeat, setup=reset_digest),
+        "ai_log_tail": lambda: bench(lambda: fetti_ai_log.tail(20), repeat),
+        "ai_log_find_step": lambda: bench(lambda: list(fetti_ai_log.find_sessions(step="Build")), repeat),
+    }
+    results = {}
+    try:
+        for name, case in cases.items():
+            if only and name not in only:
+                continue
+            results[name] = case()
+    finally:
+        restore()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Time Fetti hot paths in the current synthetic repo")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--only", help="Comma-separated benchmark names.")
+    args = parser.parse_args(argv)
+    only = [n.strip() for n in args.only.split(",")] if args.only else None
+    print(json.dumps(run(max(1, args.repeat), only)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the Fetti hot paths.
+
+  python3 benchmarks/run.py [--sizes 1k,10k,100k] [--repeat 7] [--out results.json]
+                            [--baseline old.json --max-ratio 1.3]
+
+For each size a synthetic repo is generated (benchmarks/synth.py; cached
+under --workdir and only rebuilt when its parameters change), the current
+fetti_*.py tools are copied into it, and benchmarks/hotpaths.py times
+build_repo_hint, search_code, apply_json_edits, plan parsing, brain loading
+and build_brain_context, brain pattern matching, error journal writes and
+the digest, AI log lookups and the working-tree hash.
+
+Regression gates (exit 1 on failure):
+  - benchmarks/thresholds.json: absolute median budgets in ms per size;
+  - --baseline: a previous results file; a median more than --max-ratio
+    times the baseline (and at least --min-delta-ms slower) fails.
+
+Needs only python3 and git; no npm, no network, no API keys.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+import synth  # noqa: E402
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+THRESHOLDS_PATH = BENCH_DIR / "thresholds.json"
+
+
+def prepare(size: str, workdir: Path, tasks: int, log_mb: float) -> Path:
+    dest = workdir / f"repo-{size}"
+    started = time.monotonic()
+    built = synth.write_tree(dest, SIZES[size])
+    synth.write_state(dest, tasks=tasks, log_mb=log_mb)
+    for tool in PROJECT_ROOT.glob("fetti*.py"):
+        shutil.copy2(tool, dest / tool.name)
+    (dest / "benchmarks").mkdir(exist_ok=True)
+    shutil.copy2(BENCH_DIR / "hotpaths.py", dest / "benchmarks" / "hotpaths.py")
+    print(f"[BENCH] {size}: {'generated' if built else 'reused'} {dest} ({time.monotonic() - started:.1f}s)",
+          file=sys.stderr)
+    return dest
+
+
+def run_size(dest: Path, repeat: int, only: Optional[str]) -> Dict[str, Any]:
+    cmd = [sys.executable, str(dest / "benchmarks" / "hotpaths.py"), "--repeat", str(repeat)]
+    if only:
+        cmd += ["--only", only]
+    env = dict(os.environ, FETTI_HISTORY="0", FETTI_DAEMON="0")
+    out = subprocess.run(cmd, cwd=dest, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def check(
+    results: Dict[str, Dict[str, Any]],
+    thresholds: Dict[str, Dict[str, float]],
+    baseline: Optional[Dict[str, Dict[str, Any]]],
+    max_ratio: float,
+    min_delta_ms: float,
+) -> List[str]:
+    failures = []
+    for size, benches in results.items():
+        for name, stats in benches.items():
+            median = stats["median_ms"]
+            budget = thresholds.get(size, {}).get(name)
+            if budget is not None and median > budget:
+                failures.append(f"{size}/{name}: median {median:.1f}ms over budget {budget:g}ms")
+            old = (baseline or {}).get(size, {}).get(name)
+            if old and median > old["median_ms"] * max_ratio and median - old["median_ms"] > min_delta_ms:
+                failures.append(
+                    f"{size}/{name}: median {median:.1f}ms vs baseline {old['median_ms']:.1f}ms "
+                    f"(> {max_ratio:g}x)"
+                )
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fetti offline hot-path benchmarks")
+    parser.add_argument("--sizes", default="1k,10k", help="Comma-separated from 1k,10k,100k (default 1k,10k).")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--only", help="Comma-separated benchmark names.")
+    parser.add_argument("--tasks", type=int, default=300, help="Plan size (tasks).")
+    parser.add_argument("--log-mb", type=float, default=4.0, help="Size of each synthetic log.")
+    parser.add_argument("--workdir", type=Path, default=Path(tempfile.gettempdir()) / "fetti-bench")
+    parser.add_argument("--out", type=Path, help="Write results JSON here (default: stdout).")
+    parser.add_argument("--baseline", type=Path, help="Previous results JSON to compare against.")
+    parser.add_argument("--max-ratio", type=float, default=1.3)
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore slowdowns smaller than this.")
+    parser.add_argument("--no-thresholds", action="store_true", help="Skip the absolute budgets.")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for size in sizes:
+        dest = prepare(size, args.workdir, args.tasks, args.log_mb)
+        results[size] = run_size(dest, max(1, args.repeat), args.only)
+
+    thresholds = {} if args.no_thresholds else json.loads(THRESHOLDS_PATH.read_text())
+    baseline = json.loads(args.baseline.read_text())["results"] if args.baseline else None
+    failures = check(results, thresholds, baseline, args.max_ratio, args.min_delta_ms)
+
+    head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                          capture_output=True, text=True).stdout.strip()
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": head or None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "tasks": args.tasks,
+            "log_mb": args.log_mb,
+        },
+        "results": results,
+        "failures": failures,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(text + "\n")
+    else:
+        print(text)
+
+    for size, benches in results.items():
+        for name, stats in benches.items():
+            print(f"[BENCH] {size:>4} {name:<24} median {stats['median_ms']:>9.2f}ms  "
+                  f"p90 {stats['p90_ms']:>9.2f}ms  sd {stats['stdev_ms']:>7.2f}", file=sys.stderr)
+    for failure in failures:
+        print(f"[BENCH] ❌ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Fetti Python tools.
+
+Each target is imported in a fresh interpreter (python3 -c "import X"),
+REPEAT times; the best and median wall times are reported. The run fails
+(exit 1) when
+
+  - any target's best time exceeds FETTI_STARTUP_BUDGET_MS (default 300), or
+  - importing a target pulls in a model SDK or python-dotenv – those belong
+    to fetti_llm and must only load on the first model call.
+
+  python3 benchmarks/startup.py [--repeat N] [--budget-ms MS] [--json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+TARGETS = [
+    "fetti",
+    "fetti_doctor",
+    "fetti_doctor_wrapper",
+    "fetti_auto_ai",
+    "fetti_auto_ai_wrapper",
+    "fetti_feature_agent",
+    "fetti_feature_runner",
+    "fetti_history",
+    "fetti_plan",
+]
+HEAVY_MODULES = ("google.generativeai", "openai", "dotenv")
+DEFAULT_BUDGET_MS = 300.0
+
+_PROBE = (
+    "import json, sys; import {module}; "
+    "print(json.dumps([m for m in {heavy!r} if m in sys.modules]))"
+)
+
+
+def _time_import(module: str) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=PROJECT_ROOT, check=True)
+    return time.perf_counter() - started
+
+
+def _heavy_loaded(module: str) -> List[str]:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=PROJECT_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure(repeat: int) -> List[Dict[str, Any]]:
+    baseline = min(_time_import("sys") for _ in range(repeat))
+    results = []
+    for module in TARGETS:
+        times = [_time_import(module) for _ in range(repeat)]
+        results.append({
+            "module": module,
+            "best_ms": round(min(times) * 1000, 1),
+            "median_ms": round(statistics.median(times) * 1000, 1),
+            "over_interpreter_ms": round((min(times) - baseline) * 1000, 1),
+            "heavy_imports": _heavy_loaded(module),
+        })
+    return results
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure Fetti tool startup time")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=float(os.environ.get("FETTI_STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS)),
+        help="Per-module startup budget in ms (env FETTI_STARTUP_BUDGET_MS).",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args(argv)
+
+    results = measure(max(1, args.repeat))
+    failures = []
+    for r in results:
+        if r["best_ms"] > args.budget_ms:
+            failures.append(f"{r['module']}: {r['best_ms']}ms > {args.budget_ms:g}ms budget")
+        if r["heavy_imports"]:
+            failures.append(f"{r['module']}: imports {', '.join(r['heavy_imports'])} at startup")
+
+    if args.json:
+        print(json.dumps({"budget_ms": args.budget_ms, "results": results, "failures": failures}, indent=2))
+    else:
+        print(f"{'module':<24} {'best':>8} {'median':>8} {'+interp':>8}")
+        for r in results:
+            print(f"{r['module']:<24} {r['best_ms']:>6.1f}ms {r['median_ms']:>6.1f}ms {r['over_interpreter_ms']:>6.1f}ms")
+        for failure in failures:
+            print(f"[STARTUP] ❌ {failure}")
+        if not failures:
+            print(f"[STARTUP] ✅ All modules within {args.budget_ms:g}ms, no SDK imports at startup.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Synthetic Next.js-shaped repository generator for the Fetti benchmarks.
+
+  python3 benchmarks/synth.py DEST --files 10000 [--tasks 300] [--log-mb 4]
+
+Produces, deterministically for a given seed:
+
+- app/ routes (page.tsx, layout.tsx, api/**/route.ts), components/**,
+  lib/**, supabase/migrations and a slice of node_modules/ noise, as a git
+  repo with one commit (the tree is what the tools walk and hash);
+- fetti_feature_plan.md with hundreds of tasks and nested sub-bullets;
+- a large fetti_brain.json (file laws over real paths, directory and glob
+  laws, literal and regex error patterns, examples);
+- multi-megabyte logs: logs/fetti_ai_fixes.log (sequenced AI sessions),
+  .fetti/error_journal.jsonl and logs/build_sample.log (a failing build).
+
+The tree is expensive at 100k files and only rebuilt when the parameters
+change; write_state() rewrites the mutable files (plan, brain, logs) and is
+cheap enough to call before every benchmark run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+SEED = 1003
+AREAS = [
+    "leads", "applications", "pricing", "underwriting", "documents", "income", "employers",
+    "benefits", "scenarios", "deals", "compliance", "reports", "settings", "auth", "voice",
+]
+WORDS = [
+    "status", "score", "stability", "override", "merge", "deposit", "preapproval", "lien", "avm",
+    "fee", "mi", "pricer", "guard", "payload", "widget", "table", "card", "form", "panel", "chart",
+]
+# Share of generated files per root; the rest of the budget goes to node_modules noise.
+LAYOUT = (("components", 0.42), ("app", 0.28), ("lib", 0.20), ("supabase", 0.05))
+RARE_TOKEN = "useLeadStatus"
+TREE_MARKER = ".synth.json"
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "bench", "GIT_AUTHOR_EMAIL": "bench@example.invalid",
+    "GIT_COMMITTER_NAME": "bench", "GIT_COMMITTER_EMAIL": "bench@example.invalid",
+    "GIT_AUTHOR_DATE": "2025-01-01T00:00:00Z", "GIT_COMMITTER_DATE": "2025-01-01T00:00:00Z",
+}
+
+
+def _pascal(*parts: str) -> str:
+    return "".join(p[:1].upper() + p[1:] for p in parts)
+
+
+def _component(rng: random.Random, name: str) -> str:
+    hook = RARE_TOKEN if rng.random() < 0.005 else "useMemo"
+    fields = "\n".join(f"  {w}: {rng.choice(['string', 'number', 'boolean'])};" for w in rng.sample(WORDS, 5))
+    return (
+        "'use client';\n\n"
+        f"import {{ {hook} }} from 'react';\n"
+        "import { cn } from '@/lib/utils';\n\n"
+        f"export interface {name}Props {{\n{fields}\n}}\n\n"
+        f"export default function {name}(props: {name}Props) {{\n"
+        f"  const value = {hook}(() => JSON.stringify(props), [props]);\n"
+        f"  return <div className={{cn('{name.lower()}')}}>{{value}}</div>;\n"
+        "}\n"
+    )
+
+
+def _page(name: str) -> str:
+    return (
+        f"import {name}Panel from '@/components/{name.lower()}/{name}Panel';\n\n"
+        f"export default function {name}Page() {{\n"
+        f"  return <{name}Panel />;\n"
+        "}\n"
+    )
+
+
+def _route(rng: random.Random) -> str:
+    method = rng.choice(["GET", "POST", "PUT"])
+    return (
+        "import { NextResponse } from 'next/server';\n\n"
+        f"export async function {method}(request: Request) {{\n"
+        "  const body = await request.json().catch(() => ({}));\n"
+        "  return NextResponse.json({ ok: true, body });\n"
+        "}\n"
+    )
+
+
+def _lib(rng: random.Random, name: str) -> str:
+    lines = [f"export function {name}{_pascal(w)}(input: number): number {{\n  return input * {rng.randint(2, 99)};\n}}\n"
+             for w in rng.sample(WORDS, 4)]
+    return "\n".join(lines)
+
+
+def _sql(rng: random.Random, table: str) -> str:
+    return f"create table if not exists {table} (\n  id uuid primary key,\n  score numeric default {rng.randint(0, 9)}\n);\n"
+
+
+def tree_files(files: int, seed: int = SEED) -> Dict[str, str]:
+    """Relative path -> content for a tree of (about) `files` files."""
+    rng = random.Random(seed)
+    out: Dict[str, str] = {}
+    budget = {root: int(files * share) for root, share in LAYOUT}
+    budget["node_modules"] = files - sum(budget.values())
+
+    for i in range(budget["components"]):
+        area = AREAS[i % len(AREAS)]
+        sub = f"/{WORDS[(i // len(AREAS)) % len(WORDS)]}" if i >= len(AREAS) * 4 else ""
+        name = _pascal(area, WORDS[i % len(WORDS)], str(i))
+        out[f"components/{area}{sub}/{name}.tsx"] = _component(rng, name)
+
+    for i in range(budget["app"]):
+        area = AREAS[i % len(AREAS)]
+        seg = f"{area}/{WORDS[(i // len(AREAS)) % len(WORDS)]}-{i // (len(AREAS) * len(WORDS))}"
+        name = _pascal(area)
+        kind = i % 3
+        if kind == 0:
+            out[f"app/(dashboard)/{seg}/page.tsx"] = _page(name)
+        elif kind == 1:
+            out[f"app/(dashboard)/{seg}/layout.tsx"] = "export default function Layout({ children }) {\n  return children;\n}\n"
+        else:
+            out[f"app/api/{seg}/route.ts"] = _route(rng)
+
+    for i in range(budget["lib"]):
+        area = AREAS[i % len(AREAS)]
+        name = f"{area}{_pascal(WORDS[i % len(WORDS)])}{i}"
+        out[f"lib/{area}/{name}.ts"] = _lib(rng, name)
+
+    for i in range(budget["supabase"]):
+        out[f"supabase/migrations/{20240101000000 + i}_{AREAS[i % len(AREAS)]}.sql"] = _sql(rng, AREAS[i % len(AREAS)])
+
+    for i in range(max(0, budget["node_modules"])):
+        out[f"node_modules/pkg{i % 50}/dist/chunk{i}.js"] = f"module.exports = {i};\n"
+    return out
+
+
+def write_tree(dest: Path, files: int, seed: int = SEED) -> bool:
+    """Create the source tree + git commit; returns False if an identical tree was already there."""
+    params = {"files": files, "seed": seed, "version": 1}
+    marker = dest / TREE_MARKER
+    try:
+        if json.loads(marker.read_text()) == params:
+            return False
+    except (OSError, ValueError):
+        pass
+    if dest.exists():
+        shutil.rmtree(dest)
+    dest.mkdir(parents=True)
+    for rel, content in tree_files(files, seed).items():
+        path = dest / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    (dest / ".gitignore").write_text(
+        "node_modules/\n.next/\n.fetti/\nlogs/\n/fetti*.py\n/fetti_*.flock\n/fetti_brain.json\n"
+        "/fetti_feature_plan.md\n/fetti_last_errors.json\n/benchmarks/\n/__pycache__/\n" + TREE_MARKER + "\n"
+    )
+    (dest / "package.json").write_text(json.dumps({"name": "synthetic", "private": True, "scripts": {}}, indent=2))
+    env = dict(os.environ, **GIT_ENV)
+    for args in (["init", "-q"], ["add", "-A"], ["commit", "-q", "-m", "synthetic tree"]):
+        subprocess.run(["git", *args], cwd=dest, check=True, env=env)
+    marker.write_text(json.dumps(params))
+    return True
+
+
+def _plan(rng: random.Random, tasks: int) -> str:
+    lines = ["# Fetti Feature Plan", ""]
+    for i in range(tasks):
+        area, word = AREAS[i % len(AREAS)], rng.choice(WORDS)
+        box = "x" if i < tasks // 3 else " "
+        lines.append(f"- [{box}] {_pascal(area)} {word} task {i}: wire components/{area}/ into app/(dashboard)/{area}.")
+        for j in range(rng.randint(0, 3)):
+            lines.append(f"  - note {j}: keep lib/{area}/ pure; add a verify script for {word}.")
+        if i % 25 == 24:
+            lines += ["", f"## Milestone {i // 25}", ""]
+    return "\n".join(lines) + "\n"
+
+
+def _brain(rng: random.Random, paths: List[str], file_laws: int, patterns: int) -> Dict[str, Any]:
+    source = [p for p in paths if not p.startswith("node_modules/")]
+    laws: Dict[str, List[str]] = {}
+    for path in rng.sample(source, min(file_laws, len(source))):
+        laws[path] = [f"{path} must keep exactly one default export.", "Do not re-import NextResponse."]
+    for area in AREAS:
+        laws[f"components/{area}/"] = [f"Components for {area} stay presentational."]
+        laws[f"app/**/{area}/**/route.ts"] = [f"{area} routes validate the body before use."]
+    error_patterns = []
+    for i in range(patterns):
+        word = rng.choice(WORDS)
+        if i % 4 == 0:
+            error_patterns.append({"pattern": rf"Type '\w+' is not assignable to type '{word}{i}'", "regex": True,
+                                   "recommendation": f"Check the {word} types."})
+        else:
+            error_patterns.append({"pattern": f"the name `{_pascal(word)}{i}` is defined multiple times",
+                                   "recommendation": f"Remove the duplicate {word} definition."})
+    examples = [
+        {"description": f"Example {i}: {rng.choice(WORDS)} change", "file": rng.choice(source),
+         "before": f"const {rng.choice(WORDS)} = {i};", "after": f"const {rng.choice(WORDS)} = {i + 1};"}
+        for i in range(200)
+    ]
+    return {
+        "repo_laws": [f"Repo law {i}: never edit generated {rng.choice(WORDS)} files." for i in range(50)],
+        "file_laws": laws,
+        "error_patterns": error_patterns,
+        "successful_examples": examples,
+    }
+
+
+def _build_log(rng: random.Random, paths: List[str], size: int) -> str:
+    source = [p for p in paths if p.endswith((".ts", ".tsx"))]
+    chunks: List[str] = []
+    total = 0
+    i = 0
+    while total < size:
+        path = rng.choice(source)
+        if i % 7 == 0:
+            line = (f"./{path}:{rng.randint(1, 200)}:{rng.randint(1, 80)}\n"
+                    f"Type error: Type 'string' is not assignable to type '{rng.choice(WORDS)}{rng.randint(0, 999)}'.\n")
+        elif i % 11 == 0:
+            line = f"Error: the name `{_pascal(rng.choice(WORDS))}{rng.randint(0, 999)}` is defined multiple times\n"
+        else:
+            line = f"   Compiled {path} in {rng.randint(10, 900)}ms\n"
+        chunks.append(line)
+        total += len(line)
+        i += 1
+    return "".join(chunks)
+
+
+def write_state(dest: Path, tasks: int = 300, log_mb: float = 4.0, file_laws: int = 2000,
+                patterns: int = 400, seed: int = SEED) -> None:
+    """(Re)write the plan, brain and logs, discarding what previous runs appended."""
+    rng = random.Random(seed + 1)
+    paths = sorted(tree_files_index(dest))
+    (dest / "fetti_feature_plan.md").write_text(_plan(rng, tasks))
+    (dest / "fetti_brain.json").write_text(json.dumps(_brain(rng, paths, file_laws, patterns), indent=2))
+
+    for stale in (dest / "logs", dest / ".fetti"):
+        if stale.exists():
+            shutil.rmtree(stale)
+    (dest / "logs").mkdir()
+    (dest / ".fetti").mkdir()
+    build_log = _build_log(rng, paths, int(log_mb * 1024 * 1024))
+    (dest / "logs" / "build_sample.log").write_text(build_log)
+
+    seq = 0
+    with open(dest / "logs" / "fetti_ai_fixes.log", "w") as f:
+        written = 0
+        while written < log_mb * 1024 * 1024:
+            seq += 1
+            path = rng.choice(paths)
+            entry = {
+                "id": f"{seq:012x}", "timestamp": f"2025-{1 + seq % 12:02d}-{1 + seq % 28:02d}T10:00:00",
+                "source": rng.choice(["wrapper", "wizard", "feature"]), "failed_step": rng.choice(["Lint", "Build", "Test"]),
+                "task": None, "error_excerpt": build_log[(seq * 997) % len(build_log):][:3000],
+                "raw_model_output": "{}", "edits": [{"file": path, "before": "a", "after": "b"}], "seq": seq,
+            }
+            line = json.dumps(entry) + "\n"
+            if seq % 3 == 0:
+                line += json.dumps({"type": "outcome", "session": entry["id"], "timestamp": entry["timestamp"],
+                                    "ok": seq % 2 == 0, "seq": seq + 1}) + "\n"
+                seq += 1
+            f.write(line)
+            written += len(line)
+    (dest / "logs" / "fetti_ai_fixes.seq").write_text(f"{seq}\n")
+
+    with open(dest / ".fetti" / "error_journal.jsonl", "w") as f:
+        for i in range(30):
+            f.write(json.dumps({
+                "v": 1, "ts": f"2025-06-01T10:{i:02d}:00Z", "source": "doctor", "step": rng.choice(["Lint", "Build"]),
+                "exit_code": 1, "file": None, "summary": None, "details": build_log[i * 8000:(i + 1) * 8000],
+            }) + "\n")
+
+
+def tree_files_index(dest: Path) -> List[str]:
+    out = subprocess.run(["git", "ls-files", "-z"], cwd=dest, check=True, capture_output=True, text=True).stdout
+    return [p for p in out.split("\0") if p]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a synthetic Next.js-shaped repo for benchmarks")
+    parser.add_argument("dest", type=Path)
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--tasks", type=int, default=300)
+    parser.add_argument("--log-mb", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args(argv)
+    built = write_tree(args.dest, args.files, args.seed)
+    write_state(args.dest, args.tasks, args.log_mb, seed=args.seed)
+    print(f"[SYNTH] {'Generated' if built else 'Reused'} {args.files}-file tree at {args.dest}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Fetti – single entry point for the doctor, the AI wrappers and the helpers.
+
+  python3 fetti.py doctor [--resume | --start-at STEP | --only A,B]
+  python3 fetti.py auto            # lint + build health check (fetti:auto)
+  python3 fetti.py fix             # doctor + OpenAI fix on failure
+  python3 fetti.py wizard          # Gemini auto-fix loop
+  python3 fetti.py feature         # feature runner (sanity check + next plan task)
+  python3 fetti.py run             # auto, then feature (one fetti:watch cycle)
+  python3 fetti.py plan            # show the feature plan
+  python3 fetti.py stats [--last N]
+  python3 fetti.py learn|brain|log ...
+  python3 fetti.py daemon start|stop|status
+  python3 fetti.py queue add cycle [--follow] | status | cancel
+  python3 fetti.py --trace out.json <command> ...   # Chrome trace (fetti_trace.py)
+
+Only the module behind the chosen subcommand is imported, and the model
+SDKs are imported by fetti_llm on the first model call, so commands that
+never talk to a model start in well under a second. With the daemon
+running (fetti_daemon.py), job commands are handed to it over a Unix socket
+and run on its warm state instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
+
+# name -> (module, help); the module is imported only when its command runs.
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    "doctor": ("fetti_doctor", "Run the health check steps (lint, tests, build)."),
+    "auto": ("fetti_doctor_wrapper", "Lint + build health check with optional auto-deploy."),
+    "fix": ("fetti_auto_ai_wrapper", "Run the doctor and ask OpenAI for a fix on failure."),
+    "wizard": ("fetti_auto_ai", "Gemini auto-fix loop over the full plan."),
+    "feature": ("fetti_feature_runner", "Sanity check, then work on the next plan task."),
+    "run": ("", "One watch cycle: auto, then feature."),
+    "plan": ("fetti_plan", "Show the feature plan and its open tasks."),
+    "stats": ("fetti_history", "Run history: success rates and timings."),
+    "learn": ("fetti_learn", "Mine the AI log into brain recommendations."),
+    "brain": ("fetti_brain", "Inspect the brain."),
+    "log": ("fetti_ai_log", "Tail and search the AI session log."),
+    "daemon": ("fetti_daemon", "Start, stop or inspect the resident fettid daemon."),
+    "queue": ("fetti_queue", "Queue doctor/feature jobs for the single background worker."),
+}
+
+
+def _invoke(command: str, func: Callable[[], Optional[int]], rest: List[str]) -> int:
+    """Run a tool's main() as if it were `python3 <tool>.py <rest>`."""
+    saved = sys.argv
+    sys.argv = [f"fetti {command}", *rest]
+    try:
+        code = func()
+    except SystemExit as e:
+        code = e.code
+    finally:
+        sys.argv = saved
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _entry(command: str, rest: List[str]) -> Callable[[], Optional[int]]:
+    if command == "run":
+        def run_cycle() -> int:
+            code = _invoke("auto", _entry("auto", []), [])
+            return code or _invoke("feature", _entry("feature", []), [])
+        return run_cycle
+
+    module = importlib.import_module(COMMANDS[command][0])
+    if command == "feature":
+        def feature() -> None:
+            import fetti_history
+
+            with fetti_history.tracked_run("feature_runner"):
+                module.main()
+        return feature
+    if command == "stats":
+        return lambda: module.main(["stats", *rest])
+    if command in ("doctor", "learn", "brain", "log", "daemon", "queue"):
+        return lambda: module.main(rest)
+    return module.main
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="fetti",
+        description="Fetti doctor, AI wizards and helpers.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<8} {text}" for name, (_, text) in COMMANDS.items()),
+    )
+    parser.add_argument("--trace", metavar="OUT.json", help="Write a Chrome trace of the run (open in Perfetto).")
+    parser.add_argument("command", choices=list(COMMANDS), metavar="command")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments passed to the command.")
+    args = parser.parse_args(argv)
+    import fetti_trace
+
+    fetti_trace.start(args.trace)
+    if args.command in ("doctor", "auto", "feature", "fix", "run"):
+        # Hand the job to a running fettid, if any (FETTI_DAEMON=0 to opt out).
+        import fetti_daemon
+
+        code = fetti_daemon.run_remote([args.command, *args.args])
+        if code is not None:
+            return code
+    with fetti_trace.span(f"fetti {args.command}", cat="command"):
+        return _invoke(args.command, _entry(args.command, args.args), args.args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""
+Fetti AI Log – audit log of AI fix sessions (logs/fetti_ai_fixes.log).
+
+One JSON object per line, either a session:
+  {"seq", "id", "timestamp", "source", "failed_step", "task", "error_excerpt",
+   "raw_model_output", "edits"}
+or, once the edits have been validated, its outcome:
+  {"seq", "type": "outcome", "session", "timestamp", "ok"}
+
+Every entry gets a monotonically increasing "seq" (lines written before
+sequencing existed sit at the top of the first segment and count as seq =
+their line number). The active segment
+(logs/fetti_ai_fixes.log) is rotated once it passes SEGMENT_BYTES: it is
+gzip-compressed to logs/fetti_ai_fixes.<first>-<last>.log.gz and summarized
+in logs/fetti_ai_fixes.index.json (seq and timestamp range, failed steps,
+session ids), so lookups by id / time / step only open the segments that can
+match, and tailing reads closed segments only when the active one is short.
+
+Written by the AI wrappers and the feature agent, read back by the learning
+pass (fetti_learn) and the example index (fetti_examples).
+
+Usage:
+  python3 fetti_ai_log.py tail [-n 5]
+  python3 fetti_ai_log.py show SESSION_ID
+  python3 fetti_ai_log.py find [--step Build] [--since 2025-11-01] [--until ...]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as _dt
+import gzip
+import json
+import os
+import sys
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import fetti_history
+import fetti_trace
+from fetti_fs import atomic_write_text, file_lock
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+LOG_PATH = PROJECT_ROOT / "logs" / "fetti_ai_fixes.log"
+INDEX_PATH = LOG_PATH.with_name("fetti_ai_fixes.index.json")
+SEQ_PATH = LOG_PATH.with_name("fetti_ai_fixes.seq")
+SEGMENT_BYTES = int(float(os.environ.get("FETTI_AI_LOG_SEGMENT_MB", "8")) * 1024 * 1024)
+EXCERPT_CHARS = 4000
+
+# Resume point for iter_entries(): (inode of the active segment, byte offset
+# into it, last seq seen). If the inode changed the log was rotated, and
+# reading resumes from the first closed segment holding a newer seq.
+Cursor = Tuple[int, int, int]
+START: Cursor = (0, 0, 0)
+
+
+# -- index ------------------------------------------------------------------
+
+def read_index() -> Dict[str, Any]:
+    try:
+        data = json.loads(INDEX_PATH.read_text())
+        if isinstance(data, dict) and isinstance(data.get("segments"), list):
+            return data
+    except Exception:
+        pass
+    return {"version": 1, "segments": []}
+
+
+def _summarize(entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    steps: Dict[str, int] = {}
+    sessions: Dict[str, str] = {}
+    for e in entries:
+        if e.get("type") == "outcome":
+            continue
+        step = e.get("failed_step") or ("task" if e.get("task") else "unknown")
+        steps[step] = steps.get(step, 0) + 1
+        if e.get("id"):
+            sessions[e["id"]] = e.get("timestamp") or ""
+    stamps = [e.get("timestamp") or "" for e in entries]
+    return {
+        "first_seq": entries[0]["seq"],
+        "last_seq": entries[-1]["seq"],
+        "first_ts": min(stamps),
+        "last_ts": max(stamps),
+        "steps": steps,
+        "sessions": sessions,
+    }
+
+
+def _segment_path(segment: Dict[str, Any]) -> Path:
+    return LOG_PATH.with_name(segment["file"])
+
+
+# -- writing ----------------------------------------------------------------
+
+def _scan(path: Path, offset: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    (end_offset, entry) for each complete JSON line of a plain or .gz segment
+    from byte `offset` on, skipping corrupt lines. Unsequenced (legacy) lines
+    get seq = line number when reading from the start; when resuming they
+    have been seen already and come back without a seq.
+    """
+    opener = gzip.open if path.suffix == ".gz" else open
+    try:
+        f = opener(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        number_legacy = offset == 0
+        f.seek(offset)
+        line_no = 0
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # partially written line; pick it up next time
+            offset += len(raw)
+            line_no += 1
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            if "seq" not in entry and number_legacy:
+                entry["seq"] = line_no
+            yield offset, entry
+
+
+def _read_lines(path: Path) -> Iterator[Dict[str, Any]]:
+    for _, entry in _scan(path):
+        yield entry
+
+
+def _next_seq() -> int:
+    try:
+        return int(SEQ_PATH.read_text().strip()) + 1
+    except (FileNotFoundError, ValueError):
+        pass
+    # First sequenced write: continue after whatever the log already holds.
+    closed = [s["last_seq"] for s in read_index()["segments"]]
+    return max(closed + [e["seq"] for e in _read_lines(LOG_PATH)] + [0]) + 1
+
+
+def _rotate() -> None:
+    """Compress the active segment and record it in the index (caller holds the lock)."""
+    entries = list(_read_lines(LOG_PATH))
+    if not entries:
+        return
+    summary = _summarize(entries)
+    name = f"fetti_ai_fixes.{summary['first_seq']:08d}-{summary['last_seq']:08d}.log.gz"
+    with open(LOG_PATH, "rb") as src, gzip.open(LOG_PATH.with_name(name), "wb") as dst:
+        for chunk in iter(lambda: src.read(1 << 20), b""):
+            dst.write(chunk)
+    index = read_index()
+    index["segments"].append(dict(summary, file=name))
+    atomic_write_text(INDEX_PATH, json.dumps(index) + "\n")
+    atomic_write_text(LOG_PATH, "")  # new inode, so cursors notice the rotation
+    print(f"[AI LOG] Rotated {len(entries)} entries into logs/{name}")
+
+
+def _append(entry: Dict[str, Any]) -> bool:
+    LOG_PATH.parent.mkdir(exist_ok=True)
+    try:
+        with file_lock(LOG_PATH):
+            seq = _next_seq()
+            with LOG_PATH.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(dict(entry, seq=seq)) + "\n")
+                size = f.tell()
+            SEQ_PATH.write_text(f"{seq}\n")
+            if size > SEGMENT_BYTES:
+                _rotate()
+        return True
+    except Exception as e:
+        print(f"[AI LOG] Could not write AI log: {e}")
+        return False
+
+
+@fetti_trace.traced()
+def log_ai_session(
+    failed_step: Optional[str],
+    raw_output: str,
+    edits: List[dict],
+    error_log: str = "",
+    source: str = "wrapper",
+    task: Optional[str] = None,
+) -> str:
+    """Append an audit log entry for this AI fix attempt. Returns the session id."""
+    session_id = uuid.uuid4().hex[:12]
+    entry = {
+        "id": session_id,
+        "timestamp": _dt.datetime.now().isoformat(),
+        "source": source,
+        "failed_step": failed_step,
+        "task": task,
+        "error_excerpt": error_log[-EXCERPT_CHARS:],
+        "raw_model_output": raw_output,
+        "edits": edits,
+    }
+    if _append(entry):
+        print(f"[AI LOG] Logged AI session to {LOG_PATH.relative_to(PROJECT_ROOT)}")
+    fetti_history.record_edits(session_id, edits)
+    return session_id
+
+
+def log_ai_outcome(session_id: Optional[str], ok: bool) -> None:
+    """Record whether the edits of `session_id` went green."""
+    if not session_id:
+        return
+    fetti_history.record_outcome(session_id, ok)
+    _append(
+        {
+            "type": "outcome",
+            "session": session_id,
+            "timestamp": _dt.datetime.now().isoformat(),
+            "ok": ok,
+        }
+    )
+
+
+# -- reading ----------------------------------------------------------------
+
+def last_seq() -> int:
+    """Highest seq written so far (0 for an empty log)."""
+    try:
+        return int(SEQ_PATH.read_text().strip())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def iter_entries(cursor: Cursor = START) -> Iterator[Tuple[Cursor, Dict[str, Any]]]:
+    """
+    Yield (cursor, entry) for every entry after `cursor`, oldest first.
+    Pass the last cursor back in to resume incrementally.
+    """
+    inode, offset, seen = cursor
+    try:
+        active_inode = LOG_PATH.stat().st_ino
+    except FileNotFoundError:
+        active_inode = 0
+
+    if inode != active_inode or not inode:
+        # First read, or rotated since: catch up from the closed segments.
+        for seg in read_index()["segments"]:
+            if seg["last_seq"] <= seen:
+                continue
+            for entry in _read_lines(_segment_path(seg)):
+                if entry.get("seq", 0) > seen:
+                    seen = entry["seq"]
+                    yield (0, 0, seen), entry
+        offset = 0
+
+    if not active_inode:
+        return
+    for offset, entry in _scan(LOG_PATH, offset):
+        if entry.get("seq", 0) <= seen:
+            continue
+        seen = entry["seq"]
+        yield (active_inode, offset, seen), entry
+
+
+def iter_sessions() -> Iterator[Dict[str, Any]]:
+    """Yield every logged session (oldest first), with "ok" filled in from its outcome."""
+    sessions: List[Dict[str, Any]] = []
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for _, entry in iter_entries():
+        if entry.get("type") == "outcome":
+            session = by_id.get(entry.get("session"))
+            if session is not None:
+                session["ok"] = entry.get("ok")
+            continue
+        sessions.append(entry)
+        if entry.get("id"):
+            by_id[entry["id"]] = entry
+    yield from sessions
+
+
+def find_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """One session by id; opens at most one closed segment."""
+    path = LOG_PATH
+    for seg in read_index()["segments"]:
+        if session_id in seg.get("sessions", {}):
+            path = _segment_path(seg)
+            break
+    for entry in _read_lines(path):
+        if entry.get("id") == session_id:
+            return entry
+    return None
+
+
+def _matching(
+    entries: Iterable[Dict[str, Any]], step: Optional[str], since: Optional[str], until: Optional[str]
+) -> Iterator[Dict[str, Any]]:
+    for e in entries:
+        if e.get("type") == "outcome":
+            continue
+        ts = e.get("timestamp") or ""
+        if (step and e.get("failed_step") != step) or (since and ts < since) or (until and ts > until):
+            continue
+        yield e
+
+
+def find_sessions(
+    step: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Sessions by failed step and/or ISO timestamp range, skipping segments that cannot match."""
+    for seg in read_index()["segments"]:
+        if (since and seg["last_ts"] < since) or (until and seg["first_ts"] > until):
+            continue
+        if step and step not in seg.get("steps", {}):
+            continue
+        yield from _matching(_read_lines(_segment_path(seg)), step, since, until)
+    yield from _matching(_read_lines(LOG_PATH), step, since, until)
+
+
+def tail(n: int = 5) -> List[Dict[str, Any]]:
+    """The last `n` entries; closed segments are read newest-first, only as needed."""
+    out = list(_read_lines(LOG_PATH))[-n:]
+    for seg in reversed(read_index()["segments"]):
+        if len(out) >= n:
+            break
+        out = list(_read_lines(_segment_path(seg)))[-(n - len(out)):] + out
+    return out
+
+
+def _describe(e: Dict[str, Any]) -> str:
+    when = (e.get("timestamp") or "")[:19]
+    if e.get("type") == "outcome":
+        return f"#{e.get('seq')} {when} outcome of {e.get('session')}: {'green' if e.get('ok') else 'red'}"
+    what = e.get("failed_step") or ((e.get("task") or "").splitlines() or ["?"])[0][:60]
+    return f"#{e.get('seq')} {when} {e.get('id')} [{e.get('source')}] {what} – {len(e.get('edits') or [])} edit(s)"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect the AI fix session log")
+    sub = parser.add_subparsers(dest="command")
+    p_tail = sub.add_parser("tail", help="Show the most recent entries")
+    p_tail.add_argument("-n", type=int, default=5)
+    p_show = sub.add_parser("show", help="Print one session as JSON")
+    p_show.add_argument("session_id")
+    p_find = sub.add_parser("find", help="List sessions by failed step / time range")
+    p_find.add_argument("--step")
+    p_find.add_argument("--since", help="ISO timestamp, e.g. 2025-11-01")
+    p_find.add_argument("--until", help="ISO timestamp")
+    args = parser.parse_args(argv)
+
+    if args.command == "tail":
+        for e in tail(args.n):
+            print(_describe(e))
+    elif args.command == "show":
+        entry = find_session(args.session_id)
+        if entry is None:
+            print(f"[AI LOG] No session {args.session_id}")
+            return 1
+        print(json.dumps(entry, indent=2))
+    elif args.command == "find":
+        for e in find_sessions(args.step, args.since, args.until):
+            print(_describe(e))
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
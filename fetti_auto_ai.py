@@ -1,27 +1,26 @@
-import os
 import json
-import subprocess
 import textwrap
 import time
 import datetime as _dt
 from pathlib import Path
-
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-load_dotenv()
+from typing import Optional, Tuple
+
+import fetti_cancel
+import fetti_flaky
+import fetti_history
+import fetti_ledger
+import fetti_llm
+import fetti_order
+import fetti_replay
+import fetti_trace
+import fetti_steps
+from fetti_ai_log import log_ai_outcome, log_ai_session
+from fetti_brain import format_hits, recommendations_for
+from fetti_brain_loader import build_brain_context
+from fetti_error_logger import record_error
+from fetti_examples import format_examples, search as search_examples
 
 PROJECT_ROOT = Path(__file__).resolve().parent
-MODEL_NAME = os.environ.get("FETTI_WIZARD_MODEL", "gemini-2.0-flash-thinking-exp")
-API_KEY = os.environ.get("GEMINI_API_KEY")
-
-try:
-    if not API_KEY:
-        print("[WARNING] GEMINI_API_KEY not set.")
-    else:
-        genai.configure(api_key=API_KEY)
-except Exception as e:
-    print(f"[ERROR] Failed to configure Gemini: {e}")
 
 PLAN = [
     ("Run lint",   ["npm", "run", "lint"]),
@@ -59,25 +58,45 @@ def run_cmd(title, cmd):
     print("=" * 60)
     print(f"[CMD] {' '.join(cmd)}\n")
 
-    proc = subprocess.run(
-        cmd,
-        cwd=PROJECT_ROOT,
-        capture_output=True,
-        text=True
-    )
+    passed, tree = fetti_ledger.lookup(cmd)
+    if passed:
+        print(f"[RESULT] ✅ already passed on tree {fetti_ledger.describe(tree)} (ledger) – skipped")
+        fetti_history.record_step(cmd, None, 0, skipped=True)
+        return True, ""
+
+    started = time.monotonic()
+    proc = fetti_replay.run(cmd, cwd=PROJECT_ROOT)
 
     out = (proc.stdout or "") + "\n" + (proc.stderr or "")
     print(out.strip())
 
     ok = proc.returncode == 0
+    duration = time.monotonic() - started
+    fetti_ledger.record(cmd, tree, ok, duration)
+    fetti_history.record_step(cmd, duration, proc.returncode)
     print(f"\n[RESULT] {'✅ SUCCESS' if ok else '❌ FAILED'} (code {proc.returncode})")
     return ok, out
 
-def ai_fix_project(step_title, cmd, log: str) -> bool:
+# fetti_flaky verdict for the most recent failing run_step() (None if it passed)
+LAST_VERDICT = None
+
+
+@fetti_trace.traced(cat="ai")
+def ai_fix_project(step_title, cmd, log: str) -> Tuple[bool, Optional[str]]:
+    """(whether any edit was applied, the AI log session id for log_ai_outcome)."""
     print("\n[AI] Asking OpenAI for an automatic fix...")
 
     trimmed_log = log[-16000:]
 
+    known_fixes = format_hits(recommendations_for(log))
+    if known_fixes:
+        print("[AI] Known error patterns matched in the log:")
+        print(known_fixes)
+        known_fixes = f"Known error patterns matched in this log (from the Fetti brain):\n{known_fixes}\n"
+    known_fixes += format_examples(search_examples(trimmed_log[-4000:], k=2), "Past fixes for similar failures")
+    # Laws for the files named in the failing log only
+    known_fixes += f"\n{build_brain_context(log_text=log)}\n"
+
     user_prompt = f"""
     You are an autonomous build agent working on a Next.js / TypeScript / Supabase / Prisma project called "Fetti CRM".
 
@@ -96,7 +115,7 @@ def ai_fix_project(step_title, cmd, log: str) -> bool:
     --------------------
     {trimmed_log}
     --------------------
-
+    {known_fixes}
     Your job:
     - Infer the likely root cause of this failure.
     - Propose the smallest number of changes that will fix it.
@@ -121,102 +140,178 @@ def ai_fix_project(step_title, cmd, log: str) -> bool:
     - You MUST return valid JSON, nothing else.
     """
 
+    raw = None
+    model_name = fetti_llm.gemini_model_name()
+    started = time.monotonic()
     try:
-        model = genai.GenerativeModel(
-            model_name=MODEL_NAME,
+        raw = fetti_llm.gemini_generate(
+            user_prompt,
+            model_name=model_name,
+            purpose="fix",
             system_instruction="You are a senior TypeScript/Next.js engineer for Fetti CRM. You only output strict JSON edits, no explanations.",
             generation_config={"response_mime_type": "application/json"}
         )
-        
-        response = model.generate_content(user_prompt)
-        raw = response.text
+        fetti_history.record_llm_call(
+            "gemini", model_name, "fix", time.monotonic() - started, len(user_prompt), len(raw or ""), True
+        )
         print("\n[AI] Raw model output:")
         print(raw)
 
         data = json.loads(raw)
     except Exception as e:
+        if raw is None:
+            fetti_history.record_llm_call(
+                "gemini", model_name, "fix", time.monotonic() - started, len(user_prompt), 0, False
+            )
         print(f"\n[AI] ❌ Model generation or parsing failed: {e}")
-        return False
+        return False, None
 
     edits = data.get("edits") or []
     if not isinstance(edits, list) or not edits:
         print("\n[AI] No usable edits found in JSON.")
-        return False
+        log_ai_session(step_title, raw, [], log, source="auto_ai")
+        return False, None
+
+    session_id = log_ai_session(step_title, raw, edits, log, source="auto_ai")
 
     applied_any = False
 
-    for edit in edits:
-        file_rel = edit.get("file")
-        before = edit.get("before")
-        after = edit.get("after")
+    with fetti_trace.span("apply edits", cat="edits", count=len(edits)):
+        for edit in edits:
+            fetti_cancel.check("applying the model's edits")
+            file_rel = edit.get("file")
+            before = edit.get("before")
+            after = edit.get("after")
 
-        if not file_rel or before is None or after is None:
-            print(f"[AI] Skipping malformed edit entry: {edit}")
-            continue
+            if not file_rel or before is None or after is None:
+                print(f"[AI] Skipping malformed edit entry: {edit}")
+                continue
 
-        target_path = PROJECT_ROOT / file_rel
-        if not target_path.exists():
-            print(f"[AI] File not found, skipping: {file_rel}")
-            continue
+            target_path = PROJECT_ROOT / file_rel
+            if not target_path.exists():
+                print(f"[AI] File not found, skipping: {file_rel}")
+                continue
 
-        try:
-            src = target_path.read_text()
-        except Exception as e:
-            print(f"[AI] Could not read {file_rel}: {e}")
-            continue
+            try:
+                src = target_path.read_text()
+            except Exception as e:
+                print(f"[AI] Could not read {file_rel}: {e}")
+                continue
 
-        if before not in src:
-            print(f"[AI] 'before' snippet not found in {file_rel}, skipping.")
-            continue
+            if before not in src:
+                print(f"[AI] 'before' snippet not found in {file_rel}, skipping.")
+                continue
+
+            new_src = src.replace(before, after, 1)
 
-        new_src = src.replace(before, after, 1)
+            backup = target_path.with_suffix(target_path.suffix + ".fetti_backup")
+            if not backup.exists():
+                try:
+                    backup.write_text(src)
+                    print(f"[AI] Created backup: {backup.name}")
+                except Exception as e:
+                    print(f"[AI] Could not create backup for {file_rel}: {e}")
 
-        backup = target_path.with_suffix(target_path.suffix + ".fetti_backup")
-        if not backup.exists():
             try:
-                backup.write_text(src)
-                print(f"[AI] Created backup: {backup.name}")
+                target_path.write_text(new_src)
+                print(f"[AI] ✅ Applied edit to {file_rel}")
+                applied_any = True
             except Exception as e:
-                print(f"[AI] Could not create backup for {file_rel}: {e}")
-
-        try:
-            target_path.write_text(new_src)
-            print(f"[AI] ✅ Applied edit to {file_rel}")
-            applied_any = True
-        except Exception as e:
-            print(f"[AI] Failed to write updated file {file_rel}: {e}")
+                print(f"[AI] Failed to write updated file {file_rel}: {e}")
 
     if not applied_any:
         print("\n[AI] No edits were actually applied.")
-    return applied_any
+    return applied_any, session_id
 
-def run_plan_once() -> bool:
-    for title, cmd in PLAN:
+def run_step(title, cmd, tree):
+    """
+    run_cmd() + record the result for --resume style restarts. Transient
+    failures (fetti_flaky) are retried a bounded number of times first.
+    """
+    global LAST_VERDICT
+    LAST_VERDICT = None
+    started = time.monotonic()
+    retries = 0
+    with fetti_trace.span(title, cat="step"):
         ok, log = run_cmd(title, cmd)
+        while not ok:
+            LAST_VERDICT = fetti_flaky.classify(cmd, None, log, tree)
+            if not LAST_VERDICT.transient or retries >= fetti_flaky.max_retries():
+                break
+            retries += 1
+            print(f"[PLAN] '{title}' failed, {LAST_VERDICT.label()} – "
+                  f"retrying ({retries}/{fetti_flaky.max_retries()}) in {fetti_flaky.backoff():g}s...")
+            time.sleep(fetti_flaky.backoff())
+            ok, log = run_cmd(title, cmd)
+    if LAST_VERDICT is not None:
+        fetti_flaky.record(title, cmd, 0 if ok else 1, LAST_VERDICT, retries, recovered=ok)
+    if ok:
+        fetti_flaky.note_result(cmd, tree, 0)
+        LAST_VERDICT = None
+    fetti_steps.record_result(
+        "auto_ai", title, cmd, 0 if ok else 1, fetti_steps.fingerprint(cmd, tree), time.monotonic() - started
+    )
+    return ok, log
+
+
+def transient_stop(title) -> bool:
+    """True (after explaining) if the last failure is transient and must not go to the model."""
+    if LAST_VERDICT is None or not LAST_VERDICT.transient:
+        return False
+    print(f"[PLAN] '{title}' failure looks transient ({LAST_VERDICT.reason}) and persisted after retries; "
+          "not asking the model. Stopping.")
+    return True
+
+
+def run_plan_once() -> bool:
+    # Rerun the step that failed last time; skip only steps that already
+    # passed on the same inputs. The rest run in fail-fast order.
+    tree = fetti_steps.current_tree()
+    plan = fetti_order.order_plan(
+        "auto_ai",
+        fetti_steps.select_steps("auto_ai", PLAN, resume=True, tree=tree),
+        first=fetti_steps.failed_step("auto_ai"),
+    )
+    for title, cmd, skip_reason in plan:
+        if skip_reason:
+            print(f"[PLAN] Skipping '{title}' ({skip_reason}).")
+            continue
+        ok, log = run_step(title, cmd, tree)
         if ok:
             continue
 
         print(f"\n[PLAN] Step failed: {title}")
+        record_error("auto_ai", title, log)
+        if transient_stop(title):
+            return False
         print("[PLAN] Sending to AI for auto-fix...")
 
         # First attempt
-        fixed = ai_fix_project(title, cmd, log)
+        fetti_history.mark_sent_to_ai(LAST_VERDICT.fingerprint)
+        fixed, session_id = ai_fix_project(title, cmd, log)
 
         if not fixed:
             print("[PLAN] AI could not provide/apply a fix. Stopping.")
             return False
 
         print("\n[PLAN] Re-running failed step after AI fix...\n")
-        ok2, log2 = run_cmd(title, cmd)
+        tree = fetti_steps.current_tree()
+        ok2, log2 = run_step(title, cmd, tree)
+        log_ai_outcome(session_id, ok2)
         
         if not ok2:
+            if transient_stop(title):
+                return False
             print("[PLAN] First retry failed. Attempting self-correction...")
             # Self-correction: try again with the new error
-            fixed2 = ai_fix_project(f"{title} (retry)", cmd, log2)
+            fetti_history.mark_sent_to_ai(LAST_VERDICT.fingerprint)
+            fixed2, session_id = ai_fix_project(f"{title} (retry)", cmd, log2)
             
             if fixed2:
                 print("\n[PLAN] Re-running after self-correction...\n")
-                ok3, log3 = run_cmd(title, cmd)
+                tree = fetti_steps.current_tree()
+                ok3, log3 = run_step(title, cmd, tree)
+                log_ai_outcome(session_id, ok3)
                 if not ok3:
                     print("[PLAN] Still failing after self-correction. Stopping.")
                     return False
@@ -227,6 +322,7 @@ def run_plan_once() -> bool:
     return True
 
 def main():
+    fetti_llm.load_env()
     header()
     loop_delay = 15
 
@@ -235,7 +331,9 @@ def main():
         print(f"[LOOP] New run at {_dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("-" * 60)
 
-        success = run_plan_once()
+        with fetti_history.tracked_run("auto_ai") as run_id:
+            success = run_plan_once()
+            fetti_history.end_run(success, run_id)
 
         if not success:
             print(
@@ -1,17 +1,22 @@
-import os
 import json
-import subprocess
 import textwrap
+import time
 import datetime as _dt
 from pathlib import Path
-import re
-from typing import Optional, List, Any
-
-from openai import OpenAI
+from typing import Optional, List, Any, Tuple
+
+import fetti_cancel
+import fetti_events
+import fetti_history
+import fetti_llm
+import fetti_trace
+from fetti_ai_log import log_ai_outcome, log_ai_session
+from fetti_brain import format_hits, recommendations_for
+from fetti_brain_loader import build_brain_context
+from fetti_error_logger import record_error
+from fetti_examples import format_examples, search as search_examples
 
 PROJECT_ROOT = Path(__file__).resolve().parent
-MODEL = os.environ.get("FETTI_WIZARD_MODEL", "gpt-4.1-mini")
-client = OpenAI()  # uses OPENAI_API_KEY from env
 
 
 def banner():
@@ -23,7 +28,7 @@ def banner():
             """
             - Runs `python3 fetti_doctor.py --auto` as usual.
             - If it fails:
-                • detects which step failed (Lint/Test/Build) from the log
+                • learns which step failed (Lint/Test/Build) from the doctor's event stream
                 • sends the failing log to OpenAI with that context
                 • gets JSON edits (file/before/after)
                 • applies edits inside this repo (skips node_modules/.next/etc.)
@@ -36,30 +41,50 @@ def banner():
     print("\n")
 
 
-def run_doctor():
-    """Run fetti_doctor.py --auto and return (exit_code, combined_output)."""
+@fetti_trace.traced(cat="step")
+def run_doctor(extra_args: Optional[List[str]] = None):
+    """
+    Run fetti_doctor.py --auto [extra_args] with its event stream attached.
+    Returns (exit_code, step_output_log, failed_step, diagnostics, flaky);
+    flaky is the doctor's fetti_flaky verdict for the failed step.
+    """
     print("\n" + "-" * 60)
     print(f"[WRAPPER] Running Fetti Doctor at {_dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("-" * 60)
 
-    proc = subprocess.run(
-        ["python3", "fetti_doctor.py", "--auto"],
-        cwd=PROJECT_ROOT,
-        capture_output=True,
-        text=True,
+    # The doctor prints to our terminal itself; the event stream carries the
+    # same step output plus the structured results.
+    stream = fetti_events.run_with_events(
+        ["python3", "fetti_doctor.py", "--auto", *(extra_args or [])], cwd=PROJECT_ROOT
     )
-
-    out = (proc.stdout or "") + (proc.stderr or "")
-    # Echo the doctor's output so behavior looks the same from the outside
-    if proc.stdout:
-        print(proc.stdout, end="")
-    if proc.stderr:
-        print(proc.stderr, end="")
-
-    print(f"\n[WRAPPER] Fetti Doctor exited with code {proc.returncode}")
-    return proc.returncode, out
-
-
+    log_parts: List[str] = []
+    failed_step = None
+    diagnostics = None
+    flaky = None
+    attempt_start = 0
+    for event in stream:
+        kind = event.get("type")
+        if kind == "step_start":
+            log_parts.append(f"\n===== Step: {event.get('step')} ({' '.join(event.get('cmd') or [])}) =====\n")
+            attempt_start = len(log_parts)
+        elif kind == "output":
+            log_parts.append(event.get("data", ""))
+        elif kind == "step_retry":
+            del log_parts[attempt_start:]  # only the last attempt's output matters
+        elif kind == "step_end" and event.get("exit_code") not in (0, None):
+            failed_step = event.get("step")
+            diagnostics = event.get("diagnostics")
+            flaky = event.get("flaky")
+            print(f"[WRAPPER] Step '{failed_step}' failed (exit code {event.get('exit_code')}).")
+        elif kind == "run_end":
+            failed_step = event.get("failed_step") or failed_step
+    code = stream.wait()
+
+    print(f"\n[WRAPPER] Fetti Doctor exited with code {code}")
+    return code, "".join(log_parts), failed_step, diagnostics, flaky
+
+
+@fetti_trace.traced(cat="edits")
 def apply_json_edits(edits: List[dict]) -> bool:
     """
     Apply JSON edits: {file, before, after}.
@@ -69,6 +94,7 @@ def apply_json_edits(edits: List[dict]) -> bool:
     ignore_roots = ("node_modules/", ".next/", ".turbo/", "dist/", "build/")
 
     for edit in edits:
+        fetti_cancel.check("applying the model's edits")
         file_rel = edit.get("file")
         before = edit.get("before")
         after = edit.get("after")
@@ -118,52 +144,32 @@ def apply_json_edits(edits: List[dict]) -> bool:
     return applied_any
 
 
-def extract_failed_step(log_text: str) -> Optional[str]:
-    """
-    Look for the line from fetti_doctor:
-      [FETTI DOCTOR] Health check failed at step 'Lint' with exit code ...
-    and return the step name (Lint/Test/Build/etc.).
-    """
-    pattern = r"Health check failed at step '(.+?)'"
-    match = re.search(pattern, log_text)
-    if match:
-        return match.group(1)
-    return None
-
-
-def log_ai_session(failed_step: Optional[str], raw_output: str, edits: List[dict]) -> None:
-    """Append an audit log entry for this AI fix attempt."""
-    logs_dir = PROJECT_ROOT / "logs"
-    logs_dir.mkdir(exist_ok=True)
-    log_path = logs_dir / "fetti_ai_fixes.log"
-
-    entry = {
-        "timestamp": _dt.datetime.now().isoformat(),
-        "failed_step": failed_step,
-        "raw_model_output": raw_output,
-        "edits": edits,
-    }
-
-    try:
-        with log_path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(entry) + "\n")
-        print(f"[WRAPPER] Logged AI session to {log_path.relative_to(PROJECT_ROOT)}")
-    except Exception as e:
-        print(f"[WRAPPER] Could not write AI log: {e}")
-
-
-def ai_fix_with_openai(full_log: str) -> bool:
+@fetti_trace.traced(cat="ai")
+def ai_fix_with_openai(
+    full_log: str, failed_step: Optional[str] = None, diagnostics: Optional[dict] = None
+) -> Tuple[bool, Optional[str]]:
     """
     Send the failing log to OpenAI and apply returned JSON edits.
-    Returns True if at least one edit was applied.
+    Returns (True if at least one edit was applied, the AI log session id).
     """
     print("\n[WRAPPER] Calling OpenAI to suggest fixes...")
 
-    failed_step = extract_failed_step(full_log)
     step_label = failed_step or "Unknown"
 
     trimmed_log = full_log[-16000:]  # keep prompt size sane
 
+    known_fixes = format_hits(recommendations_for(full_log))
+    if known_fixes:
+        print("[WRAPPER] Known error patterns matched in the log:")
+        print(known_fixes)
+        known_fixes = f"\nKnown error patterns matched in this log (from the Fetti brain) – follow these recommendations:\n{known_fixes}\n"
+    known_fixes += format_examples(search_examples(trimmed_log[-4000:], k=2), "Past fixes for similar failures")
+    # Laws for the files named in the failing log only
+    known_fixes += f"\n{build_brain_context(log_text=full_log)}\n"
+    if diagnostics and diagnostics.get("errors"):
+        key_lines = "\n".join(f"- {line}" for line in diagnostics["errors"])
+        known_fixes = f"\nKey error lines reported by the doctor:\n{key_lines}\n" + known_fixes
+
     user_prompt = f"""
 You are the AI brain for the "Fetti Doctor" build wizard in a Next.js / TypeScript / Supabase / Prisma project called "Fetti CRM".
 
@@ -201,7 +207,7 @@ Fetti Doctor log (tail):
 -----------------
 {trimmed_log}
 -----------------
-
+{known_fixes}
 Output format (strict):
 - DO NOT explain or comment.
 - Only return JSON with this exact shape (no backticks, no extra keys):
@@ -224,26 +230,25 @@ Rules:
 - You MUST return valid JSON, nothing else.
 """
 
-    response = client.responses.create(
-        model=MODEL,
-        instructions=(
-            "You are a senior engineer for Fetti CRM. "
-            "You only output strict JSON edits (file/before/after), no explanations."
-        ),
-        input=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "input_text",
-                        "text": user_prompt,
-                    }
-                ],
-            }
-        ],
+    model = fetti_llm.openai_model_name()
+    started = time.monotonic()
+    try:
+        raw = fetti_llm.openai_respond(
+            user_prompt,
+            model_name=model,
+            purpose="fix",
+            instructions=(
+                "You are a senior engineer for Fetti CRM. "
+                "You only output strict JSON edits (file/before/after), no explanations."
+            ),
+        )
+    except Exception:
+        fetti_history.record_llm_call("openai", model, "fix", time.monotonic() - started, len(user_prompt), 0, False)
+        raise
+
+    fetti_history.record_llm_call(
+        "openai", model, "fix", time.monotonic() - started, len(user_prompt), len(raw or ""), True
     )
-
-    raw = response.output_text
     print("\n[AI] Raw model output:")
     print(raw)
 
@@ -255,44 +260,59 @@ Rules:
             edits = []
     except Exception as e:
         print(f"[AI] ❌ Could not parse model output as JSON: {e}")
-        return False
+        return False, None
 
     if not edits:
         print("[AI] No usable edits found in JSON.")
-        log_ai_session(failed_step, raw, edits)
-        return False
+        log_ai_session(failed_step, raw, edits, full_log)
+        return False, None
 
     # Log before applying
-    log_ai_session(failed_step, raw, edits)
+    session_id = log_ai_session(failed_step, raw, edits, full_log)
 
-    return apply_json_edits(edits)
+    return apply_json_edits(edits), session_id
 
 
 def main():
+    fetti_llm.load_env()
     banner()
+    with fetti_history.tracked_run("auto_ai_wrapper"):
+        fix_cycle()
+
 
+def fix_cycle() -> None:
+    """Doctor, one AI fix on failure, doctor again; raises SystemExit on failure."""
     # 1st run: let Fetti Doctor do its thing
-    code, log = run_doctor()
+    code, log, failed_step, diagnostics, flaky = run_doctor()
 
     if code == 0:
         print("[WRAPPER] Doctor succeeded. No AI fix needed.")
         return
 
+    record_error("auto_ai_wrapper", failed_step or "Unknown", log, exit_code=code)
+    if flaky and flaky.get("transient"):
+        print(f"[WRAPPER] Failure looks transient ({flaky.get('reason')}) and did not clear after "
+              f"{flaky.get('retries', 0)} retr{'y' if flaky.get('retries') == 1 else 'ies'}; not asking the model.")
+        raise SystemExit(code or 1)
+
     print("[WRAPPER] Doctor failed. Attempting AI fix...")
+    fetti_history.mark_sent_to_ai((flaky or {}).get("fingerprint"))
 
-    fixed = ai_fix_with_openai(log)
+    fixed, session_id = ai_fix_with_openai(log, failed_step, diagnostics)
     if not fixed:
         print("[WRAPPER] AI did not apply any fixes. Exiting with original failure.")
         raise SystemExit(code or 1)
 
-    print("\n[WRAPPER] Re-running Fetti Doctor after AI fixes...")
-    code2, log2 = run_doctor()
+    print("\n[WRAPPER] Re-running Fetti Doctor from the failed step after AI fixes...")
+    code2, log2, failed_step2, _, _ = run_doctor(["--resume"])
+    log_ai_outcome(session_id, code2 == 0)
 
     if code2 == 0:
         print("[WRAPPER] ✅ Doctor succeeded after AI fix.")
         return
 
     print("[WRAPPER] ❌ Doctor still failing after AI fix. Exiting with error.")
+    record_error("auto_ai_wrapper", failed_step2 or "Unknown", log2, exit_code=code2)
     raise SystemExit(code2 or 1)
 
 
@@ -0,0 +1,426 @@
+"""
+Fetti Brain – the one loader for fetti_brain.json.
+
+- get_brain(): process-wide singleton, re-read only when the file's
+  mtime/size changes, validated against the expected schema (malformed
+  entries are dropped with a warning instead of breaking every agent).
+- Brain.matcher: a multi-megabyte build log is streamed once in ~1 MB
+  blocks; every error pattern is searched in each block on its own
+  (literals with str.count, regexes with their own search), so
+  overlapping patterns all fire, and the triggered recommendations come
+  back with hit counts.
+- Brain.law_index: file_laws indexed by exact path, directory prefix
+  ("lib/income/") and glob ("app/api/**/route.ts"), so a prompt only
+  carries the laws for the files a task or failing log actually touches.
+
+Schema:
+  repo_laws:           [str]
+  file_laws:           {path_or_glob: [str]}
+  error_patterns:      [{"pattern": str, "recommendation": str, "regex": bool?}]
+  successful_examples: [{"description": str, "file": str, "before": str, "after": str}]
+
+Patterns are literal substrings unless "regex": true.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import fetti_trace
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+BRAIN_PATH = PROJECT_ROOT / "fetti_brain.json"
+
+
+def empty_brain() -> Dict[str, Any]:
+    return {"repo_laws": [], "file_laws": {}, "error_patterns": [], "successful_examples": []}
+
+
+@dataclass
+class ErrorPattern:
+    pattern: str
+    recommendation: str
+    regex: bool = False
+
+
+@dataclass
+class PatternHit:
+    pattern: ErrorPattern
+    count: int
+    first_line: str
+
+
+def required_literal(pattern: str) -> Optional[str]:
+    """
+    Longest run of plain characters every match of `pattern` must contain
+    (outside groups, not made optional by a quantifier), or None if the
+    pattern is too complex to tell. Used to skip regexes cheaply.
+    """
+    if "|" in pattern or "(?" in pattern:
+        return None
+    runs: List[str] = []
+    run: List[str] = []
+    depth, i = 0, 0
+    while i < len(pattern):
+        ch = pattern[i]
+        literal = None
+        if ch == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            literal = nxt if not nxt.isalnum() else None
+            i += 2
+        elif ch in "[{":
+            close = pattern.find("]" if ch == "[" else "}", i + 2 if ch == "[" else i + 1)
+            if close < 0:
+                return None
+            i = close + 1
+        else:
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+            elif ch not in ".^$*+?{}":
+                literal = ch
+            i += 1
+        optional = i < len(pattern) and pattern[i] in "?*{"
+        if literal is not None and depth == 0 and not optional:
+            run.append(literal)
+            if i < len(pattern) and pattern[i] == "+":
+                runs.append("".join(run))
+                run = []
+        else:
+            runs.append("".join(run))
+            run = []
+    runs.append("".join(run))
+    best = max(runs, key=len)
+    return best if len(best) >= 3 else None
+
+
+class BrainMatcher:
+    """
+    Every error pattern searched independently, block by block: literals
+    with str.count/str.find, regexes with their own compiled search behind
+    a required-literal prefilter. A pattern contained in or overlapping
+    another one's match still fires.
+    """
+
+    BLOCK_CHARS = 1 << 20  # lines are joined into ~1 MB blocks
+
+    def __init__(self, patterns: List[ErrorPattern]) -> None:
+        self.patterns = list(patterns)
+        self._literals = [(i, p.pattern) for i, p in enumerate(self.patterns) if not p.regex and p.pattern]
+        # validate_brain() already dropped regexes that don't compile.
+        self._regexes = [
+            (i, re.compile(p.pattern, re.M), required_literal(p.pattern))
+            for i, p in enumerate(self.patterns)
+            if p.regex
+        ]
+
+    def scan_lines(self, lines: Iterable[str]) -> List[PatternHit]:
+        """Scan lines in one streaming pass; return hits in first-seen order."""
+        if not self.patterns:
+            return []
+        found: Dict[int, Tuple[int, PatternHit]] = {}  # pattern index -> (offset of first hit, hit)
+        block: List[str] = []
+        size = offset = 0
+        for line in lines:
+            line = line.rstrip("\r\n")
+            block.append(line)
+            size += len(line) + 1
+            if size >= self.BLOCK_CHARS:
+                self._scan_block("\n".join(block), offset, found)
+                offset += size
+                block, size = [], 0
+        if block:
+            self._scan_block("\n".join(block), offset, found)
+        return [hit for _, hit in sorted(found.values(), key=lambda pair: pair[0])]
+
+    def _scan_block(self, text: str, offset: int, found: Dict[int, Tuple[int, PatternHit]]) -> None:
+        for idx, literal in self._literals:
+            count = text.count(literal)
+            if count:
+                self._add(idx, count, text, text.find(literal), offset, found)
+        for idx, rx, needle in self._regexes:
+            if needle is not None and needle not in text:
+                continue
+            first = rx.search(text)
+            if first is None:
+                continue
+            # Count per line, as the pattern would see the log line by line.
+            start = text.rfind("\n", 0, first.start()) + 1
+            count = sum(len(rx.findall(line)) for line in text[start:].split("\n"))
+            self._add(idx, max(count, 1), text, first.start(), offset, found)
+
+    def _add(
+        self, idx: int, count: int, text: str, pos: int, offset: int, found: Dict[int, Tuple[int, PatternHit]]
+    ) -> None:
+        seen = found.get(idx)
+        if seen is not None:
+            seen[1].count += count
+            return
+        start = text.rfind("\n", 0, pos) + 1
+        end = text.find("\n", pos)
+        line = text[start:end if end >= 0 else len(text)]
+        found[idx] = (offset + pos, PatternHit(self.patterns[idx], count, line.strip()[:300]))
+
+    def scan_text(self, text: str) -> List[PatternHit]:
+        return self.scan_lines(text.splitlines())
+
+    def scan_file(self, path: Path) -> List[PatternHit]:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return self.scan_lines(f)
+
+
+_PATH_IN_TEXT_RE = re.compile(
+    r"(?<![\w/])\.?/?((?:app|components|lib|src|prisma|db|supabase|pages|hooks|scripts)/[\w\-./\[\]@()]*)"
+)
+
+
+def paths_in_text(text: str) -> List[str]:
+    """Repo-relative paths (or directories) mentioned in a task or log."""
+    found: List[str] = []
+    for m in _PATH_IN_TEXT_RE.finditer(text or ""):
+        path = m.group(1).rstrip(".,;:)'\"")
+        if path and path not in found:
+            found.append(path)
+    return found
+
+
+def _glob_regex(pattern: str) -> "re.Pattern[str]":
+    # fnmatch's '*' already crosses '/', so '**/' just also matches zero dirs.
+    return re.compile(fnmatch.translate(pattern.replace("**/", "\0")).replace("\x00", "(?:.*/)?"))
+
+
+_GENERIC_SEGMENTS = {"app", "api", "page", "route", "layout", "index", "components", "src", "tsx", "jsx"}
+
+
+class LawIndex:
+    """file_laws keyed by exact path, directory prefix or glob."""
+
+    def __init__(self, file_laws: Dict[str, List[str]]) -> None:
+        self.exact: Dict[str, str] = {}
+        self.prefixes: List[str] = []
+        self.globs: List[Tuple[str, "re.Pattern[str]"]] = []
+        for key in file_laws:
+            if any(ch in key for ch in "*?["):
+                self.globs.append((key, _glob_regex(key)))
+            elif key.endswith("/"):
+                self.prefixes.append(key)
+            else:
+                self.exact[key] = key
+
+        # Distinctive path segments ("dashboard", "leads") for tasks that
+        # name an area of the app rather than a file.
+        self.segments: Dict[str, List[str]] = {}
+        for key in file_laws:
+            for seg in re.split(r"[/.\[\]()*?]+", key.lower()):
+                if len(seg) >= 4 and seg not in _GENERIC_SEGMENTS:
+                    self.segments.setdefault(seg, []).append(key)
+
+    @property
+    def total(self) -> int:
+        return len(self.exact) + len(self.prefixes) + len(self.globs)
+
+    def keys_mentioned(self, text: str) -> List[str]:
+        """Keys whose distinctive path segments appear as words in `text`."""
+        words = set(re.findall(r"[a-z0-9_-]+", (text or "").lower()))
+        matched: List[str] = []
+        for seg, keys in self.segments.items():
+            if seg in words:
+                matched += [k for k in keys if k not in matched]
+        return matched
+
+    def keys_for(self, paths: Iterable[str]) -> List[str]:
+        """file_laws keys relevant to any of `paths` (files or directories)."""
+        matched: List[str] = []
+
+        def add(key: str) -> None:
+            if key not in matched:
+                matched.append(key)
+
+        for raw in paths:
+            path = raw[2:] if raw.startswith("./") else raw
+            if path in self.exact:
+                add(path)
+            for prefix in self.prefixes:
+                if path.startswith(prefix) or prefix.startswith(path.rstrip("/") + "/"):
+                    add(prefix)
+            for key, rx in self.globs:
+                if rx.match(path):
+                    add(key)
+            if path.endswith("/"):
+                # A directory mention pulls in every exact law beneath it.
+                for key in self.exact:
+                    if key.startswith(path):
+                        add(key)
+        return matched
+
+
+@dataclass
+class Brain:
+    data: Dict[str, Any]
+    warnings: List[str] = field(default_factory=list)
+    _matcher: Optional[BrainMatcher] = None
+    _law_index: Optional[LawIndex] = None
+
+    @property
+    def repo_laws(self) -> List[str]:
+        return self.data["repo_laws"]
+
+    @property
+    def file_laws(self) -> Dict[str, List[str]]:
+        return self.data["file_laws"]
+
+    @property
+    def error_patterns(self) -> List[Dict[str, Any]]:
+        return self.data["error_patterns"]
+
+    @property
+    def successful_examples(self) -> List[Dict[str, Any]]:
+        return self.data["successful_examples"]
+
+    @property
+    def law_index(self) -> LawIndex:
+        if self._law_index is None:
+            self._law_index = LawIndex(self.file_laws)
+        return self._law_index
+
+    @property
+    def matcher(self) -> BrainMatcher:
+        if self._matcher is None:
+            self._matcher = BrainMatcher(
+                [
+                    ErrorPattern(p["pattern"], p.get("recommendation", ""), bool(p.get("regex")))
+                    for p in self.error_patterns
+                ]
+            )
+        return self._matcher
+
+
+def validate_brain(raw: Any) -> Tuple[Dict[str, Any], List[str]]:
+    """Return (normalized brain, warnings). Unknown top-level keys are kept."""
+    warnings: List[str] = []
+    data = empty_brain()
+    if not isinstance(raw, dict):
+        return data, ["brain root is not a JSON object"]
+
+    for key, value in raw.items():
+        if key not in data:
+            data[key] = value
+
+    laws = raw.get("repo_laws", [])
+    if isinstance(laws, list):
+        data["repo_laws"] = [law for law in laws if isinstance(law, str) and law.strip()]
+    else:
+        warnings.append("repo_laws is not a list")
+
+    file_laws = raw.get("file_laws", {})
+    if isinstance(file_laws, dict):
+        for path, entries in file_laws.items():
+            if isinstance(entries, str):
+                entries = [entries]
+            if not isinstance(entries, list):
+                warnings.append(f"file_laws[{path!r}] is not a list")
+                continue
+            data["file_laws"][path] = [e for e in entries if isinstance(e, str)]
+    else:
+        warnings.append("file_laws is not an object")
+
+    patterns = raw.get("error_patterns", [])
+    if not isinstance(patterns, list):
+        warnings.append("error_patterns is not a list")
+        patterns = []
+    for i, entry in enumerate(patterns):
+        if not isinstance(entry, dict) or not isinstance(entry.get("pattern"), str) or not entry["pattern"]:
+            warnings.append(f"error_patterns[{i}] has no 'pattern' string")
+            continue
+        entry = dict(entry)
+        entry.setdefault("recommendation", "")
+        if entry.get("regex"):
+            try:
+                re.compile(entry["pattern"])
+            except re.error as e:
+                warnings.append(f"error_patterns[{i}] invalid regex ({e}); matching it literally")
+                entry["regex"] = False
+        data["error_patterns"].append(entry)
+
+    examples = raw.get("successful_examples", [])
+    if isinstance(examples, list):
+        data["successful_examples"] = [e for e in examples if isinstance(e, dict)]
+    else:
+        warnings.append("successful_examples is not a list")
+
+    return data, warnings
+
+
+_CACHE: Dict[Path, Tuple[int, int, Brain]] = {}
+
+
+def get_brain(path: Path = BRAIN_PATH) -> Brain:
+    """Cached, validated brain; re-read only when the file changes."""
+    path = Path(path)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return Brain(empty_brain())
+
+    cached = _CACHE.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+
+    try:
+        raw = json.loads(path.read_text() or "{}")
+    except Exception as e:
+        # If brain file corrupt, fail soft
+        print(f"[BRAIN] Could not parse {path.name}: {e}")
+        raw = {}
+    data, warnings = validate_brain(raw)
+    for w in warnings:
+        print(f"[BRAIN] Warning: {w}")
+
+    brain = Brain(data, warnings)
+    _CACHE[path] = (st.st_mtime_ns, st.st_size, brain)
+    return brain
+
+
+@fetti_trace.traced(cat="brain")
+def recommendations_for(log_text: str) -> List[PatternHit]:
+    """Error patterns from the brain that fire on `log_text`."""
+    return get_brain().matcher.scan_text(log_text)
+
+
+def format_hits(hits: List[PatternHit]) -> str:
+    """Prompt-ready list of triggered recommendations ('' if none)."""
+    lines = []
+    for hit in hits:
+        lines.append(f"- \"{hit.pattern.pattern}\" (seen {hit.count}x): {hit.pattern.recommendation}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    brain = get_brain()
+    if not args:
+        print(
+            f"[BRAIN] {len(brain.repo_laws)} repo laws, {len(brain.file_laws)} file law paths, "
+            f"{len(brain.error_patterns)} error patterns, {len(brain.successful_examples)} examples."
+        )
+        print("Usage: python3 fetti_brain.py LOGFILE [LOGFILE ...]  – scan logs for known error patterns")
+        return 0
+
+    for log in args:
+        hits = brain.matcher.scan_file(Path(log))
+        print(f"[BRAIN] {log}: {len(hits)} known pattern(s) triggered")
+        for hit in hits:
+            print(f"  - {hit.pattern.pattern} (x{hit.count})")
+            print(f"    → {hit.pattern.recommendation}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,54 +1,133 @@
 from __future__ import annotations
-from pathlib import Path
-import json
-from typing import Any, Dict, List
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-BRAIN_PATH = Path("fetti_brain.json")
-ERRORS_PATH = Path("fetti_last_errors.json")
+import fetti_trace
+from fetti_brain import get_brain, paths_in_text
+from fetti_error_logger import journal_key, read_errors
+from fetti_learn import error_lines, normalize_signature
+
+DIGEST_MAX_CHARS = 2000
+DIGEST_LINE_CHARS = 220
+
+_LOCATION_RE = re.compile(
+    r"((?:\./)?[\w@\-./\[\]()]+\.(?:tsx?|jsx?|mjs|cjs|css|json|sql|py))(?::(\d+)(?::\d+)?|\((\d+),\d+\))?"
+)
+# Generic wrapper lines that say *that* something failed, not what
+_BANNER_RE = re.compile(r"^(?:Failed to compile|npm ERR!|ELIFECYCLE|Command failed|Build failed because)", re.I)
+_DIGEST_CACHE: Optional[Tuple[Tuple[int, int], List[str]]] = None
 
 def load_fetti_brain() -> Dict[str, Any]:
-    if not BRAIN_PATH.exists():
-        return {"repo_laws": [], "file_laws": {}, "error_patterns": []}
-    try:
-        data = json.loads(BRAIN_PATH.read_text() or "{}")
-    except Exception:
-        return {"repo_laws": [], "file_laws": {}, "error_patterns": []}
+    brain = get_brain()
     return {
-        "repo_laws": data.get("repo_laws", []),
-        "file_laws": data.get("file_laws", {}),
-        "error_patterns": data.get("error_patterns", []),
+        "repo_laws": brain.repo_laws,
+        "file_laws": brain.file_laws,
+        "error_patterns": brain.error_patterns,
     }
 
+def _location(entry: Dict[str, Any]) -> str:
+    m = _LOCATION_RE.search(entry.get("details") or "")
+    if m:
+        path = m.group(1)[2:] if m.group(1).startswith("./") else m.group(1)
+        line = m.group(2) or m.group(3)
+        return f"{path}:{line}" if line else path
+    return entry.get("file") or ""
+
+
+def _message(entry: Dict[str, Any]) -> str:
+    found = error_lines(entry.get("details") or "", limit=5)
+    specific = [line for line in found if not _BANNER_RE.search(line)]
+    if specific or found:
+        return (specific or found)[0]
+    if entry.get("summary"):
+        return str(entry["summary"]).strip().splitlines()[0]
+    code = entry.get("exit_code")
+    return f"failed (exit code {code})" if code is not None else "failed"
+
+
+def error_digest(max_chars: int = DIGEST_MAX_CHARS) -> List[str]:
+    """
+    One line per distinct error (deduped by step + normalized signature),
+    newest first: "[Build] app/x.tsx:12 – Type error: ... (3x, last <ts>)".
+    Capped at `max_chars` in total; cached until the error journal changes.
+    """
+    global _DIGEST_CACHE
+    key = journal_key()
+    if _DIGEST_CACHE is not None and _DIGEST_CACHE[0] == key:
+        lines = _DIGEST_CACHE[1]
+    else:
+        groups: Dict[str, List[Any]] = {}
+        for entry in read_errors():
+            message = _message(entry)
+            sig = f"{entry.get('step')}|{normalize_signature(message)}"
+            group = groups.pop(sig, None)  # re-insert so the newest ends up last
+            groups[sig] = [entry, message, (group[2] + 1) if group else 1]
+
+        lines = []
+        for entry, message, count in reversed(list(groups.values())):
+            where = _location(entry)
+            text = f"[{entry.get('step')}] {where + ' – ' if where else ''}{message}"
+            suffix = f" ({count}x, last {str(entry.get('ts', ''))[:19]})"
+            if len(text) + len(suffix) > DIGEST_LINE_CHARS:
+                text = text[: DIGEST_LINE_CHARS - len(suffix) - 1] + "…"
+            lines.append(text + suffix)
+        _DIGEST_CACHE = (key, lines)
+
+    out: List[str] = []
+    used = 0
+    for line in lines:
+        if used + len(line) > max_chars:
+            break
+        out.append(line)
+        used += len(line) + 1
+    return out
+
+
 def load_last_errors() -> List[str]:
-    if not ERRORS_PATH.exists():
-        return []
-    try:
-        data = json.loads(ERRORS_PATH.read_text() or "[]")
-        if isinstance(data, list):
-            return [str(e) for e in data]
-        if isinstance(data, dict) and "errors" in data:
-            return [str(e) for e in data["errors"]]
-        return []
-    except Exception:
-        return []
-
-def build_brain_context() -> str:
-    brain = load_fetti_brain()
+    return error_digest()
+
+@fetti_trace.traced(cat="prompt")
+def build_brain_context(
+    candidate_files: Optional[Iterable[str]] = None,
+    log_text: str = "",
+    task: str = "",
+) -> str:
+    """
+    Brain laws for a prompt. Repo-wide laws always go in; file_laws are
+    limited to the ones whose path/prefix/glob covers a candidate file
+    (passed in, or named in `log_text` / `task`) or whose area the task
+    names ("dashboard"). Called with nothing, every file law is included.
+    """
+    brain = get_brain()
     last_errors = load_last_errors()
 
+    candidates = list(candidate_files or [])
+    for text in (task, log_text):
+        candidates += [p for p in paths_in_text(text) if p not in candidates]
+    file_laws = brain.file_laws
+    if candidate_files is None and not log_text and not task:
+        selected = list(file_laws)
+    else:
+        index = brain.law_index
+        selected = index.keys_for(candidates)
+        selected += [k for k in index.keys_mentioned(task) if k not in selected]
+
     lines: List[str] = []
     lines.append("FETTI_BRAIN_LAWS_START")
     lines.append("")
     lines.append("Repo-wide laws:")
-    for law in brain.get("repo_laws", []):
+    for law in brain.repo_laws:
         lines.append(f"- {law}")
 
     lines.append("")
-    lines.append("File-specific laws:")
-    file_laws = brain.get("file_laws", {}) or {}
-    for path, laws in file_laws.items():
+    pruned = len(file_laws) - len(selected)
+    if pruned:
+        lines.append(f"File-specific laws ({len(selected)} kept, {pruned} pruned as unrelated to this change):")
+    else:
+        lines.append("File-specific laws:")
+    for path in selected:
         lines.append(f"- {path}:")
-        for law in laws:
+        for law in file_laws[path]:
             lines.append(f"    • {law}")
 
     lines.append("")
@@ -59,4 +138,5 @@ def build_brain_context() -> str:
     lines.append("")
     lines.append("FETTI_BRAIN_LAWS_END")
 
+    print(f"[BRAIN] File laws: {len(selected)} kept, {pruned} pruned ({len(candidates)} candidate path(s)).")
     return "\n".join(lines)
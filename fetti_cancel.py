@@ -0,0 +1,50 @@
+"""
+Fetti Cancel – stop an in-process job whose requester went away.
+
+fettid runs jobs inside its own process, so killing a job's subprocesses
+is not enough when its client disconnects: the Python side would carry on,
+ask the model, apply the edits and start the next step. request() sets a
+process-wide flag, and the job's outward actions call check() first:
+
+  - model calls (fetti_replay.model_call);
+  - applying a model's edits (the auto AI, wrapper and feature agent loops);
+  - starting subprocesses (fetti_replay.run, the doctor's steps, shards and
+    deploy, the wrappers' doctor runs, the feature runner's commands).
+
+check() raises Cancelled. It is a BaseException, so the `except Exception`
+fallbacks around model calls and edits cannot swallow it, and the job
+unwinds through its finally blocks (tracked_run closes the history run as
+failed). Outside the daemon nothing sets the flag.
+"""
+
+from __future__ import annotations
+
+import threading
+
+
+class Cancelled(BaseException):
+    """Raised by check() once the job has been cancelled."""
+
+
+_FLAG = threading.Event()
+_REASON = ""
+
+
+def request(reason: str) -> None:
+    global _REASON
+    _REASON = reason
+    _FLAG.set()
+
+
+def clear() -> None:
+    _FLAG.clear()
+
+
+def requested() -> bool:
+    return _FLAG.is_set()
+
+
+def check(what: str) -> None:
+    """Raise Cancelled instead of doing `what` once the job has been cancelled."""
+    if _FLAG.is_set():
+        raise Cancelled(f"{_REASON}; not {what}")
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Fetti Daemon – optional resident process that keeps the tools warm.
+
+Every watch trigger used to start fresh interpreters that re-read the brain,
+re-hash the working tree, re-open `git cat-file` and reconfigure the model
+SDKs before doing any work. `fettid` does that once and then runs doctor,
+auto, feature, fix and run jobs in-process, one at a time, for thin clients
+connecting over a Unix socket (.fetti/fettid.sock).
+
+Warm state: the brain with its matcher and law index, GitState (cat-file
+process, HEAD, the tree-hash index), the example index, the validation
+ledger, .env and the LLM clients (their HTTP connection pools).
+
+The client passes its stdin/stdout/stderr over the socket (SCM_RIGHTS) and
+its environment with the request, so a job's output – including npm's –
+goes straight to the caller's terminal. Protocol: one JSON object per line.
+
+  client -> {"op": "run", "argv": ["doctor", "--resume"], "env": {...}}
+  daemon -> {"op": "queued"}           (another job is running)
+            {"op": "started"}
+            {"op": "exit", "code": 0}
+            {"op": "error", "message": "...", "fallback": true}
+
+Module state that belongs to one run – the doctor's per-step resources,
+the parsed .env, the event writer, a replay session, the last flaky
+verdict, the changed areas – is reset before each job, so a job never
+sees the previous one's.
+
+If the client goes away mid-job, the job is cancelled (fetti_cancel): from
+then on it may not call a model, apply edits or start a subprocess, and
+raises out at the first attempt, while its subprocess trees are killed until
+it has unwound. If a fetti_*.py file changed since the daemon started, it
+refuses new jobs (the client falls back to running locally) and exits.
+
+  python3 fetti_daemon.py start | stop | status | serve
+  FETTI_DAEMON=0 makes fetti.py ignore a running daemon.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import fetti_cancel
+import fetti_trace
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+STATE_DIR = PROJECT_ROOT / ".fetti"
+SOCK_PATH = STATE_DIR / "fettid.sock"
+PID_PATH = STATE_DIR / "fettid.pid"
+LOG_PATH = STATE_DIR / "fettid.log"
+
+# fetti.py commands the daemon runs; everything else always runs locally.
+JOB_COMMANDS = ("doctor", "auto", "feature", "fix", "run")
+START_TIMEOUT = 30.0
+SWEEP_INTERVAL = 0.5  # how often a cancelled job's new subprocesses are killed
+
+
+def _send(conn: socket.socket, message: Dict[str, Any], fds: Optional[List[int]] = None) -> None:
+    data = (json.dumps(message) + "\n").encode()
+    if fds:
+        socket.send_fds(conn, [data], fds)
+    else:
+        conn.sendall(data)
+
+
+class _Reader:
+    """Line-oriented JSON reader that also collects fds sent with the data."""
+
+    def __init__(self, conn: socket.socket) -> None:
+        self.conn = conn
+        self.buf = b""
+        self.fds: List[int] = []
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        while b"\n" not in self.buf:
+            data, fds, _, _ = socket.recv_fds(self.conn, 65536, 3)
+            self.fds.extend(fds)
+            if not data:
+                return None
+            self.buf += data
+        line, self.buf = self.buf.split(b"\n", 1)
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return None
+        return message if isinstance(message, dict) else None
+
+
+# ---------------------------------------------------------------- server
+
+
+def _memory_kb() -> Dict[str, int]:
+    """Current and peak RSS of this process, from /proc/self/status."""
+    out: Dict[str, int] = {}
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                out["rss_kb" if key == "VmRSS" else "peak_rss_kb"] = int(value.split()[0])
+    except (OSError, ValueError):
+        import resource
+
+        out["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return out
+
+
+def _source_stamp() -> Dict[str, int]:
+    stamp = {}
+    for path in PROJECT_ROOT.glob("fetti*.py"):
+        try:
+            stamp[path.name] = path.stat().st_mtime_ns
+        except OSError:
+            pass
+    return stamp
+
+
+class Daemon:
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.jobs = 0
+        self.current: Optional[Dict[str, Any]] = None
+        self.last: Optional[Dict[str, Any]] = None
+        self.warm: Dict[str, Any] = {}
+        self.job_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.stamp = _source_stamp()
+
+    def warm_up(self) -> None:
+        """Import the tools and load everything a job would otherwise load per process."""
+        import fetti
+        import fetti_brain
+        import fetti_examples
+        import fetti_ledger
+        import fetti_llm
+        from fetti_git import git_state
+
+        for command in JOB_COMMANDS:
+            module = fetti.COMMANDS[command][0]
+            if module:
+                __import__(module)
+
+        def step(name: str, func) -> None:
+            started = time.monotonic()
+            try:
+                self.warm[name] = func()
+            except Exception as e:
+                self.warm[name] = f"unavailable ({e})"
+            print(f"[DAEMON] warm {name}: {self.warm[name]} ({time.monotonic() - started:.2f}s)")
+
+        def brain() -> str:
+            b = fetti_brain.get_brain()
+            return f"{len(b.error_patterns)} pattern(s), {b.law_index.total} file law(s)"
+
+        def git() -> str:
+            state = git_state()
+            head = state.head()
+            tree = state.tree_hash()
+            return f"HEAD {head[:10] if head else '?'}, tree {tree[:10] if tree else '?'}"
+
+        def llm() -> str:
+            fetti_llm.load_env()
+            clients = []
+            if os.environ.get("OPENAI_API_KEY"):
+                fetti_llm.openai_client()
+                clients.append("openai")
+            if os.environ.get("GEMINI_API_KEY"):
+                fetti_llm.genai_module()
+                clients.append("gemini")
+            return ", ".join(clients) or "no API keys set"
+
+        step("brain", brain)
+        step("git", git)
+        step("examples", lambda: f"{len(fetti_examples.get_index().docs)} example(s)")
+        step("ledger", lambda: f"{fetti_ledger.tree_count()} tree(s)")
+        step("llm", llm)
+
+    def status(self) -> Dict[str, Any]:
+        import fetti_proc
+
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started, 1),
+            "jobs": self.jobs,
+            "running": self.current,
+            "last": self.last,
+            "stale": self.stamp != _source_stamp(),
+            "children": len(fetti_proc.descendants(os.getpid())),
+            "modules": len(sys.modules),
+            "warm": self.warm,
+            **_memory_kb(),
+        }
+
+    # -- jobs
+
+    def run_job(self, conn: socket.socket, reader: _Reader, message: Dict[str, Any]) -> None:
+        import fetti
+        import fetti_proc
+
+        argv = [str(a) for a in message.get("argv") or []]
+        fds = reader.fds  # closed by handle() once the job is over
+        if not argv or argv[0] not in JOB_COMMANDS or len(fds) != 3:
+            _send(conn, {"op": "error", "message": f"not a daemon job: {argv}", "fallback": True})
+            return
+        if self.stamp != _source_stamp():
+            _send(conn, {
+                "op": "error",
+                "message": "Fetti sources changed since fettid started; it is exiting (run `fetti daemon start` again)",
+                "fallback": True,
+            })
+            self.stopping.set()
+            return
+
+        if self.job_lock.locked():
+            _send(conn, {"op": "queued", "running": self.current})
+        with self.job_lock:
+            if self.stopping.is_set():
+                _send(conn, {"op": "error", "message": "daemon is stopping", "fallback": True})
+                return
+            _send(conn, {"op": "started"})
+            self.current = {"argv": argv, "started": time.time()}
+            resident = set(fetti_proc.descendants(os.getpid()))  # e.g. git cat-file
+            done = threading.Event()
+
+            def watch_client() -> None:
+                # Any read completing before the job does means the client left.
+                try:
+                    conn.recv(1)
+                except OSError:
+                    pass
+                if done.is_set():
+                    return
+                print(f"[DAEMON] Client disconnected; cancelling {' '.join(argv)}")
+                fetti_cancel.request("client disconnected")
+                # The flag stops the job's next spawn; a spawn already under way is caught by the sweep.
+                while True:
+                    for pid in fetti_proc.descendants(os.getpid()):
+                        if pid not in resident:
+                            fetti_proc.kill_tree(pid, include_self=True, grace=2.0)
+                    if done.wait(SWEEP_INTERVAL):
+                        return
+
+            fetti_cancel.clear()
+            threading.Thread(target=watch_client, daemon=True).start()
+            code = 1
+            try:
+                code = self._execute(fetti, argv, fds, message.get("env"))
+            finally:
+                done.set()
+                self.jobs += 1
+                self.last = {
+                    "argv": argv,
+                    "exit_code": code,
+                    "duration": round(time.time() - self.current["started"], 1),
+                    "cancelled": fetti_cancel.requested(),
+                }
+                self.current = None
+        try:
+            _send(conn, {"op": "exit", "code": code})
+        except OSError:
+            pass
+
+    def _reset_job_state(self) -> None:
+        """Clear what a previous job left in module globals (the warm caches stay)."""
+        import fetti_auto_ai
+        import fetti_doctor
+        import fetti_events
+        import fetti_history
+        import fetti_llm
+        import fetti_replay
+
+        fetti_doctor.RESOURCES.clear()
+        fetti_auto_ai.LAST_VERDICT = None
+        fetti_history.set_step_areas(None)
+        fetti_llm.reset_env()
+        fetti_events.reset_emitter()
+        fetti_replay.reset_session()
+
+    def _execute(self, fetti: Any, argv: List[str], fds: List[int], env: Optional[Dict[str, str]]) -> int:
+        """Run one fetti command with the client's stdio and environment."""
+        import fetti_llm
+
+        saved_env = dict(os.environ)
+        saved_fds = [os.dup(fd) for fd in (0, 1, 2)]
+        sys.stdout.flush()
+        sys.stderr.flush()
+        try:
+            for target, fd in enumerate(fds):
+                os.dup2(fd, target)
+            try:
+                if isinstance(env, dict):
+                    os.environ.clear()
+                    os.environ.update({str(k): str(v) for k, v in env.items()})
+                    os.environ.pop("FETTI_EVENTS_FD", None)  # the client's fd numbers mean nothing here
+                self._reset_job_state()
+                fetti_llm.load_env()
+                os.environ["FETTI_DAEMON"] = "0"
+                command, rest = argv[0], argv[1:]
+                return fetti._invoke(command, fetti._entry(command, rest), rest)
+            except fetti_cancel.Cancelled as e:
+                print(f"[DAEMON] Job cancelled: {e}")
+                return 130
+            except BaseException:
+                traceback.print_exc()
+                return 1
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            except OSError:
+                pass
+            for target, fd in enumerate(saved_fds):
+                os.dup2(fd, target)
+                os.close(fd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+
+    # -- socket loop
+
+    def handle(self, conn: socket.socket) -> None:
+        reader = _Reader(conn)
+        try:
+            message = reader.read()
+            if message is None:
+                return
+            op = message.get("op")
+            if op == "run":
+                self.run_job(conn, reader, message)
+            elif op == "status":
+                _send(conn, self.status())
+            elif op == "stop":
+                self.stopping.set()
+                _send(conn, {"op": "stopping", "running": self.current})
+            else:
+                _send(conn, {"op": "error", "message": f"unknown op {op!r}"})
+        except OSError:
+            pass
+        finally:
+            for fd in reader.fds:
+                os.close(fd)
+            conn.close()
+
+    def serve(self) -> int:
+        STATE_DIR.mkdir(parents=True, exist_ok=True)
+        pid_file = open(PID_PATH, "a+")
+        try:
+            fcntl.flock(pid_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            print("[DAEMON] Another fettid is already running.")
+            return 1
+        pid_file.seek(0)
+        pid_file.truncate()
+        pid_file.write(f"{os.getpid()}\n")
+        pid_file.flush()
+
+        os.chdir(PROJECT_ROOT)
+        sys.stdout.reconfigure(line_buffering=True)
+        print(f"[DAEMON] fettid {os.getpid()} warming up...")
+        self.warm_up()
+
+        try:
+            SOCK_PATH.unlink()
+        except FileNotFoundError:
+            pass
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(SOCK_PATH))
+        os.chmod(SOCK_PATH, 0o600)
+        server.listen(8)
+        server.settimeout(1.0)
+        print(f"[DAEMON] Listening on {SOCK_PATH.relative_to(PROJECT_ROOT)}")
+        try:
+            while not self.stopping.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            try:
+                SOCK_PATH.unlink()
+            except FileNotFoundError:
+                pass
+            with self.job_lock:  # let a running job finish
+                pass
+            print("[DAEMON] Stopped.")
+        return 0
+
+
+# ---------------------------------------------------------------- client
+
+
+def _connect(timeout: Optional[float] = None) -> Optional[socket.socket]:
+    if not SOCK_PATH.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(str(SOCK_PATH))
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+
+def _request(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    sock = _connect(timeout=2.0)
+    if sock is None:
+        return None
+    with sock:
+        _send(sock, message)
+        return _Reader(sock).read()
+
+
+def run_remote(argv: List[str]) -> Optional[int]:
+    """
+    Run `fetti <argv>` in the daemon and return its exit code, or None when
+    there is no daemon (or it asked us to run locally).
+    """
+    if os.environ.get("FETTI_DAEMON", "1") == "0" or not argv or argv[0] not in JOB_COMMANDS:
+        return None
+    if fetti_trace.enabled():
+        return None  # traced runs stay local so the trace sees the whole job
+    sock = _connect(timeout=2.0)
+    if sock is None:
+        return None
+    with sock:
+        try:
+            _send(sock, {"op": "run", "argv": argv, "env": dict(os.environ)}, fds=[0, 1, 2])
+            reader = _Reader(sock)
+            while True:
+                message = reader.read()
+                if message is None:
+                    print("[DAEMON] Lost connection to fettid mid-job.", file=sys.stderr)
+                    return 1
+                op = message.get("op")
+                if op == "queued":
+                    print("[DAEMON] Waiting for the running fettid job to finish...", file=sys.stderr)
+                elif op == "exit":
+                    return int(message.get("code") or 0)
+                elif op == "error":
+                    print(f"[DAEMON] {message.get('message')}", file=sys.stderr)
+                    return None if message.get("fallback") else 1
+        except KeyboardInterrupt:
+            return 130  # closing the socket makes fettid cancel the job
+
+
+def start() -> int:
+    if _request({"op": "status"}) is not None:
+        print("[DAEMON] fettid is already running.")
+        return 0
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOG_PATH, "ab") as log:
+        proc = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "serve"],
+            cwd=PROJECT_ROOT,
+            env=fetti_trace.untraced_env(),
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            print(f"[DAEMON] fettid exited with code {proc.returncode}; see {LOG_PATH.relative_to(PROJECT_ROOT)}")
+            return 1
+        if _request({"op": "status"}) is not None:
+            print(f"[DAEMON] fettid started (pid {proc.pid}).")
+            return 0
+        time.sleep(0.1)
+    print(f"[DAEMON] fettid did not come up within {START_TIMEOUT:.0f}s; see {LOG_PATH.relative_to(PROJECT_ROOT)}")
+    return 1
+
+
+def stop() -> int:
+    reply = _request({"op": "stop"})
+    if reply is None:
+        print("[DAEMON] fettid is not running.")
+        return 0
+    running = reply.get("running")
+    suffix = f" after the running job ({' '.join(running['argv'])})" if running else ""
+    print(f"[DAEMON] fettid stopping{suffix}.")
+    return 0
+
+
+def print_status() -> int:
+    info = _request({"op": "status"})
+    if info is None:
+        print("[DAEMON] fettid is not running.")
+        return 1
+    print(f"[DAEMON] fettid pid {info['pid']}, up {info['uptime']:.0f}s, {info['jobs']} job(s) served")
+    print(f"  memory: rss {info.get('rss_kb', 0) / 1024:.1f} MiB, peak {info.get('peak_rss_kb', 0) / 1024:.1f} MiB, "
+          f"{info['modules']} modules, {info['children']} child process(es)")
+    if info.get("running"):
+        print(f"  running: {' '.join(info['running']['argv'])}")
+    if info.get("last"):
+        last = info["last"]
+        print(f"  last job: {' '.join(last['argv'])} -> exit {last['exit_code']} in {last['duration']}s")
+    for name, text in (info.get("warm") or {}).items():
+        print(f"  warm {name}: {text}")
+    if info.get("stale"):
+        print("  ⚠ Fetti sources changed since start; the next job will stop the daemon.")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Resident Fetti daemon (fettid)")
+    parser.add_argument("command", choices=["start", "stop", "status", "serve"])
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        return Daemon().serve()
+    return {"start": start, "stop": stop, "status": print_status}[args.command]()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
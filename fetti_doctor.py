@@ -1,15 +1,55 @@
+import argparse
+import collections
 import subprocess
 import textwrap
+import time
 import datetime as _dt
 from pathlib import Path
 import sys
 import json
 import os
-from dotenv import load_dotenv
 
-load_dotenv()  # Load .env file
+import fetti_cancel
+import fetti_events
+import fetti_flaky
+import fetti_history
+import fetti_ledger
+import fetti_llm
+import fetti_order
+import fetti_proc
+import fetti_shard
+import fetti_steps
+import fetti_trace
+from fetti_brain import recommendations_for
+from fetti_learn import error_lines
+
 
 PROJECT_ROOT = Path(__file__).resolve().parent
+TAIL_LINES = 400  # output kept per step for failure diagnostics
+RESOURCES = {}  # step name -> fetti_proc.Usage for the steps run in this process
+
+
+def sample_interval():
+    """FETTI_SAMPLE_INTERVAL: seconds between /proc samples of a step's process tree (0 = off)."""
+    try:
+        return max(0.0, float(os.environ.get("FETTI_SAMPLE_INTERVAL", "1.0")))
+    except ValueError:
+        return 1.0
+
+
+def mem_limit_kb(name):
+    """
+    Memory ceiling for a step from FETTI_STEP_MEM_MB, e.g. "Build=6144,*=8192"
+    (MB of RSS summed over the step's process tree; "*" applies to every step).
+    """
+    limits = {}
+    for part in os.environ.get("FETTI_STEP_MEM_MB", "").split(","):
+        key, _, value = part.partition("=")
+        try:
+            limits[key.strip().lower()] = int(float(value) * 1024)
+        except ValueError:
+            continue
+    return limits.get(name.lower()) or limits.get("*")
 
 
 def header():
@@ -21,7 +61,8 @@ def header():
             """
             - Runs a multi-step health check for this repo:
                 1) npm run lint
-                2) npm test (only if defined in package.json)
+                2) npm test (only if defined in package.json; a Jest/Vitest suite is
+                   split into parallel shards by recorded per-file duration, FETTI_TEST_SHARDS)
                 3) npm run build
             - Designed to be called with --auto by Fetti Wizard / Wrapper.
             """
@@ -30,22 +71,156 @@ def header():
     print("\n")
 
 
-def run_step(name, cmd):
+def _execute(name, cmd, events):
+    """Run one attempt of a step, teeing its output; returns (code, tail, usage, duration)."""
+    shards = fetti_shard.plan_for(cmd) if name == "Test" else None
+    if shards:
+        return _execute_sharded(name, cmd, shards, events)
+    fetti_cancel.check(f"running {' '.join(cmd)}")
+    started = time.monotonic()
+    tail = collections.deque(maxlen=TAIL_LINES)
+    with fetti_trace.span(" ".join(cmd), cat="cmd") as span:
+        # Tee the step's output: to our stdout as before, into the tail kept for
+        # diagnostics and failure classification, and to the event stream if any.
+        proc = subprocess.Popen(
+            cmd,
+            cwd=PROJECT_ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            bufsize=1,
+        )
+        monitor = fetti_proc.TreeMonitor(proc, sample_interval(), mem_limit_kb(name))
+        for line in proc.stdout:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+            tail.append(line)
+            events.emit("output", step=name, data=line)
+        code = monitor.wait()
+        usage = RESOURCES[name] = monitor.usage
+        span.set(exit_code=code, **usage.as_dict())
+    if usage.killed:
+        # A killed step is a failure even if npm swallowed the signal.
+        code = code or 137
+    return code, "".join(tail), usage, time.monotonic() - started
+
+
+def _execute_sharded(name, cmd, shards, events):
+    """_execute() for a test step split into parallel shards (see fetti_shard.py)."""
+    files = sum(len(s.files) for s in shards)
+    print(f"[FETTI DOCTOR] Splitting {files} test file(s) into {len(shards)} shard(s) by recorded duration "
+          f"(~{max(s.estimate for s in shards):.1f}s each, ~{sum(s.estimate for s in shards):.1f}s serial).\n")
+    started = time.monotonic()
+
+    def done(shard):
+        mark = "✅" if shard.exit_code == 0 else f"❌ (exit code {shard.exit_code})"
+        print(f"[FETTI DOCTOR] --- {name} shard {shard.index}/{len(shards)}: {len(shard.files)} file(s), "
+              f"{shard.duration:.1f}s {mark} ---")
+        for line in shard.output.splitlines(keepends=True):
+            sys.stdout.write(line)
+            events.emit("output", step=name, shard=shard.index, data=line)
+        sys.stdout.flush()
+        events.emit("shard_end", step=name, shard=shard.index, files=len(shard.files),
+                    exit_code=shard.exit_code, duration=round(shard.duration, 2), estimate=round(shard.estimate, 2))
+
+    with fetti_trace.span(" ".join(cmd), cat="cmd", shards=len(shards)) as span:
+        code = fetti_shard.run(cmd, shards, done, sample_interval(), mem_limit_kb(name))
+        span.set(exit_code=code)
+    duration = time.monotonic() - started
+    fetti_shard.update_timings(shards)
+    usage = RESOURCES[name] = fetti_proc.combine([s.usage for s in shards if s.usage is not None])
+
+    print(f"\n[FETTI DOCTOR] {name} shards ({len(shards)} in parallel, wall {duration:.1f}s):")
+    for shard in sorted(shards, key=lambda s: s.index):
+        print(f"  #{shard.index:<3} {len(shard.files):>4} file(s)  est {shard.estimate:6.1f}s  "
+              f"took {shard.duration:6.1f}s  exit {shard.exit_code}")
+    # Failing shards last, so their output survives in the diagnostics tail.
+    tail = collections.deque(maxlen=TAIL_LINES)
+    for shard in sorted(shards, key=lambda s: (s.exit_code != 0, s.index)):
+        tail.extend(shard.output.splitlines(keepends=True))
+    return code, "".join(tail), usage, duration
+
+
+def run_step(name, cmd, tree=None):
     now = _dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print("\n" + "=" * 60)
     print(f"[{now}] FETTI DOCTOR – Step: {name}")
     print("=" * 60)
     print(f"[FETTI DOCTOR] $ {' '.join(cmd)}\n")
 
-    proc = subprocess.run(cmd, cwd=PROJECT_ROOT, text=True)
-    code = proc.returncode
+    events = fetti_events.emitter()
+    events.emit("step_start", step=name, cmd=cmd)
+
+    passed, ledger_tree = fetti_ledger.lookup(cmd)
+    if passed:
+        print(f"[FETTI DOCTOR] Step '{name}' ✅ already passed on tree {fetti_ledger.describe(ledger_tree)} (ledger) – skipping.")
+        fetti_history.record_step(cmd, None, 0, skipped=True, name=name)
+        events.emit("step_end", step=name, exit_code=0, duration=0.0, skipped="ledger")
+        return 0
+    tree = tree or ledger_tree
+
+    # Transient failures (npm network errors, OOM kills, inputs that passed
+    # before) get a bounded plain retry; see fetti_flaky.
+    verdict = None
+    retries = 0
+    total = 0.0
+    while True:
+        code, output, usage, duration = _execute(name, cmd, events)
+        total += duration
+        fetti_history.record_step(cmd, duration, code, name=name, resources=usage.as_dict())
+        if code == 0:
+            break
+        verdict = fetti_flaky.classify(cmd, code, output, tree, killed=usage.killed)
+        if not verdict.transient or retries >= fetti_flaky.max_retries():
+            break
+        retries += 1
+        print(f"\n[FETTI DOCTOR] Step '{name}' failed, {verdict.label()} – "
+              f"retrying ({retries}/{fetti_flaky.max_retries()}) in {fetti_flaky.backoff():g}s...")
+        events.emit("step_retry", step=name, exit_code=code, attempt=retries, reason=verdict.reason)
+        time.sleep(fetti_flaky.backoff())
+
+    fetti_ledger.record(cmd, ledger_tree, code == 0, total)
+    if verdict is not None:
+        fetti_flaky.record(name, cmd, code, verdict, retries, recovered=code == 0)
     if code == 0:
-        print(f"\n[FETTI DOCTOR] Step '{name}' ✅ (exit code 0)")
+        fetti_flaky.note_result(cmd, tree, 0)
+        recovered = f" after {retries} retr{'y' if retries == 1 else 'ies'} ({verdict.reason})" if retries else ""
+        print(f"\n[FETTI DOCTOR] Step '{name}' ✅ (exit code 0){recovered}")
     else:
-        print(f"\n[FETTI DOCTOR] Step '{name}' ❌ (exit code {code})")
+        print(f"\n[FETTI DOCTOR] Step '{name}' ❌ (exit code {code}) – {verdict.label()}")
+    print(f"[FETTI DOCTOR] Step '{name}' resources: {usage.summary()}")
+
+    diagnostics = None
+    if code != 0 and output:
+        diagnostics = {
+            "errors": error_lines(output, limit=5),
+            "known": [
+                {"pattern": h.pattern.pattern, "recommendation": h.pattern.recommendation, "count": h.count}
+                for h in recommendations_for(output)
+            ],
+        }
+    events.emit(
+        "step_end",
+        step=name,
+        exit_code=code,
+        duration=round(total, 2),
+        skipped=None,
+        diagnostics=diagnostics,
+        resources=usage.as_dict(),
+        flaky=fetti_flaky.as_event(verdict, retries) if verdict is not None else None,
+    )
     return code
 
 
+def print_resource_summary():
+    if not RESOURCES:
+        return
+    print("\n[FETTI DOCTOR] Resources per step:")
+    for name, usage in RESOURCES.items():
+        print(f"  {name:<8} {usage.summary()}")
+
+
 def get_steps():
     steps = [("Lint", ["npm", "run", "lint"])]
 
@@ -62,20 +237,87 @@ def get_steps():
     return steps
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetti Doctor – lint / test / build health check")
+    parser.add_argument("--auto", action="store_true", help="Non-interactive mode (used by the wrappers).")
+    parser.add_argument("--start-at", metavar="STEP", help="Skip the steps before STEP (e.g. Build).")
+    parser.add_argument("--only", metavar="STEPS", help="Comma-separated steps to run, e.g. Lint,Build.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Rerun the step that failed last time; skip only steps whose inputs are unchanged since they passed.",
+    )
+    parser.add_argument(
+        "--fixed-order",
+        action="store_true",
+        help="Run the steps in their listed order instead of fail-fast order from history (FETTI_STEP_ORDER=fixed).",
+    )
+    parser.add_argument("--trace", metavar="OUT.json", help="Write a Chrome trace of this run (see fetti_trace.py).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fetti_trace.start(args.trace)
+    fetti_llm.load_env()  # .env may set FETTI_* knobs read below
     header()
+    with fetti_history.tracked_run("doctor"):
+        run_checks(args)
+
 
+def run_checks(args) -> None:
+    """Select, order and run the steps; always ends in sys.exit() with the doctor's exit code."""
     steps = get_steps()
+    tree = fetti_steps.current_tree()
+    try:
+        plan = fetti_steps.select_steps(
+            "doctor",
+            steps,
+            start_at=args.start_at,
+            only=args.only.split(",") if args.only else None,
+            resume=args.resume,
+            tree=tree,
+        )
+    except ValueError as e:
+        print(f"[FETTI DOCTOR] {e}")
+        sys.exit(2)
+    first = fetti_steps.failed_step("doctor") if args.resume and not args.start_at else None
+    plan = fetti_order.order_plan("doctor", plan, fixed=args.fixed_order, first=first)
+
+    events = fetti_events.emitter()
+    events.emit("run_start", steps=[name for name, _, reason in plan if not reason])
+
     failed_step = None
     failed_code = 0
 
-    for name, cmd in steps:
-        code = run_step(name, cmd)
+    for name, cmd, skip_reason in plan:
+        if skip_reason:
+            print(f"[FETTI DOCTOR] Skipping step '{name}' ({skip_reason}).")
+            events.emit("step_end", step=name, exit_code=None, duration=0.0, skipped=skip_reason)
+            continue
+        started = time.monotonic()
+        with fetti_trace.span(name, cat="step") as span:
+            code = run_step(name, cmd, tree)
+            span.set(exit_code=code)
+        fetti_steps.record_result(
+            "doctor", name, cmd, code, fetti_steps.fingerprint(cmd, tree), time.monotonic() - started
+        )
         if code != 0:
             failed_step = name
             failed_code = code
             break
 
+    unverified = fetti_steps.unverified(plan)
+    events.emit(
+        "run_end", ok=failed_step is None, failed_step=failed_step, exit_code=failed_code, unverified=unverified
+    )
+    print_resource_summary()
+    if failed_step is None and unverified:
+        # --start-at / --only: what ran passed, but this is not a full health check.
+        print(f"\n[FETTI DOCTOR] Steps run passed. ✅ Not run, with no pass on this tree: {', '.join(unverified)}.")
+        if os.environ.get("FETTI_AUTO_DEPLOY") == "1":
+            print("[FETTI DOCTOR] Auto-deploy skipped – it needs every step to have passed on this tree.")
+        sys.exit(0)
     if failed_step is None:
         print("\n[FETTI DOCTOR] All steps passed. ✅")
         
@@ -83,6 +325,7 @@ def main():
         if os.environ.get("FETTI_AUTO_DEPLOY") == "1":
             print("\n[FETTI DOCTOR] Auto-deploy enabled – running `npm run fetti:deploy`...")
             try:
+                fetti_cancel.check("deploying")
                 subprocess.run(["npm", "run", "fetti:deploy"], check=True)
                 print("[FETTI DOCTOR] Auto-deploy completed successfully.")
             except subprocess.CalledProcessError as e:
@@ -92,8 +335,7 @@ def main():
         print("[FETTI DOCTOR] Lint / Test (if any) / Build all succeeded with no critical issues.\n")
         sys.exit(0)
     else:
-        print("\n[FETTI DOCTOR] Health check failed. ❌")
-        print(f"with exit code {failed_code}. ❌")
+        print(f"\n[FETTI DOCTOR] Health check failed at step '{failed_step}' with exit code {failed_code}. ❌")
         sys.exit(failed_code)
 
 
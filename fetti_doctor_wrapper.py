@@ -13,12 +13,18 @@ Behavior:
 """
 
 import argparse
-import json
 import os
 import subprocess
 import sys
+import time
 from datetime import datetime
-from pathlib import Path
+
+import fetti_cancel
+import fetti_history
+import fetti_ledger
+import fetti_queue
+import fetti_trace
+from fetti_error_logger import record_error
 
 
 def run_step(name: str, cmd: list[str]) -> int:
@@ -27,7 +33,19 @@ def run_step(name: str, cmd: list[str]) -> int:
     print(f"[{datetime.now().isoformat(sep=' ', timespec='seconds')}] FETTI DOCTOR – Step: {name}")
     print("=" * 60)
     print(f"[FETTI DOCTOR] $ {' '.join(cmd)}\n")
-    result = subprocess.run(cmd)
+    passed, tree = fetti_ledger.lookup(cmd)
+    if passed:
+        print(f"[FETTI DOCTOR] Step '{name}' already passed on tree {fetti_ledger.describe(tree)} (ledger) – skipping.")
+        fetti_history.record_step(cmd, None, 0, skipped=True, name=name)
+        return 0
+    fetti_cancel.check(f"running {' '.join(cmd)}")
+    started = time.monotonic()
+    with fetti_trace.span(" ".join(cmd), cat="cmd") as span:
+        result = subprocess.run(cmd)
+        span.set(exit_code=result.returncode)
+    duration = time.monotonic() - started
+    fetti_ledger.record(cmd, tree, result.returncode == 0, duration)
+    fetti_history.record_step(cmd, duration, result.returncode, name=name)
     return result.returncode
 
 
@@ -36,8 +54,6 @@ def main() -> None:
     parser.add_argument("--auto", action="store_true", help="Run in auto mode (currently same behavior).")
     _ = parser.parse_args()  # we don't actually branch on this yet
 
-    errors_path = Path("fetti_last_errors.json")
-
     steps = [
         ("Lint", ["npm", "run", "lint"]),
         ("Build", ["npm", "run", "build"]),
@@ -46,42 +62,26 @@ def main() -> None:
     failed_step = None
     failed_code = 0
 
-    for name, cmd in steps:
-        code = run_step(name, cmd)
-        if code != 0:
-            failed_step = name
-            failed_code = code
-            break
-
-    if failed_step is not None:
-        # record simple failure info for the feature agent brain
-        errors_path.write_text(
-            json.dumps(
-                {
-                    "failed_step": failed_step,
-                    "exit_code": failed_code,
-                    "timestamp": datetime.now().isoformat(),
-                },
-                indent=2,
+    with fetti_history.tracked_run("doctor_wrapper"):
+        for name, cmd in steps:
+            code = run_step(name, cmd)
+            if code != 0:
+                failed_step = name
+                failed_code = code
+                break
+
+        if failed_step is not None:
+            # record simple failure info for the feature agent brain
+            record_error(
+                "doctor_wrapper",
+                failed_step,
+                f"Step '{failed_step}' exited with code {failed_code}",
+                exit_code=failed_code,
             )
-            + "\n"
-        )
-        print("\n[FETTI DOCTOR] Health check failed. ❌")
-        sys.exit(failed_code)
-
-    # All steps passed
-    errors_path.write_text(
-        json.dumps(
-            {
-                "failed_step": None,
-                "exit_code": 0,
-                "timestamp": datetime.now().isoformat(),
-            },
-            indent=2,
-        )
-        + "\n"
-    )
+            print("\n[FETTI DOCTOR] Health check failed. ❌")
+            sys.exit(failed_code)
 
+    # All steps passed (the error journal only records failures)
     print("\n[FETTI DOCTOR] All steps passed. ✅")
     print("[FETTI DOCTOR] Lint / Test (if any) / Build all succeeded with no critical issues.\n")
 
@@ -89,7 +89,9 @@ def main() -> None:
     if os.environ.get("FETTI_AUTO_DEPLOY") == "1":
         print("[FETTI DOCTOR] Auto-deploy enabled – running `npm run fetti:deploy`...")
         try:
-            subprocess.run(["npm", "run", "fetti:deploy"], check=True)
+            fetti_cancel.check("deploying")
+            with fetti_queue.hold("deploy"):  # a stale-input cancel must not cut a push short
+                subprocess.run(["npm", "run", "fetti:deploy"], check=True)
             print("[FETTI DOCTOR] Auto-deploy completed successfully.")
         except subprocess.CalledProcessError as e:
             print(f"[FETTI DOCTOR] Auto-deploy failed with code {e.returncode}.")
@@ -1,44 +1,196 @@
+"""
+Fetti Error Logger – append-only journal of failed steps.
+
+Every failure is one JSON line in .fetti/error_journal.jsonl, appended under
+an advisory lock (O(1), concurrent doctor/agent runs no longer clobber each
+other). Once the journal grows past COMPACT_BYTES it is rewritten to its
+last RING_SIZE entries.
+
+Schema (v1):
+  {"v": 1, "ts": iso8601, "source": str, "step": str,
+   "exit_code": int|null, "file": str|null, "summary": str|null, "details": str}
+
+read_errors() also understands the formats older tools wrote to
+fetti_last_errors.json (a list / {"errors": [...]} of entries,
+{"timestamp", "steps": [...]} and {"failed_step", "exit_code", "timestamp"});
+the first append seeds the journal from that file.
+"""
+
 from __future__ import annotations
-from pathlib import Path
+
 import json
-from typing import Any, Dict, List
 from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
-ERRORS_PATH = Path("fetti_last_errors.json")
+import fetti_trace
+from fetti_fs import atomic_write_text, file_lock
 
-def _read_errors() -> List[Dict[str, Any]]:
-    if not ERRORS_PATH.exists():
-        return []
+PROJECT_ROOT = Path(__file__).resolve().parent
+ERRORS_PATH = PROJECT_ROOT / "fetti_last_errors.json"  # legacy, read-only
+JOURNAL_PATH = PROJECT_ROOT / ".fetti" / "error_journal.jsonl"
+SCHEMA_VERSION = 1
+RING_SIZE = 30
+DETAILS_CHARS = 8000
+COMPACT_BYTES = 1024 * 1024  # comfortably above a full ring of 8k entries
+
+
+def make_entry(
+    source: str,
+    step: Optional[str],
+    details: str = "",
+    exit_code: Optional[int] = None,
+    file: Optional[str] = None,
+    summary: Optional[str] = None,
+    ts: Optional[str] = None,
+) -> Dict[str, Any]:
+    return {
+        "v": SCHEMA_VERSION,
+        "ts": ts or datetime.utcnow().isoformat() + "Z",
+        "source": source,
+        "step": step or "Unknown",
+        "exit_code": exit_code,
+        "file": file,
+        "summary": summary,
+        "details": (details or "")[-DETAILS_CHARS:],  # last 8k chars
+    }
+
+
+# -- legacy shims -----------------------------------------------------------
+
+def _upgrade(entry: Any) -> Optional[Dict[str, Any]]:
+    """One journal entry (any version) in the current schema."""
+    if not isinstance(entry, dict):
+        return None
+    if entry.get("v") == SCHEMA_VERSION:
+        return entry
+    # Pre-journal fetti_error_logger entry: {ts, source, step, details}
+    return make_entry(
+        str(entry.get("source") or "legacy"),
+        entry.get("step"),
+        str(entry.get("details") or ""),
+        exit_code=entry.get("exit_code"),
+        file=entry.get("file"),
+        summary=entry.get("summary"),
+        ts=str(entry.get("ts") or ""),
+    )
+
+
+def _read_legacy() -> List[Dict[str, Any]]:
+    """Entries from fetti_last_errors.json, whichever tool wrote it."""
     try:
         data = json.loads(ERRORS_PATH.read_text() or "[]")
-        if isinstance(data, list):
-            return data
-        if isinstance(data, dict) and "errors" in data:
-            return data["errors"]  # backwards-compat
-        return []
     except Exception:
         return []
 
-def _write_errors(errors: List[Dict[str, Any]]) -> None:
-    ERRORS_PATH.write_text(json.dumps(errors, indent=2) + "\n")
-
-def record_error(source: str, step: str, details: str) -> None:
-    """
-    Append a new error entry to fetti_last_errors.json, keeping only
-    the last ~30 errors. Details are truncated to avoid huge files.
-    """
-    errors = _read_errors()
-    errors.append({
-        "ts": datetime.utcnow().isoformat() + "Z",
-        "source": source,
-        "step": step,
-        "details": details[-8000:],  # last 8k chars
-    })
-    # keep only last 30
-    errors = errors[-30:]
-    _write_errors(errors)
+    if isinstance(data, dict) and "errors" in data:
+        data = data["errors"]
+    if isinstance(data, list):
+        return [e for e in map(_upgrade, data) if e]
+    if not isinstance(data, dict):
+        return []
+
+    if "steps" in data:  # fetti_memory_utils: {timestamp, steps: [{step, file, summary}]}
+        out = []
+        for step in data.get("steps") or []:
+            if isinstance(step, dict):
+                out.append(
+                    make_entry(
+                        "memory_utils",
+                        step.get("step"),
+                        str(step.get("summary") or ""),
+                        file=step.get("file"),
+                        summary=step.get("summary"),
+                        ts=data.get("timestamp"),
+                    )
+                )
+        return out
+    if "failed_step" in data:  # fetti_doctor_wrapper: {failed_step, exit_code, timestamp}
+        return [
+            make_entry(
+                "doctor_wrapper",
+                data.get("failed_step"),
+                f"exit code {data.get('exit_code')}",
+                exit_code=data.get("exit_code"),
+                ts=data.get("timestamp"),
+            )
+        ]
+    return []
+
+
+# -- journal ----------------------------------------------------------------
+
+def _read_journal() -> List[Dict[str, Any]]:
+    entries = []
+    try:
+        with JOURNAL_PATH.open("rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # partially written line
+                try:
+                    entry = _upgrade(json.loads(raw))
+                except ValueError:
+                    continue
+                if entry:
+                    entries.append(entry)
+    except FileNotFoundError:
+        return _read_legacy()
+    return entries
+
+
+def journal_key() -> Tuple[int, int]:
+    """Changes whenever the error history does (for callers that cache)."""
+    for path in (JOURNAL_PATH, ERRORS_PATH):
+        try:
+            st = path.stat()
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            continue
+    return 0, 0
+
+
+def read_errors(limit: int = RING_SIZE) -> List[Dict[str, Any]]:
+    """The last `limit` recorded errors in the v1 schema, oldest first."""
+    return _read_journal()[-limit:]
+
+
+def _write_ring(entries: List[Dict[str, Any]]) -> None:
+    atomic_write_text(JOURNAL_PATH, "".join(json.dumps(e) + "\n" for e in entries[-RING_SIZE:]))
+
+
+def compact() -> None:
+    """Rewrite the journal to its last RING_SIZE entries."""
+    with file_lock(JOURNAL_PATH):
+        _write_ring(_read_journal())
+
+
+@fetti_trace.traced()
+def record_error(
+    source: str,
+    step: str,
+    details: str,
+    exit_code: Optional[int] = None,
+    file: Optional[str] = None,
+    summary: Optional[str] = None,
+) -> None:
+    """Append a new error entry to the journal (compacting it now and then)."""
+    entry = make_entry(source, step, details, exit_code=exit_code, file=file, summary=summary)
+    try:
+        with file_lock(JOURNAL_PATH):
+            if not JOURNAL_PATH.exists():
+                # First write: carry over whatever the legacy file held.
+                _write_ring(_read_legacy())
+            with JOURNAL_PATH.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                size = f.tell()
+            if size > COMPACT_BYTES:
+                _write_ring(_read_journal())
+    except OSError as e:
+        print(f"[ERROR LOG] Could not record error: {e}")
+
 
 if __name__ == "__main__":
     # tiny self-test
     record_error("self_test", "demo", "This is a test error from fetti_error_logger.")
-    print("Wrote test error to", ERRORS_PATH)
+    print("Wrote test error to", JOURNAL_PATH)
+    print("Last entry:", read_errors()[-1])
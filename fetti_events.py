@@ -0,0 +1,108 @@
+"""
+Fetti Events – JSON-lines event stream from the doctor to its wrappers.
+
+A wrapper that wants structured results opens a pipe and hands the write
+end to the doctor (FETTI_EVENTS_FD=<fd>, inherited via pass_fds). The
+doctor then writes one JSON object per line:
+
+  {"type": "run_start", "steps": [...]}
+  {"type": "step_start", "step": "Build", "cmd": [...]}
+  {"type": "output", "step": "Build", "data": "<one line of output>"}
+  {"type": "shard_end", "step": "Test", "shard": 2, "files": 14, "exit_code": 0,
+   "duration": 12.8, "estimate": 12.1}
+  {"type": "step_retry", "step": "Build", "exit_code": 1, "attempt": 1, "reason": "..."}
+  {"type": "step_end", "step": "Build", "exit_code": 1, "duration": 41.2,
+   "skipped": null, "diagnostics": {"errors": [...], "known": [...]},
+   "resources": {...}, "flaky": {"transient": false, "reason": "...", "fingerprint": "...", "retries": 0}}
+  {"type": "run_end", "ok": false, "failed_step": "Build", "exit_code": 1, "unverified": []}
+
+Output of a sharded test step (fetti_shard.py) carries "shard": <n>.
+run_end's "unverified" names the steps skipped without a pass on the
+current tree (--start-at / --only); a run with any is not a full pass.
+Without FETTI_EVENTS_FD nothing is emitted and the doctor behaves as before.
+run_with_events() is the consumer side: it starts a command with the pipe
+wired up and yields events as they arrive.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import fetti_cancel
+
+ENV_FD = "FETTI_EVENTS_FD"
+
+
+class EventWriter:
+    def __init__(self, fd: Optional[int]) -> None:
+        self.fd = fd
+
+    @property
+    def enabled(self) -> bool:
+        return self.fd is not None
+
+    def emit(self, type_: str, **fields: Any) -> None:
+        if self.fd is None:
+            return
+        data = (json.dumps({"type": type_, **fields}, default=str) + "\n").encode()
+        try:
+            while data:
+                data = data[os.write(self.fd, data):]
+        except OSError:
+            # Reader went away; keep running without the channel.
+            self.fd = None
+
+
+_WRITER: Optional[EventWriter] = None
+
+
+def emitter() -> EventWriter:
+    """Process-wide writer for the fd named in FETTI_EVENTS_FD (disabled if unset)."""
+    global _WRITER
+    if _WRITER is None:
+        raw = os.environ.get(ENV_FD, "")
+        _WRITER = EventWriter(int(raw) if raw.isdigit() else None)
+    return _WRITER
+
+
+def reset_emitter() -> None:
+    """Drop the cached writer; the next emitter() reads FETTI_EVENTS_FD again (fettid, per job)."""
+    global _WRITER
+    _WRITER = None
+
+
+def run_with_events(cmd: Sequence[str], cwd: Optional[Path] = None) -> "EventStream":
+    """Start `cmd` with an event pipe; iterate the result for its events."""
+    fetti_cancel.check(f"running {' '.join(cmd)}")
+    read_fd, write_fd = os.pipe()
+    env = dict(os.environ, **{ENV_FD: str(write_fd)})
+    try:
+        proc = subprocess.Popen(list(cmd), cwd=cwd, env=env, pass_fds=(write_fd,))
+    finally:
+        os.close(write_fd)  # the child holds the only write end now
+    return EventStream(proc, read_fd)
+
+
+class EventStream:
+    def __init__(self, proc: subprocess.Popen, read_fd: int) -> None:
+        self.proc = proc
+        self._file = os.fdopen(read_fd, "r", encoding="utf-8", errors="replace")
+        self.events: List[Dict[str, Any]] = []
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        with self._file:
+            for line in self._file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(event, dict):
+                    self.events.append(event)
+                    yield event
+
+    def wait(self) -> int:
+        return self.proc.wait()
@@ -0,0 +1,244 @@
+"""
+Fetti Examples – BM25 retrieval of past successful edits for prompts.
+
+Documents are the brain's successful_examples plus every AI session in
+logs/fetti_ai_fixes.log whose outcome was green. Each document is indexed
+on its task / error text, file paths and code tokens (camelCase and
+snake_case split). Given the current task or failure, search() returns the
+top-k most relevant before/after pairs.
+
+The index is persisted in .fetti/examples_index.json together with its
+cursor into the AI log (fetti_ai_log.iter_entries), so each call only
+parses the entries appended since – across log rotations too; brain
+examples are re-indexed when the brain changes.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import fetti_trace
+from fetti_ai_log import START, iter_entries, last_seq
+from fetti_brain import BRAIN_PATH, get_brain
+from fetti_fs import atomic_write_text, file_lock
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+INDEX_PATH = PROJECT_ROOT / ".fetti" / "examples_index.json"
+INDEX_VERSION = 2
+
+K1 = 1.2
+B = 0.75
+SNIPPET_CHARS = 600
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9]*|\d+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "into", "are", "was",
+    "not", "you", "all", "any", "use", "new", "only", "should", "must",
+    "const", "return", "import", "export", "default", "function", "let", "var",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; identifiers contribute both whole and split parts."""
+    tokens: List[str] = []
+    for word in _WORD_RE.findall(text or ""):
+        lower = word.lower()
+        parts = [p.lower() for p in _CAMEL_RE.findall(word)]
+        for tok in [lower] + (parts if len(parts) > 1 else []):
+            if len(tok) >= 2 and tok not in _STOPWORDS:
+                tokens.append(tok)
+    return tokens
+
+
+@dataclass
+class Example:
+    id: str
+    description: str
+    file: str
+    before: str
+    after: str
+    score: float = 0.0
+
+
+def _doc_text(description: str, file: str, before: str, after: str) -> str:
+    # File path and description weigh double: they say what the edit is for.
+    return " ".join([description, description, file, file, before, after])
+
+
+class ExampleIndex:
+    def __init__(self) -> None:
+        self.docs: List[Dict[str, Any]] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_len = 0
+        self.log_cursor = START
+        self.brain_key: Optional[List[int]] = None
+        self.pending: Dict[str, Dict[str, Any]] = {}
+
+    # -- building ---------------------------------------------------------
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        tokens = tokenize(_doc_text(doc["description"], doc["file"], doc["before"], doc["after"]))
+        idx = len(self.docs)
+        doc["len"] = len(tokens)
+        self.docs.append(doc)
+        self.total_len += len(tokens)
+        for tok in tokens:
+            bucket = self.postings.setdefault(tok, {})
+            bucket[idx] = bucket.get(idx, 0) + 1
+
+    def _rebuild(self, docs: List[Dict[str, Any]]) -> None:
+        self.docs, self.postings, self.total_len = [], {}, 0
+        for doc in docs:
+            self.add(doc)
+
+    def refresh(self) -> bool:
+        """Pull in brain changes and new AI log lines. Returns True if anything changed."""
+        changed = False
+        st = BRAIN_PATH.stat() if BRAIN_PATH.exists() else None
+        brain_key = [st.st_mtime_ns, st.st_size] if st else [0, 0]
+        if brain_key != self.brain_key:
+            kept = [d for d in self.docs if not d["id"].startswith("brain:")]
+            brain_docs = []
+            for i, ex in enumerate(get_brain().successful_examples):
+                brain_docs.append(
+                    {
+                        "id": f"brain:{i}",
+                        "description": str(ex.get("description", "")),
+                        "file": str(ex.get("file", "")),
+                        "before": str(ex.get("before", "")),
+                        "after": str(ex.get("after", "")),
+                    }
+                )
+            self._rebuild(brain_docs + kept)
+            self.brain_key = brain_key
+            changed = True
+
+        if last_seq() < self.log_cursor[2]:
+            # Log was deleted or replaced: re-read it from the start.
+            self._rebuild([d for d in self.docs if d["id"].startswith("brain:")])
+            self.pending, self.log_cursor = {}, START
+            changed = True
+
+        for cursor, entry in iter_entries(self.log_cursor):
+            self.log_cursor = cursor
+            changed = True
+            if entry.get("type") == "outcome":
+                session = self.pending.pop(entry.get("session"), None)
+                if session is not None and entry.get("ok"):
+                    self._add_session(session)
+            elif entry.get("id") and entry.get("edits"):
+                self.pending[entry["id"]] = {
+                    "task": entry.get("task") or "",
+                    "failed_step": entry.get("failed_step") or "",
+                    "error_excerpt": (entry.get("error_excerpt") or "")[-1500:],
+                    "edits": entry.get("edits"),
+                }
+        return changed
+
+    def _add_session(self, session: Dict[str, Any]) -> None:
+        context = session["task"] or f"Fix {session['failed_step']} failure: {session['error_excerpt']}"
+        for n, edit in enumerate(session["edits"]):
+            if not isinstance(edit, dict) or not edit.get("file"):
+                continue
+            self.add(
+                {
+                    "id": f"log:{len(self.docs)}:{n}",
+                    "description": context,
+                    "file": str(edit.get("file")),
+                    "before": str(edit.get("before") or ""),
+                    "after": str(edit.get("after") or ""),
+                }
+            )
+
+    # -- querying ---------------------------------------------------------
+
+    def search(self, query: str, k: int = 3) -> List[Example]:
+        n = len(self.docs)
+        if n == 0:
+            return []
+        avgdl = self.total_len / n or 1.0
+        scores: Dict[int, float] = {}
+        for tok in set(tokenize(query)):
+            bucket = self.postings.get(tok)
+            if not bucket:
+                continue
+            idf = math.log(1 + (n - len(bucket) + 0.5) / (len(bucket) + 0.5))
+            for idx, tf in bucket.items():
+                dl = self.docs[idx]["len"]
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        out = []
+        for idx, score in ranked:
+            d = self.docs[idx]
+            out.append(Example(d["id"], d["description"], d["file"], d["before"], d["after"], score))
+        return out
+
+    # -- persistence ------------------------------------------------------
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "version": INDEX_VERSION,
+            "log_cursor": list(self.log_cursor),
+            "brain_key": self.brain_key,
+            "pending": self.pending,
+            "docs": [{k: v for k, v in d.items() if k != "len"} for d in self.docs],
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "ExampleIndex":
+        index = cls()
+        if data.get("version") != INDEX_VERSION:
+            return index
+        index._rebuild(data.get("docs", []))
+        index.log_cursor = tuple(data.get("log_cursor", START))
+        index.brain_key = data.get("brain_key")
+        index.pending = data.get("pending", {})
+        return index
+
+
+_INDEX: Optional[ExampleIndex] = None
+
+
+def get_index() -> ExampleIndex:
+    """Process-wide index, loaded from disk once and refreshed incrementally."""
+    global _INDEX
+    if _INDEX is None:
+        try:
+            _INDEX = ExampleIndex.from_json(json.loads(INDEX_PATH.read_text()))
+        except Exception:
+            _INDEX = ExampleIndex()
+    if _INDEX.refresh():
+        try:
+            with file_lock(INDEX_PATH):
+                atomic_write_text(INDEX_PATH, json.dumps(_INDEX.to_json()))
+        except OSError as e:
+            print(f"[EXAMPLES] Could not persist example index: {e}")
+    return _INDEX
+
+
+@fetti_trace.traced("examples.search", cat="prompt")
+def search(query: str, k: int = 3) -> List[Example]:
+    return get_index().search(query, k)
+
+
+def _clip(text: str) -> str:
+    return text if len(text) <= SNIPPET_CHARS else text[:SNIPPET_CHARS] + "\n…"
+
+
+def format_examples(examples: List[Example], heading: str) -> str:
+    """Prompt block with the before/after pairs ('' if there are none)."""
+    if not examples:
+        return ""
+    lines = [f"\n**{heading}**:"]
+    for ex in examples:
+        lines.append(f"- {ex.description.splitlines()[0][:200] if ex.description else 'Example'}")
+        lines.append(f"  File: {ex.file}")
+        lines.append(f"  Before:\n```\n{_clip(ex.before)}\n```")
+        lines.append(f"  After:\n```\n{_clip(ex.after)}\n```")
+    return "\n".join(lines) + "\n"
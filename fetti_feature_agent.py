@@ -1,30 +1,25 @@
-import os
+from fetti_ai_log import log_ai_outcome, log_ai_session
+from fetti_examples import format_examples, search as search_examples
 from fetti_brain_loader import build_brain_context
+import fetti_cancel
+import fetti_history
+import fetti_ledger
+import fetti_llm
+import fetti_replay
+import fetti_trace
+from fetti_git import SAFE_ROOTS, git_state
+from fetti_repo_map import repo_map
+from fetti_plan import PLAN_PATH, PlanItem, ensure_plan, load_plan, set_task_status
 import json
 import textwrap
 import datetime as _dt
 import subprocess
+import time
 from pathlib import Path
-from typing import List
-
-import google.generativeai as genai
-from dotenv import load_dotenv
-
-load_dotenv()  # Load environment variables from .env file
+from typing import List, Optional, Tuple
 
 PROJECT_ROOT = Path(__file__).resolve().parent
-PLAN_PATH = PROJECT_ROOT / "fetti_feature_plan.md"
-
 
-SAFE_ROOTS = (
-    "app/",
-    "components/",
-    "lib/",
-    "src/",
-    "prisma/",
-    "db/",
-    "supabase/",
-)
 IGNORE_ROOTS = (
     "node_modules/",
     ".next/",
@@ -59,95 +54,24 @@ def banner():
     print("\n")
 
 
-def read_plan() -> List[str]:
+def read_plan() -> List[PlanItem]:
     """
-    Read fetti_feature_plan.md and return *open* tasks.
-
-    Rules:
-    - Lines starting with '- [x]' or '- [X]' are treated as DONE and skipped.
-    - Lines starting with '- [ ]' are OPEN tasks.
-    - Bare bullet lines starting with '-' or '*' are treated as OPEN tasks.
-    - '#' lines and empty lines are ignored.
+    Return the *open* tasks from fetti_feature_plan.md (see fetti_plan for
+    the parsing rules). Creates a template plan if none exists.
     """
-    if not PLAN_PATH.exists():
-        PLAN_PATH.write_text(
-            textwrap.dedent(
-                """\
-                # Fetti Feature Plan
-
-                - [ ] Define lead status enum (NEW, CONTACTED, ENGAGED, DEAD, NOT_QUALIFIED) and make Lead.status required with default NEW.
-                - [ ] Define application status enum (STARTED, IN_PROGRESS, SUBMITTED, INCOMPLETE, WITHDRAWN) and make Application.status required with default STARTED.
-                """
-            )
-        )
-        print(f"[PLAN] Created template plan file at {PLAN_PATH}")
-
-    text = PLAN_PATH.read_text()
-    tasks: List[str] = []
-
-    for raw_line in text.splitlines():
-        line = raw_line.strip()
-        if not line or line.startswith("#"):
-            continue
-
-        # DONE tasks: skip entirely
-        if line.startswith(("- [x]", "- [X]")):
-            continue
-
-        # OPEN checkbox
-        if line.startswith("- [ ]"):
-            task = line.split("]", 1)[-1].strip()
-            if task:
-                tasks.append(task)
-            continue
-
-        # Bare bullet
-        if line.startswith(("-", "*")):
-            task = line[1:].strip()
-            if task:
-                tasks.append(task)
-            continue
-
-        # Fallback: treat as a raw task line
-        tasks.append(line)
-
-    return tasks
+    ensure_plan(PLAN_PATH)
+    plan = load_plan(PLAN_PATH)
+    return plan.open_tasks() if plan else []
 
 
 def mark_task_done(task: str) -> None:
     """
-    Mark the given task as DONE in fetti_feature_plan.md by rewriting
-    the matching line to '- [x] {task}'.
+    Mark the given task as DONE in fetti_feature_plan.md.
 
-    Matching is done on the normalized task text (after stripping bullet / checkbox).
+    Only the task's own line is rewritten, under the plan file lock.
     """
-    if not PLAN_PATH.exists():
-        return
-
-    lines = PLAN_PATH.read_text().splitlines()
-    new_lines: List[str] = []
-
-    for raw_line in lines:
-        line = raw_line.rstrip("\n")
-        stripped = line.strip()
-
-        if not stripped or stripped.startswith("#"):
-            new_lines.append(line)
-            continue
-
-        # Normalize the core task text for comparison
-        core = stripped
-        if stripped.startswith(("- [ ]", "- [x]", "- [X]")):
-            core = stripped.split("]", 1)[-1].strip()
-        elif stripped[0] in "-*":
-            core = stripped[1:].strip()
-
-        if core == task:
-            new_lines.append(f"- [x] {task}")
-        else:
-            new_lines.append(line)
-
-    PLAN_PATH.write_text("\n".join(new_lines) + "\n")
+    if not set_task_status(task, done=True, path=PLAN_PATH):
+        print(f"[PLAN] Could not find task in plan to mark done: {task}")
 
 
 def run_cmd(label: str, cmd: List[str]) -> (bool, str):
@@ -157,10 +81,20 @@ def run_cmd(label: str, cmd: List[str]) -> (bool, str):
     print("=" * 60)
     print(f"[CMD] {' '.join(cmd)}\n")
 
-    proc = subprocess.run(cmd, cwd=PROJECT_ROOT, capture_output=True, text=True)
+    passed, tree = fetti_ledger.lookup(cmd)
+    if passed:
+        print(f"[RESULT] ✅ already passed on tree {fetti_ledger.describe(tree)} (ledger) – skipped")
+        fetti_history.record_step(cmd, None, 0, skipped=True)
+        return True, ""
+
+    started = time.monotonic()
+    proc = fetti_replay.run(cmd, cwd=PROJECT_ROOT)
     out = (proc.stdout or "") + (proc.stderr or "")
     print(out)
     ok = proc.returncode == 0
+    duration = time.monotonic() - started
+    fetti_ledger.record(cmd, tree, ok, duration)
+    fetti_history.record_step(cmd, duration, proc.returncode)
     if ok:
         print(f"[RESULT] ✅ SUCCESS (code {proc.returncode})")
     else:
@@ -168,47 +102,27 @@ def run_cmd(label: str, cmd: List[str]) -> (bool, str):
     return ok, out
 
 
+@fetti_trace.traced(cat="prompt")
 def build_repo_hint() -> str:
     """
-    Build a short text description of existing files under SAFE roots.
+    Build a compact tree of the existing files under SAFE roots (see
+    fetti_repo_map.py; FETTI_REPO_HINT_TOKENS caps its size).
     This is given to the model so it knows what actually exists.
     """
-    lines: List[str] = []
-    for root in SAFE_ROOTS:
-        root_path = PROJECT_ROOT / root
-        if not root_path.exists():
-            lines.append(f"- {root} (missing)")
-            continue
-
-        lines.append(f"- {root}")
-        count = 0
-        for p in root_path.rglob("*"):
-            if p.is_file():
-                rel = p.relative_to(PROJECT_ROOT)
-                lines.append(f"  • {rel}")
-                count += 1
-                if count >= 200:
-                    lines.append("  • ...")
-                    break
-    return "\n".join(lines)
+    return repo_map()
 
 
+@fetti_trace.traced(cat="prompt")
 def get_git_history(max_commits: int = 10) -> str:
     """
-    Get recent git commit history for context.
+    Get recent git commit history for context (cached per HEAD by fetti_git).
     """
     try:
-        result = subprocess.run(
-            ["git", "log", f"-{max_commits}", "--oneline", "--no-decorate"],
-            cwd=PROJECT_ROOT,
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        if result.returncode == 0 and result.stdout:
+        entries = git_state().recent_log(max_commits)
+        if entries:
             lines = ["Recent commits:"]
-            for line in result.stdout.strip().split("\n"):
-                lines.append(f"  • {line}")
+            for sha, subject in entries:
+                lines.append(f"  • {sha} {subject}")
             return "\n".join(lines)
     except Exception:
         pass
@@ -234,6 +148,7 @@ def get_file_preview(file_path: Path, max_lines: int = 50) -> str:
     return ""
 
 
+@fetti_trace.traced(cat="prompt")
 def search_code(pattern: str, file_extensions: List[str] = None) -> str:
     """
     Search for code patterns using grep.
@@ -262,6 +177,7 @@ def search_code(pattern: str, file_extensions: List[str] = None) -> str:
     return ""
 
 
+@fetti_trace.traced(cat="edits")
 def apply_json_edits(edits: List[dict]) -> bool:
     """
     Apply JSON edits: {file, before, after}.
@@ -276,6 +192,7 @@ def apply_json_edits(edits: List[dict]) -> bool:
     applied_any = False
 
     for edit in edits:
+        fetti_cancel.check("applying the model's edits")
         file_rel = edit.get("file")
         before = edit.get("before")
         after = edit.get("after")
@@ -334,18 +251,10 @@ def apply_json_edits(edits: List[dict]) -> bool:
 
     return applied_any
 
-MODEL_NAME = os.environ.get("FETTI_WIZARD_MODEL", "gemini-2.0-flash-thinking-exp")
-API_KEY = os.environ.get("GEMINI_API_KEY")
-
-try:
-    if not API_KEY:
-        print("[WARNING] GEMINI_API_KEY not set. Agent will fail to generate content.")
-    else:
-        genai.configure(api_key=API_KEY)
-except Exception as e:
-    print(f"[ERROR] Failed to configure Gemini client: {e}")
 
-def ai_apply_task(task: str) -> bool:
+@fetti_trace.traced(cat="ai")
+def ai_apply_task(task: str) -> Tuple[bool, Optional[str]]:
+    """(whether any edit was applied, the AI log session id for log_ai_outcome)."""
     print(f"\n[AI] Asking Gemini to implement task:\n      {task}\n")
 
     repo_hint = build_repo_hint()
@@ -353,7 +262,7 @@ def ai_apply_task(task: str) -> bool:
     brain_context = ""
     
     try:
-        brain_ctx = build_brain_context()
+        brain_ctx = build_brain_context(task=task)
         if brain_ctx:
             brain_context = f"\n\n**BRAIN CONTEXT (Previous Learnings)**:\n{brain_ctx}\n"
     except Exception as e:
@@ -376,19 +285,13 @@ def ai_apply_task(task: str) -> bool:
     if file_previews:
         brain_context += "\n**KEY FILE PREVIEWS**:" + "".join(file_previews) + "\n"
     
-    # Add few-shot examples from brain
+    # Add the most relevant past successful edits (brain examples + green AI sessions)
     try:
-        brain_data = json.loads((PROJECT_ROOT / "fetti_brain.json").read_text())
-        examples = brain_data.get("successful_examples", [])
-        if examples:
-            example_text = "\n**SUCCESSFUL EDIT EXAMPLES** (for reference):\n"
-            for ex in examples[:3]:  # Limit to 3 examples
-                example_text += f"- {ex.get('description', 'Example')}\n"
-                example_text += f"  File: {ex.get('file', 'N/A')}\n"
-                example_text += f"  Pattern: Replace specific code with improved version\n"
-            brain_context += example_text
-    except Exception:
-        pass
+        brain_context += format_examples(
+            search_examples(task, k=3), "SUCCESSFUL EDIT EXAMPLES (most relevant to this task)"
+        )
+    except Exception as e:
+        print(f"[AI] Could not load edit examples: {e}")
 
     system_instruction = (
         "You are the Fetti Feature Agent running inside the Fetti CRM repo. "
@@ -463,29 +366,39 @@ Rules:
 - You MUST return valid JSON, nothing else.
 """
 
+    raw = None
+    model_name = fetti_llm.gemini_model_name()
+    started = time.monotonic()
     try:
-        model = genai.GenerativeModel(
-            model_name=MODEL_NAME,
+        raw = fetti_llm.gemini_generate(
+            user_prompt,
+            model_name=model_name,
+            purpose="feature",
             system_instruction=system_instruction,
             generation_config={"response_mime_type": "application/json"}
         )
-        
-        response = model.generate_content(user_prompt)
-        raw = response.text
+        fetti_history.record_llm_call(
+            "gemini", model_name, "feature", time.monotonic() - started, len(user_prompt), len(raw or ""), True
+        )
         print("\n[AI] Raw model output:")
         print(raw)
 
         data = json.loads(raw)
     except Exception as e:
+        if raw is None:
+            fetti_history.record_llm_call(
+                "gemini", model_name, "feature", time.monotonic() - started, len(user_prompt), 0, False
+            )
         print(f"[AI] ❌ Model generation or parsing failed: {e}")
-        return False
+        return False, None
 
     edits = data.get("edits") or []
     if not isinstance(edits, list) or not edits:
         print("[AI] No usable edits found in JSON.")
-        return False
+        return False, None
 
-    return apply_json_edits(edits)
+    session_id = log_ai_session(None, raw, edits, source="feature_agent", task=task)
+    return apply_json_edits(edits), session_id
 
 
 def run_plan():
@@ -493,38 +406,46 @@ def run_plan():
     tasks = read_plan()
     if not tasks:
         print("[PLAN] No open tasks found in fetti_feature_plan.md.")
-        return
+        return True
 
     print(f"[PLAN] Loaded {len(tasks)} task(s) from fetti_feature_plan.md.")
 
     total = len(tasks)
-    for idx, task in enumerate(tasks, start=1):
+    ok = True
+    for idx, item in enumerate(tasks, start=1):
+        task = item.description()
         print("\n" + "-" * 60)
         print(f"[TASK {idx}/{total}] {task}")
         print("-" * 60)
 
-        applied = ai_apply_task(task)
+        applied, session_id = ai_apply_task(task)
         if not applied:
             print(f"[TASK {idx}] AI did not apply any edits. Stopping so you can adjust the task or plan.")
+            ok = False
             break
 
         ok_lint, _ = run_cmd(f"Lint after task {idx}", ["npm", "run", "lint"])
         ok_build, _ = run_cmd(f"Build after task {idx}", ["npm", "run", "build"])
 
+        log_ai_outcome(session_id, ok_lint and ok_build)
         if not (ok_lint and ok_build):
             print(f"[TASK {idx}] Validation failed (lint/build). Stopping so you can inspect and commit/rollback.")
+            ok = False
             break
 
         # Mark the task as completed in the plan file
-        mark_task_done(task)
+        mark_task_done(item.key)
         print(f"[PLAN] Marked task as done in fetti_feature_plan.md.")
         print(f"[TASK {idx}] ✅ Completed and validated.")
 
     print("\n[PLAN] Done processing tasks (or stopped due to an issue).")
+    return ok
 
 
 def main():
-    run_plan()
+    fetti_llm.load_env()
+    with fetti_history.tracked_run("feature_agent") as run_id:
+        fetti_history.end_run(run_plan(), run_id)
 
 
 if __name__ == "__main__":
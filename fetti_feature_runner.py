@@ -2,56 +2,58 @@ from __future__ import annotations
 
 import subprocess
 import sys
+import time
 from pathlib import Path
 
+import fetti_cancel
+import fetti_git
+import fetti_history
+import fetti_ledger
+import fetti_plan
+import fetti_trace
+
 
 def run(cmd, check: bool = False) -> int:
   """Run a command, echo it, and optionally require success."""
+  fetti_cancel.check(f"running {' '.join(cmd)}")
   print(f"[RUN] {' '.join(cmd)}")
-  result = subprocess.run(cmd)
+  with fetti_trace.span(" ".join(cmd), cat="cmd") as span:
+    result = subprocess.run(cmd)
+    span.set(exit_code=result.returncode)
   if check and result.returncode != 0:
     raise SystemExit(result.returncode)
   return result.returncode
 
 
-def git_status_porcelain() -> str:
-  """Return git status --porcelain output, or empty string if git not available."""
-  try:
-    return subprocess.check_output(
-      ["git", "status", "--porcelain"], text=True
-    )
-  except Exception:
-    return ""
+def run_check(cmd) -> int:
+  """Run a validation command unless the ledger says it already passed on this tree."""
+  passed, tree = fetti_ledger.lookup(cmd)
+  if passed:
+    print(f"[RUN] {' '.join(cmd)} – already passed on tree {fetti_ledger.describe(tree)} (ledger), skipping")
+    fetti_history.record_step(cmd, None, 0, skipped=True)
+    return 0
+  started = time.monotonic()
+  code = run(cmd)
+  duration = time.monotonic() - started
+  fetti_ledger.record(cmd, tree, code == 0, duration)
+  fetti_history.record_step(cmd, duration, code)
+  return code
 
 
 def mark_next_task_done(plan_path: Path) -> None:
-  """Mark the first unchecked '-' task in fetti_feature_plan.md as '- [x]'."""
-  text = plan_path.read_text()
-  lines = text.splitlines()
-  changed = False
-
-  for i, line in enumerate(lines):
-    stripped = line.lstrip()
-
-    # Already done
-    if stripped.startswith("- [x]"):
-      continue
-
-    # First unchecked bullet
-    if stripped.startswith("- "):
-      indent_len = len(line) - len(line.lstrip())
-      indent = line[:indent_len]
-      rest = stripped[2:]  # after "- "
-      lines[i] = f"{indent}- [x] {rest}"
-      changed = True
-      break
-
-  if not changed:
+  """Mark the first open task in fetti_feature_plan.md as '- [x]'."""
+  task = fetti_plan.mark_first_open_done(plan_path)
+  if task is None:
     print(f"[PLAN] No unchecked tasks found in {plan_path}; nothing to mark.")
     return
+  print(f"[PLAN] Marked first unchecked task as [x] in {plan_path}: {task.text}")
+
 
-  plan_path.write_text("\n".join(lines))
-  print(f"[PLAN] Marked first unchecked task as [x] in {plan_path}")
+def first_open_key(plan_path: Path) -> str | None:
+  """Key of the first open task, or None if the plan has none."""
+  plan = fetti_plan.load_plan(plan_path)
+  task = plan.first_open_task() if plan else None
+  return task.key if task else None
 
 
 def main() -> None:
@@ -62,8 +64,10 @@ def main() -> None:
   print("   <0001run>  Fetti Feature Runner – Sanity + Plan Auto")
   print("============================================================")
 
-  before_status = git_status_porcelain()
-  if before_status.strip():
+  git = fetti_git.git_state()
+  before_trees = git.root_trees()
+  before_task = first_open_key(plan_path)
+  if git.status():
     print("[RUNNER] Warning: git working tree is not clean.")
     print("[RUNNER] Plan auto-advance will still run, but diffs may include prior changes.")
 
@@ -77,32 +81,47 @@ def main() -> None:
 
   # 2) Sanity check: lint + build
   print("\n[RUNNER] Step 2 – sanity check (npm run lint && npm run build)\n")
-  lint_code = run(["npm", "run", "lint"])
-  build_code = run(["npm", "run", "build"])
+  lint_code = run_check(["npm", "run", "lint"])
+  build_code = run_check(["npm", "run", "build"])
 
   if lint_code != 0 or build_code != 0:
     print("[RUNNER] Sanity check failed (lint and/or build).")
     print("[RUNNER] Plan not updated. Fix errors, commit if needed, then rerun.")
     raise SystemExit(1)
 
-  after_status = git_status_porcelain()
+  # 3) Only mark a task done if something actually changed under SAFE roots
+  after_trees = git.root_trees()
+  if before_trees is None or after_trees is None:
+    print("[RUNNER] Could not hash the working tree (is git available?).")
+    print("[RUNNER] Not marking any plan tasks as completed.")
+    return
 
-  # 3) Only mark a task done if something actually changed on disk
-  if before_status == after_status:
-    print("[RUNNER] No new git changes detected after feature agent.")
+  changes = git.diff_root_trees(before_trees, after_trees)
+  if not changes:
+    print("[RUNNER] No file changes under SAFE roots after feature agent.")
     print("[RUNNER] Not marking any plan tasks as completed.")
     return
 
+  print(f"[RUNNER] Changes under SAFE roots this cycle: {changes.summary()}")
+  for path in sorted(changes.paths):
+    tag = "A" if path in changes.added else "D" if path in changes.deleted else "M"
+    print(f"  {tag} {path}")
+
   if not plan_path.exists():
     print("[RUNNER] fetti_feature_plan.md not found; skipping plan update.")
     return
 
   print("\n[RUNNER] Step 3 – updating fetti_feature_plan.md\n")
-  mark_next_task_done(plan_path)
+  if before_task is not None and first_open_key(plan_path) != before_task:
+    # The feature agent already checked off the task it completed.
+    print("[PLAN] Feature agent already advanced the plan; nothing to mark.")
+  else:
+    mark_next_task_done(plan_path)
 
   print("\n[RUNNER] All good – sanity check passed and plan advanced.")
   print("[RUNNER] Next fetti:watch cycle will move to the next unchecked task.\n")
 
 
 if __name__ == "__main__":
-  main()
+  with fetti_history.tracked_run("feature_runner"):
+    main()
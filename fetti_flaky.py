@@ -0,0 +1,185 @@
+"""
+Fetti Flaky – tell transient step failures from real ones before paying
+for a model call.
+
+A failed step is deterministic whenever its output carries a marker of a
+real code failure (Next's "Failed to compile", "Type error:", tsc's
+"error TS…", a Jest/Vitest "FAIL <file>", ESLint error lines), whatever
+else it says. Otherwise it is transient when
+
+  - its output matches a known transient signature (npm's own network and
+    registry diagnostics – "npm ERR! code ECONNRESET", "npm ERR! 503 …" –
+    Node heap OOM, SIGKILL/OOM-killer exits, busy files), or
+  - the same input fingerprint (command line + working-tree hash, see
+    fetti_steps.fingerprint) passed before: identical inputs cannot have
+    broken the code.
+
+Network and registry signatures only count on npm's diagnostic lines: the
+same words in a test's or a prerendered page's output (a mocked 503, a
+"TypeError: fetch failed") are the code's own failure. Likewise busy files
+and kills only count as npm/Node/shell diagnostics ("Error: EBUSY: …",
+"npm ERR! signal SIGKILL", a shell's "Killed" line), not as words in a log.
+
+A step killed by fetti's own memory ceiling (FETTI_STEP_MEM_MB) is always
+deterministic, whatever its exit code: a re-run would only hit it again.
+
+Transient failures get up to FETTI_FLAKY_RETRIES (default 1) plain re-runs,
+FETTI_FLAKY_BACKOFF seconds apart (default 3). Only deterministic failures
+go to the AI fixers; a transient one that keeps failing stops the loop
+instead of spending a model call.
+
+Every failure goes into the history store (failures table) with its
+verdict, retries and whether the AI was asked. When a fingerprint that an
+AI fix was spent on later passes unchanged, that call is counted as wasted
+(`fetti stats`).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Pattern, Sequence, Tuple
+
+import fetti_history
+from fetti_fs import atomic_write_text, file_lock
+from fetti_steps import fingerprint
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+PASSES_PATH = PROJECT_ROOT / ".fetti" / "step_passes.json"
+MAX_PASSES = 512
+
+NPM_DIAG = r"^npm (?:ERR!|error) "  # npm's own diagnostics (npm <= 8 / npm >= 9)
+BUSY = r"(?:EBUSY|ETXTBSY|EAGAIN|EMFILE|ENFILE)"
+
+DETERMINISTIC_MARKERS: List[Tuple[str, Pattern[str]]] = [
+    ("compile error", re.compile(r"Failed to compile|Type error:|\berror TS\d+:")),
+    ("test failure", re.compile(r"^\s*FAIL\s+\S+\.\w+", re.M)),
+    ("lint error", re.compile(r"^\s*\d+:\d+\s+(?:error|Error:)\s", re.M)),
+]
+TRANSIENT_SIGNATURES: List[Tuple[str, Pattern[str]]] = [
+    ("npm network error", re.compile(
+        NPM_DIAG + r"(?:code )?(?:ECONNRESET|ETIMEDOUT|ECONNREFUSED|EAI_AGAIN|ENOTFOUND|ENETUNREACH|EPIPE"
+        r"|ERR_SOCKET_TIMEOUT)\b|" + NPM_DIAG + r"(?:network|errno (?:ECONNRESET|ETIMEDOUT))\b",
+        re.M,
+    )),
+    ("registry unavailable", re.compile(
+        NPM_DIAG + r"(?:code E(?:502|503|504|429)\b|(?:502|503|504|429) )", re.M
+    )),
+    ("out of memory", re.compile(
+        r"JavaScript heap out of memory|Reached heap limit|Allocation failed - process out of memory"
+        r"|\bENOMEM\b|Cannot allocate memory"
+    )),
+    ("resource busy", re.compile(
+        NPM_DIAG + r"(?:code|errno) " + BUSY + r"\b"
+        r"|^\s*\[?Error: (?:spawn (?:\S+ )?)?" + BUSY + r"\b"
+        r"|^(?:\S*/)?(?:ba|da|z)?sh: .*: Text file busy\s*$"
+        r"|^\W*Another next build process is already running",
+        re.M,
+    )),
+    ("killed by the OS", re.compile(
+        r"^Killed\s*$|^(?:\S*/)?(?:ba|da|z)?sh: (?:line )?\d+: +\d+ Killed\b"
+        r"|" + NPM_DIAG + r"signal SIGKILL\b|exited with code: \S+ and signal: SIGKILL\b",
+        re.M,
+    )),
+    ("worker crashed", re.compile(r"Jest worker encountered \d+ child process exceptions|worker process has failed to exit")),
+]
+# SIGKILL/SIGTERM from outside (OOM killer, a CI timeout). Fetti's own
+# memory ceiling (FETTI_STEP_MEM_MB) exits 137 too, but the caller says
+# so via `killed`, and that kill is never retried.
+TRANSIENT_EXIT_CODES = {-9, -15, 137, 143}
+
+
+@dataclass
+class Verdict:
+    transient: bool
+    reason: str
+    fingerprint: Optional[str] = None
+
+    def label(self) -> str:
+        return f"{'transient' if self.transient else 'deterministic'} ({self.reason})"
+
+
+def max_retries() -> int:
+    try:
+        return max(0, int(os.environ.get("FETTI_FLAKY_RETRIES", "1")))
+    except ValueError:
+        return 1
+
+
+def backoff() -> float:
+    try:
+        return max(0.0, float(os.environ.get("FETTI_FLAKY_BACKOFF", "3")))
+    except ValueError:
+        return 3.0
+
+
+def _passes() -> Dict[str, str]:
+    try:
+        data = json.loads(PASSES_PATH.read_text() or "{}")
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def passed_before(fp: Optional[str]) -> bool:
+    return fp is not None and fp in _passes()
+
+
+def classify(cmd: Sequence[str], exit_code: Optional[int], output: str, tree: Optional[str],
+             killed: Optional[str] = None) -> Verdict:
+    """`killed`: why fetti's memory ceiling killed the step (fetti_proc.Usage.killed), if it did."""
+    fp = fingerprint(cmd, tree)
+    if killed:
+        # The same inputs will grow past the same ceiling again.
+        return Verdict(False, f"killed by the memory ceiling: {killed}"[:80], fp)
+    for name, pattern in DETERMINISTIC_MARKERS:
+        match = pattern.search(output or "")
+        if match:
+            return Verdict(False, f"{name}: {match.group(0).strip()[:60]}", fp)
+    for name, pattern in TRANSIENT_SIGNATURES:
+        match = pattern.search(output or "")
+        if match:
+            return Verdict(True, f"{name}: {match.group(0).strip()[:60]}", fp)
+    if exit_code in TRANSIENT_EXIT_CODES:
+        return Verdict(True, f"killed by a signal (exit code {exit_code})", fp)
+    if passed_before(fp):
+        return Verdict(True, "the same inputs passed before", fp)
+    return Verdict(False, "no transient signature, inputs never passed", fp)
+
+
+def note_result(cmd: Sequence[str], tree: Optional[str], exit_code: int) -> None:
+    """Remember passing fingerprints; a pass also settles earlier AI fixes on those inputs as wasted."""
+    fp = fingerprint(cmd, tree)
+    if fp is None or exit_code != 0:
+        return
+    with file_lock(PASSES_PATH):
+        passes = _passes()
+        passes.pop(fp, None)
+        passes[fp] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        while len(passes) > MAX_PASSES:
+            passes.pop(next(iter(passes)))
+        atomic_write_text(PASSES_PATH, json.dumps(passes) + "\n")
+    fetti_history.mark_fingerprint_passed(fp)
+
+
+def record(
+    name: str,
+    cmd: Sequence[str],
+    exit_code: Optional[int],
+    verdict: Verdict,
+    retries: int,
+    recovered: bool,
+    sent_to_ai: bool = False,
+) -> None:
+    fetti_history.record_failure(
+        name, cmd, verdict.fingerprint, exit_code, verdict.transient, verdict.reason, retries, recovered, sent_to_ai
+    )
+
+
+def as_event(verdict: Verdict, retries: int) -> Dict[str, Any]:
+    return {"transient": verdict.transient, "reason": verdict.reason, "fingerprint": verdict.fingerprint,
+            "retries": retries}
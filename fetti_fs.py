@@ -0,0 +1,76 @@
+"""
+Small filesystem helpers shared by the Fetti tools.
+
+- file_lock: advisory lock on a sidecar ".flock" file so overlapping
+  fetti:watch runs (doctor, agents, runner) don't clobber each other.
+- atomic_write_text: write to a temp file in the same directory and
+  os.replace() it into place, so readers never see a half-written file.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None  # type: ignore[assignment]
+
+PathLike = Union[str, Path]
+
+
+def lock_path_for(path: PathLike) -> Path:
+    """
+    Return the sidecar lock file used for `path` (e.g. plan.md -> plan.md.flock).
+    Deliberately not ".lock", which git and npm use for their own lock files.
+    """
+    p = Path(path)
+    return p.with_name(p.name + ".flock")
+
+
+@contextmanager
+def file_lock(path: PathLike, shared: bool = False) -> Iterator[None]:
+    """
+    Hold an advisory lock for `path` for the duration of the block.
+
+    The lock is taken on a sidecar file rather than `path` itself because
+    atomic_write_text replaces the target inode. On platforms without
+    fcntl this degrades to a no-op.
+    """
+    lock_file = lock_path_for(path)
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            except OSError:
+                pass
+        os.close(fd)
+
+
+def atomic_write_text(path: PathLike, text: str) -> None:
+    """Write `text` to `path` via a temp file + os.replace()."""
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".tmp", dir=target.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        if target.exists():
+            os.chmod(tmp, target.stat().st_mode & 0o777)
+        os.replace(tmp, target)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,327 @@
+"""
+Fetti Git – long-lived git state for the Fetti tools.
+
+Instead of forking `git log` / `git status` for every question, this keeps:
+- one `git cat-file --batch` process for object reads (HEAD, commits),
+- HEAD cached by the mtime of .git/HEAD, the current ref and packed-refs,
+- the recent log cached per HEAD commit,
+- the dirty paths from one `git status` (with the untracked cache, and
+  fsmonitor if the repo has it configured),
+- a content hash of the whole working tree (tree_hash), computed through a
+  private index in .git so only files whose stat changed get re-hashed,
+  plus per-SAFE-root tree ids (root_trees) whose diff is an exact
+  added/modified/deleted file set (diff_root_trees).
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import shutil
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import fetti_trace
+from fetti_fs import file_lock
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+
+# The only roots the Fetti agents may edit; change detection is limited to these.
+SAFE_ROOTS = (
+    "app/",
+    "components/",
+    "lib/",
+    "src/",
+    "prisma/",
+    "db/",
+    "supabase/",
+)
+
+# Never part of the tree hash: dependencies, build output and tool state.
+HASH_EXCLUDES = (
+    "node_modules",
+    ".next",
+    ".turbo",
+    "dist",
+    "build",
+    "logs",
+    ".fetti",
+)
+
+# SAFE root name (e.g. "app") -> git tree id, or None if the root is absent
+RootTrees = Dict[str, Optional[str]]
+
+
+@dataclass
+class ChangeSet:
+    """Exact per-file changes between two RootTrees snapshots."""
+
+    added: Set[str] = field(default_factory=set)
+    modified: Set[str] = field(default_factory=set)
+    deleted: Set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.deleted)
+
+    @property
+    def paths(self) -> Set[str]:
+        return self.added | self.modified | self.deleted
+
+    def summary(self) -> str:
+        return f"+{len(self.added)} ~{len(self.modified)} -{len(self.deleted)}"
+
+
+class GitState:
+    def __init__(self, root: Path = PROJECT_ROOT) -> None:
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self._git_dir: Optional[Path] = None
+        self._head_key: Optional[tuple] = None
+        self._head: Optional[str] = None
+        self._log_cache: Dict[Tuple[str, int], List[Tuple[str, str]]] = {}
+        self._excludes: Optional[List[str]] = None
+
+    # -- plumbing ---------------------------------------------------------
+
+    def git(self, *args: str, env: Optional[Dict[str, str]] = None) -> str:
+        """Run a one-off git command in the repo and return stdout ('' on error)."""
+        try:
+            with fetti_trace.span(f"git {args[0] if args else ''}".strip(), cat="git"):
+                return subprocess.run(
+                    ["git", *args],
+                    cwd=self.root,
+                    capture_output=True,
+                    text=True,
+                    env=env,
+                    check=True,
+                ).stdout
+        except Exception:
+            return ""
+
+    @property
+    def git_dir(self) -> Optional[Path]:
+        if self._git_dir is None:
+            out = self.git("rev-parse", "--absolute-git-dir").strip()
+            self._git_dir = Path(out) if out else None
+        return self._git_dir
+
+    def _batch(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=self.root,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        return self._proc
+
+    def read_object(self, rev: str) -> Optional[Tuple[str, str, bytes]]:
+        """Return (sha, type, content) for `rev`, or None if it doesn't exist."""
+        with self._lock:
+            try:
+                proc = self._batch()
+                proc.stdin.write(rev.encode() + b"\n")
+                proc.stdin.flush()
+                header = proc.stdout.readline().decode().split()
+                if len(header) != 3:
+                    return None  # "<rev> missing" / "<rev> ambiguous"
+                sha, kind, size = header
+                content = proc.stdout.read(int(size))
+                proc.stdout.read(1)  # trailing LF
+                return sha, kind, content
+            except Exception:
+                self._close_batch()
+                return None
+
+    def _close_batch(self) -> None:
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=2)
+        except Exception:
+            proc.kill()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_batch()
+
+    # -- HEAD / log -------------------------------------------------------
+
+    def _head_stat_key(self) -> Optional[tuple]:
+        git_dir = self.git_dir
+        if git_dir is None:
+            return None
+        key = []
+        head_file = git_dir / "HEAD"
+        try:
+            key.append(head_file.stat().st_mtime_ns)
+            head_text = head_file.read_text().strip()
+        except OSError:
+            return None
+        if head_text.startswith("ref: "):
+            ref = git_dir / head_text[5:]
+            key.append(ref.stat().st_mtime_ns if ref.exists() else 0)
+        packed = git_dir / "packed-refs"
+        key.append(packed.stat().st_mtime_ns if packed.exists() else 0)
+        return tuple(key)
+
+    def head(self) -> Optional[str]:
+        """Current HEAD commit sha (None outside a repo or before the first commit)."""
+        key = self._head_stat_key()
+        if key is not None and key == self._head_key:
+            return self._head
+        obj = self.read_object("HEAD")
+        self._head = obj[0] if obj and obj[1] == "commit" else None
+        self._head_key = key
+        return self._head
+
+    def recent_log(self, max_commits: int = 10) -> List[Tuple[str, str]]:
+        """[(short_sha, subject)] for the last commits, walked through the batch process."""
+        head = self.head()
+        if head is None:
+            return []
+        cache_key = (head, max_commits)
+        if cache_key in self._log_cache:
+            return self._log_cache[cache_key]
+
+        entries: List[Tuple[str, str]] = []
+        rev: Optional[str] = head
+        while rev and len(entries) < max_commits:
+            obj = self.read_object(rev)
+            if obj is None or obj[1] != "commit":
+                break
+            headers, _, message = obj[2].decode("utf-8", "replace").partition("\n\n")
+            parent = None
+            for line in headers.splitlines():
+                if line.startswith("parent "):
+                    parent = line.split()[1]
+                    break
+            subject = message.strip().splitlines()[0] if message.strip() else ""
+            entries.append((obj[0][:7], subject))
+            rev = parent
+
+        self._log_cache = {cache_key: entries}
+        return entries
+
+    # -- working tree -----------------------------------------------------
+
+    def status(self) -> Dict[str, str]:
+        """path -> porcelain XY code for every dirty/untracked path."""
+        out = self.git(
+            "-c", "core.untrackedCache=true",
+            "status", "--porcelain=v1", "-z", "--untracked-files=all",
+        )
+        result: Dict[str, str] = {}
+        parts = out.split("\0")
+        i = 0
+        while i < len(parts):
+            entry = parts[i]
+            i += 1
+            if len(entry) < 4:
+                continue
+            code, path = entry[:2], entry[3:]
+            if code[0] in "RC":
+                i += 1  # skip the rename/copy source path
+            result[path] = code
+        return result
+
+    # -- content hashing --------------------------------------------------
+
+    def _hash_excludes(self) -> List[str]:
+        # git add refuses pathspecs naming an ignored path (even as an
+        # exclude), so only exclude roots that .gitignore doesn't already.
+        if self._excludes is None:
+            out = self.git("check-ignore", *(f"{p}/" for p in HASH_EXCLUDES))
+            ignored = {line.rstrip("/") for line in out.split()}
+            self._excludes = [p for p in HASH_EXCLUDES if p not in ignored]
+        return self._excludes
+
+    @fetti_trace.traced("git.tree_hash", cat="git")
+    def tree_hash(self) -> Optional[str]:
+        """
+        Git tree id of the working tree (ignored files and HASH_EXCLUDES left
+        out), or None if git is unavailable.
+
+        Uses a private index (.git/fetti-index) seeded from the real one, so
+        `git add` only re-hashes files whose stat changed since the last call.
+        """
+        git_dir = self.git_dir
+        if git_dir is None:
+            return None
+        index = git_dir / "fetti-index"
+        env = dict(os.environ, GIT_INDEX_FILE=str(index))
+        excludes = [f":(exclude){p}" for p in self._hash_excludes()]
+
+        with file_lock(index):
+            if not index.exists() and (git_dir / "index").exists():
+                shutil.copyfile(git_dir / "index", index)
+            try:
+                subprocess.run(
+                    ["git", "add", "-A", "--", ".", *excludes],
+                    cwd=self.root,
+                    env=env,
+                    capture_output=True,
+                    check=True,
+                )
+            except Exception:
+                return None
+            return self.git("write-tree", env=env).strip() or None
+
+    @fetti_trace.traced("git.root_trees", cat="git")
+    def root_trees(self, roots: Sequence[str] = SAFE_ROOTS) -> Optional[RootTrees]:
+        """
+        Tree id of each root in the current working tree, resolved from one
+        tree_hash() through the batch process. None if git is unavailable.
+        """
+        tree = self.tree_hash()
+        if tree is None:
+            return None
+        result: RootTrees = {}
+        for root in roots:
+            name = root.rstrip("/")
+            obj = self.read_object(f"{tree}:{name}")
+            result[name] = obj[0] if obj and obj[1] == "tree" else None
+        return result
+
+    def diff_root_trees(self, before: RootTrees, after: RootTrees) -> ChangeSet:
+        """Exact added/modified/deleted files between two root_trees() results."""
+        changes = ChangeSet()
+        for root in sorted(before.keys() | after.keys()):
+            old, new = before.get(root), after.get(root)
+            if old == new:
+                continue
+            if old is None or new is None:
+                listing = self.git("ls-tree", "-r", "-z", "--name-only", old or new)
+                target = changes.added if old is None else changes.deleted
+                target.update(f"{root}/{p}" for p in listing.split("\0") if p)
+                continue
+            out = self.git("diff-tree", "-r", "-z", "--no-renames", "--name-status", old, new)
+            parts = [p for p in out.split("\0") if p]
+            for status, path in zip(parts[::2], parts[1::2]):
+                full = f"{root}/{path}"
+                if status == "A":
+                    changes.added.add(full)
+                elif status == "D":
+                    changes.deleted.add(full)
+                else:
+                    changes.modified.add(full)
+        return changes
+
+
+_STATE: Optional[GitState] = None
+
+
+def git_state() -> GitState:
+    """Process-wide GitState singleton (closed automatically at exit)."""
+    global _STATE
+    if _STATE is None:
+        _STATE = GitState()
+        atexit.register(_STATE.close)
+    return _STATE
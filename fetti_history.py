@@ -0,0 +1,463 @@
+"""
+Fetti History – local SQLite store of wizard activity (.fetti/history.db).
+
+Tables:
+  runs       one row per tool invocation (doctor, wrapper, auto_ai, feature_agent, …)
+  steps      every lint/test/build step: duration, exit code, ledger skips,
+             and the tree areas that were changed at the time (fetti_order)
+  step_resources  peak RSS, CPU, IO (and memory-ceiling kills) of doctor steps
+  failures   every failed step: transient/deterministic verdict, retries, whether
+             the AI was asked, and whether the same inputs later passed (fetti_flaky)
+  llm_calls  every model call: provider, model, latency, prompt/response size
+  edits      every file edit an AI session proposed
+  outcomes   whether an AI session's edits went green
+
+Writes never block the caller: record_*() only enqueue, a background thread
+commits in batches (WAL mode, so readers and several writer processes can
+overlap), and the queue is flushed at exit. A run started by another Fetti
+process (FETTI_RUN_ID in the environment) is stored as the parent run.
+
+Usage:
+  python3 fetti_history.py stats [--last 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+DB_PATH = PROJECT_ROOT / ".fetti" / "history.db"
+RUN_ENV = "FETTI_RUN_ID"
+BATCH_SECONDS = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+  run_id TEXT PRIMARY KEY, parent_run TEXT, tool TEXT NOT NULL,
+  started REAL NOT NULL, ended REAL, ok INTEGER, meta TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+  id INTEGER PRIMARY KEY, run_id TEXT, name TEXT NOT NULL, cmd TEXT,
+  started REAL NOT NULL, duration REAL, exit_code INTEGER, skipped INTEGER DEFAULT 0,
+  areas TEXT
+);
+CREATE TABLE IF NOT EXISTS step_resources (
+  id INTEGER PRIMARY KEY, run_id TEXT, name TEXT NOT NULL, started REAL NOT NULL,
+  peak_rss_kb INTEGER, max_rss_kb INTEGER, cpu_user REAL, cpu_sys REAL,
+  read_bytes INTEGER, write_bytes INTEGER, procs INTEGER, killed TEXT
+);
+CREATE TABLE IF NOT EXISTS failures (
+  id INTEGER PRIMARY KEY, run_id TEXT, name TEXT NOT NULL, cmd TEXT, fingerprint TEXT,
+  exit_code INTEGER, transient INTEGER, reason TEXT, retries INTEGER, recovered INTEGER,
+  sent_to_ai INTEGER DEFAULT 0, passed_later INTEGER DEFAULT 0, ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS llm_calls (
+  id INTEGER PRIMARY KEY, run_id TEXT, session_id TEXT, provider TEXT, model TEXT,
+  purpose TEXT, started REAL NOT NULL, duration REAL,
+  prompt_chars INTEGER, response_chars INTEGER, ok INTEGER
+);
+CREATE TABLE IF NOT EXISTS edits (
+  id INTEGER PRIMARY KEY, run_id TEXT, session_id TEXT, file TEXT,
+  before_chars INTEGER, after_chars INTEGER, ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outcomes (
+  id INTEGER PRIMARY KEY, run_id TEXT, session_id TEXT, ok INTEGER, ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS steps_name_started ON steps(name, started);
+CREATE INDEX IF NOT EXISTS steps_cmd_started ON steps(cmd, started);
+CREATE INDEX IF NOT EXISTS outcomes_session ON outcomes(session_id);
+CREATE INDEX IF NOT EXISTS failures_fingerprint ON failures(fingerprint);
+"""
+
+
+def enabled() -> bool:
+    return os.environ.get("FETTI_HISTORY", "1") != "0"
+
+
+def connect(path: Path = DB_PATH) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if "areas" not in {row[1] for row in conn.execute("PRAGMA table_info(steps)")}:
+        try:
+            conn.execute("ALTER TABLE steps ADD COLUMN areas TEXT")
+        except sqlite3.OperationalError:
+            pass  # another process added it first
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class _Writer:
+    """Background thread draining (sql, params) tuples into the database."""
+
+    def __init__(self) -> None:
+        self.queue: "queue.Queue[Optional[Tuple[str, Sequence[Any]]]]" = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name="fetti-history", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def put(self, sql: str, params: Sequence[Any]) -> None:
+        self.queue.put_nowait((sql, params))
+
+    def _loop(self) -> None:
+        try:
+            conn = connect()
+        except sqlite3.Error as e:
+            print(f"[HISTORY] Could not open {DB_PATH}: {e}")
+            return
+        done = False
+        while not done:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + BATCH_SECONDS
+            while True:
+                try:
+                    batch.append(self.queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if None in batch:
+                done = True
+            try:
+                with conn:
+                    for item in batch:
+                        if item is not None:
+                            conn.execute(*item)
+            except sqlite3.Error as e:
+                print(f"[HISTORY] Dropped {len(batch)} history record(s): {e}")
+        conn.close()
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+
+
+_WRITER: Optional[_Writer] = None
+# Open runs of this process, innermost last, each with the FETTI_RUN_ID it replaced.
+_RUNS: List[Tuple[str, Optional[str]]] = []
+_STEP_AREAS: Optional[List[str]] = None
+
+
+def _write(sql: str, params: Sequence[Any]) -> None:
+    global _WRITER
+    if not enabled():
+        return
+    if _WRITER is None:
+        _WRITER = _Writer()
+    _WRITER.put(sql, params)
+
+
+def current_run() -> Optional[str]:
+    return _RUNS[-1][0] if _RUNS else os.environ.get(RUN_ENV)
+
+
+def start_run(tool: str, meta: Optional[Dict[str, Any]] = None) -> str:
+    """Open a run for this process; child processes inherit it as their parent."""
+    parent = os.environ.get(RUN_ENV)
+    run_id = uuid.uuid4().hex[:12]
+    _RUNS.append((run_id, parent))
+    os.environ[RUN_ENV] = run_id
+    _write(
+        "INSERT INTO runs (run_id, parent_run, tool, started, meta) VALUES (?, ?, ?, ?, ?)",
+        (run_id, parent, tool, time.time(), json.dumps(meta) if meta else None),
+    )
+    return run_id
+
+
+def end_run(ok: bool, run_id: Optional[str] = None) -> None:
+    """Close a run (default: the innermost) and hand FETTI_RUN_ID back to the one it replaced."""
+    run_id = run_id or (_RUNS[-1][0] if _RUNS else None)
+    if not run_id:
+        return
+    _write("UPDATE runs SET ended = ?, ok = ? WHERE run_id = ?", (time.time(), int(ok), run_id))
+    ids = [rid for rid, _ in _RUNS]
+    if run_id in ids:
+        # Back to the enclosing run, so the next start_run() in this process
+        # (auto AI loop, daemon jobs) is not recorded as a child of this one.
+        # Runs opened inside it and never ended are dropped with it.
+        _, previous = _RUNS[ids.index(run_id)]
+        del _RUNS[ids.index(run_id):]
+        if previous:
+            os.environ[RUN_ENV] = previous
+        else:
+            os.environ.pop(RUN_ENV, None)
+
+
+def annotate_run(meta: Dict[str, Any]) -> None:
+    """Set the current run's meta (e.g. the step order fetti_order chose)."""
+    run_id = current_run()
+    if run_id:
+        _write("UPDATE runs SET meta = ? WHERE run_id = ?", (json.dumps(meta), run_id))
+
+
+def set_step_areas(areas: Optional[Sequence[str]]) -> None:
+    """Tree areas changed in this run; stored with every step recorded afterwards."""
+    global _STEP_AREAS
+    _STEP_AREAS = list(areas) if areas is not None else None
+
+
+@contextmanager
+def tracked_run(tool: str, meta: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    start_run()/end_run() around a block; ok unless it raised (SystemExit(0)
+    counts as ok). A block that ends the run itself (end_run(ok, run_id))
+    keeps its own verdict.
+    """
+    run_id = start_run(tool, meta)
+    ok = False
+    try:
+        yield run_id
+        ok = True
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+        raise
+    finally:
+        if any(rid == run_id for rid, _ in _RUNS):
+            end_run(ok, run_id)
+
+
+_STEP_NAMES = {"npm run lint": "Lint", "npm test": "Test", "npm run test": "Test", "npm run build": "Build"}
+
+
+def step_name_for(cmd: Sequence[str]) -> str:
+    """Canonical step name, so 'Lint after task 3' and the doctor's 'Lint' aggregate together."""
+    joined = " ".join(cmd)
+    return _STEP_NAMES.get(joined, joined)
+
+
+def record_step(
+    cmd: Sequence[str],
+    duration: Optional[float],
+    exit_code: Optional[int],
+    skipped: bool = False,
+    name: Optional[str] = None,
+    resources: Optional[Dict[str, Any]] = None,
+) -> None:
+    """`resources` is a fetti_proc.Usage.as_dict(), stored in step_resources."""
+    name = name or step_name_for(cmd)
+    started = time.time() - (duration or 0)
+    _write(
+        "INSERT INTO steps (run_id, name, cmd, started, duration, exit_code, skipped, areas)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (current_run(), name, " ".join(cmd), started, duration, exit_code, int(skipped),
+         json.dumps(_STEP_AREAS) if _STEP_AREAS is not None and not skipped else None),
+    )
+    if resources:
+        _write(
+            "INSERT INTO step_resources (run_id, name, started, peak_rss_kb, max_rss_kb, cpu_user, cpu_sys,"
+            " read_bytes, write_bytes, procs, killed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (current_run(), name, started, resources.get("peak_rss_kb"), resources.get("max_rss_kb"),
+             resources.get("cpu_user"), resources.get("cpu_sys"), resources.get("read_bytes"),
+             resources.get("write_bytes"), resources.get("procs"), resources.get("killed")),
+        )
+
+
+def record_failure(
+    name: str,
+    cmd: Sequence[str],
+    fingerprint: Optional[str],
+    exit_code: Optional[int],
+    transient: bool,
+    reason: str,
+    retries: int,
+    recovered: bool,
+    sent_to_ai: bool = False,
+) -> None:
+    _write(
+        "INSERT INTO failures (run_id, name, cmd, fingerprint, exit_code, transient, reason, retries, recovered,"
+        " sent_to_ai, ts) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (current_run(), name, " ".join(cmd), fingerprint, exit_code, int(transient), reason, retries,
+         int(recovered), int(sent_to_ai), time.time()),
+    )
+
+
+def mark_sent_to_ai(fingerprint: Optional[str]) -> None:
+    """The latest failure on these inputs was handed to an AI fixer (by a process other than the doctor)."""
+    if fingerprint:
+        _write(
+            "UPDATE failures SET sent_to_ai = 1 WHERE id = (SELECT MAX(id) FROM failures WHERE fingerprint = ?)",
+            (fingerprint,),
+        )
+
+
+def mark_fingerprint_passed(fingerprint: str) -> None:
+    _write("UPDATE failures SET passed_later = 1 WHERE fingerprint = ? AND passed_later = 0", (fingerprint,))
+
+
+def record_llm_call(
+    provider: str,
+    model: str,
+    purpose: str,
+    duration: float,
+    prompt_chars: int,
+    response_chars: int,
+    ok: bool,
+    session_id: Optional[str] = None,
+) -> None:
+    _write(
+        "INSERT INTO llm_calls (run_id, session_id, provider, model, purpose, started, duration,"
+        " prompt_chars, response_chars, ok) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (current_run(), session_id, provider, model, purpose, time.time() - duration, duration,
+         prompt_chars, response_chars, int(ok)),
+    )
+
+
+def record_edits(session_id: str, edits: List[dict]) -> None:
+    now = time.time()
+    for edit in edits:
+        if isinstance(edit, dict):
+            _write(
+                "INSERT INTO edits (run_id, session_id, file, before_chars, after_chars, ts) VALUES (?, ?, ?, ?, ?, ?)",
+                (current_run(), session_id, str(edit.get("file")), len(str(edit.get("before") or "")),
+                 len(str(edit.get("after") or "")), now),
+            )
+
+
+def record_outcome(session_id: str, ok: bool) -> None:
+    _write(
+        "INSERT INTO outcomes (run_id, session_id, ok, ts) VALUES (?, ?, ?, ?)",
+        (current_run(), session_id, int(ok), time.time()),
+    )
+
+
+# -- stats ------------------------------------------------------------------
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+def stats(last: int = 50, conn: Optional[sqlite3.Connection] = None) -> str:
+    """Canned aggregate queries, rendered as text."""
+    conn = conn or connect()
+    out: List[str] = []
+
+    out.append("AI fixes (edits that went green):")
+    rows = conn.execute(
+        "SELECT COALESCE(r.tool, '?'), COUNT(*), SUM(o.ok) FROM outcomes o"
+        " LEFT JOIN runs r ON r.run_id = o.run_id GROUP BY 1 ORDER BY 2 DESC"
+    ).fetchall()
+    for tool, n, ok in rows:
+        out.append(f"  {tool:<16} {ok or 0}/{n} green ({100.0 * (ok or 0) / n:.0f}%)")
+    if not rows:
+        out.append("  (none recorded)")
+
+    out.append(f"\nStep durations (last {last} runs of each step, ledger skips excluded):")
+    names = [r[0] for r in conn.execute("SELECT DISTINCT name FROM steps ORDER BY name")]
+    for name in names:
+        recent = conn.execute(
+            "SELECT duration, exit_code FROM steps WHERE name = ? AND skipped = 0 AND duration IS NOT NULL"
+            " ORDER BY started DESC LIMIT ?",
+            (name, last),
+        ).fetchall()
+        skipped = conn.execute("SELECT COUNT(*) FROM steps WHERE name = ? AND skipped = 1", (name,)).fetchone()[0]
+        if not recent:
+            out.append(f"  {name:<16} no timed runs ({skipped} ledger skips)")
+            continue
+        durations = [d for d, _ in recent]
+        failed = sum(1 for _, code in recent if code)
+        out.append(
+            f"  {name:<16} n={len(recent):<4} p50={_percentile(durations, 0.5):6.1f}s "
+            f"p95={_percentile(durations, 0.95):6.1f}s max={max(durations):6.1f}s "
+            f"failed={failed} ledger_skips={skipped}"
+        )
+    if not names:
+        out.append("  (none recorded)")
+
+    out.append(f"\nStep resources (last {last} runs of each step):")
+    names = [r[0] for r in conn.execute("SELECT DISTINCT name FROM step_resources ORDER BY name")]
+    for name in names:
+        recent = conn.execute(
+            "SELECT peak_rss_kb, cpu_user + cpu_sys, killed FROM step_resources WHERE name = ?"
+            " ORDER BY started DESC LIMIT ?",
+            (name, last),
+        ).fetchall()
+        rss = [(r or 0) / 1024 for r, _, _ in recent]
+        cpu = [c or 0.0 for _, c, _ in recent]
+        killed = sum(1 for _, _, k in recent if k)
+        out.append(
+            f"  {name:<16} n={len(recent):<4} rss p50={_percentile(rss, 0.5):6.0f}MB "
+            f"max={max(rss):6.0f}MB cpu p50={_percentile(cpu, 0.5):6.1f}s killed={killed}"
+        )
+    if not names:
+        out.append("  (none recorded)")
+
+    out.append("\nFailures (fetti_flaky):")
+    row = conn.execute(
+        "SELECT COUNT(*), SUM(transient), SUM(transient * recovered), SUM(sent_to_ai),"
+        " SUM(sent_to_ai * passed_later), SUM(1 - transient) FROM failures"
+    ).fetchone()
+    total, transient, recovered, sent, wasted, deterministic = [v or 0 for v in row]
+    if total:
+        out.append(f"  {deterministic} deterministic, {transient} transient ({recovered} recovered by retry)")
+        out.append(f"  transient failures kept from the AI fixers: {transient}, AI fixes requested: {sent}")
+        out.append(f"  wasted model calls (AI fix on inputs that later passed unchanged): {wasted}")
+        for reason, n in conn.execute(
+            "SELECT reason, COUNT(*) FROM failures WHERE transient = 1 GROUP BY 1 ORDER BY 2 DESC LIMIT 5"
+        ):
+            out.append(f"    {n:>4}  {reason}")
+    else:
+        out.append("  (none recorded)")
+
+    out.append("\nModel calls:")
+    rows = conn.execute(
+        "SELECT provider, model, COUNT(*), AVG(duration), SUM(prompt_chars), SUM(1 - ok)"
+        " FROM llm_calls GROUP BY 1, 2 ORDER BY 3 DESC"
+    ).fetchall()
+    for provider, model, n, avg, prompt_chars, errors in rows:
+        out.append(
+            f"  {provider}/{model}: {n} call(s), avg {avg:.1f}s, "
+            f"{(prompt_chars or 0) / 1000:.0f}k prompt chars, {errors or 0} error(s)"
+        )
+    if not rows:
+        out.append("  (none recorded)")
+
+    out.append("\nMost edited files:")
+    rows = conn.execute("SELECT file, COUNT(*) FROM edits GROUP BY 1 ORDER BY 2 DESC LIMIT 10").fetchall()
+    for file, n in rows:
+        out.append(f"  {n:>4}  {file}")
+    if not rows:
+        out.append("  (none recorded)")
+
+    out.append("\nRuns by tool:")
+    rows = conn.execute(
+        "SELECT tool, COUNT(*), SUM(ok), AVG(ended - started) FROM runs GROUP BY 1 ORDER BY 2 DESC"
+    ).fetchall()
+    for tool, n, ok, avg in rows:
+        avg_text = f", avg {avg:.0f}s" if avg is not None else ""
+        out.append(f"  {tool:<16} {n} run(s), {ok or 0} ok{avg_text}")
+    if not rows:
+        out.append("  (none recorded)")
+    return "\n".join(out)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Query the Fetti run history")
+    sub = parser.add_subparsers(dest="command")
+    p_stats = sub.add_parser("stats", help="Aggregate success rates and timings")
+    p_stats.add_argument("--last", type=int, default=50, help="Runs per step to summarize (default 50).")
+    args = parser.parse_args(argv)
+
+    if args.command != "stats":
+        parser.print_help()
+        return 0
+    if not DB_PATH.exists():
+        print(f"[HISTORY] No history yet ({DB_PATH.relative_to(PROJECT_ROOT)} does not exist).")
+        return 0
+    print(stats(args.last))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
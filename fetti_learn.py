@@ -0,0 +1,341 @@
+"""
+Fetti Learn – promote recurring failures into fetti_brain.json.
+
+Reads recorded failures (fetti_error_logger) and AI fix sessions
+(logs/fetti_ai_fixes.log), reduces each error to a signature (paths, line
+numbers, quoted identifiers and numbers stripped), clusters near-duplicate
+signatures with MinHash + LSH, and promotes every cluster seen at least
+--min-count times into the brain's error_patterns, together with the most
+recent AI edit that went with it.
+
+Usage:
+  python3 fetti_learn.py [--min-count 3] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as _dt
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fetti_ai_log import iter_sessions
+from fetti_brain import BRAIN_PATH, get_brain
+from fetti_error_logger import read_errors
+from fetti_fs import atomic_write_text, file_lock
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs with Jaccard ~0.6+ almost always collide
+ROWS = NUM_PERM // BANDS
+SIMILARITY = 0.6
+# An AI session logged this soon after a journal failure of the same step is
+# the fix attempt for that failure, not a second occurrence of it.
+SESSION_WINDOW = _dt.timedelta(minutes=15)
+_MERSENNE = (1 << 61) - 1
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+_PATH_RE = re.compile(r"(?:[A-Za-z]:)?(?:\.{0,2}[\w@\[\]().-]*[/\\])+[\w@\[\]().-]+")
+_LINECOL_RE = re.compile(r"(?::\d+){1,2}\b|\(\d+,\s*\d+\)")
+_QUOTED_RE = re.compile(r"(?<!\w)(?:'[^'\n]{1,80}'|\"[^\"\n]{1,80}\"|`[^`\n]{1,80}`)")
+_HEX_RE = re.compile(r"\b0x[0-9a-fA-F]+\b|\b[0-9a-f]{7,40}\b")
+_NUM_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_ERROR_LINE_RE = re.compile(r"error|failed|cannot|can't|unexpected|not found|⨯|✖", re.IGNORECASE)
+_PLACEHOLDER_RE = re.compile(r"<(?:path|id|n|hex)>")
+
+
+def normalize_signature(line: str) -> str:
+    """Reduce an error line to a stable signature."""
+    s = _ANSI_RE.sub("", line).strip()
+    s = _QUOTED_RE.sub("'<id>'", s)
+    s = _LINECOL_RE.sub("", s)
+    s = _PATH_RE.sub("<path>", s)
+    s = _HEX_RE.sub("<hex>", s)
+    s = _NUM_RE.sub("<n>", s)
+    return " ".join(s.split())
+
+
+def error_lines(text: str, limit: int = 3) -> List[str]:
+    """The first few lines of a log that look like actual errors."""
+    found = []
+    for line in _ANSI_RE.sub("", text).splitlines():
+        stripped = line.strip()
+        if 8 <= len(stripped) <= 400 and _ERROR_LINE_RE.search(stripped):
+            found.append(stripped)
+            if len(found) >= limit:
+                break
+    return found
+
+
+# -- MinHash / LSH ----------------------------------------------------------
+
+def _perm_params() -> List[Tuple[int, int]]:
+    params = []
+    for i in range(NUM_PERM):
+        digest = hashlib.blake2b(f"fetti-minhash-{i}".encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "little") % _MERSENNE or 1
+        b = int.from_bytes(digest[8:], "little") % _MERSENNE
+        params.append((a, b))
+    return params
+
+
+_PERMS = _perm_params()
+
+
+def _shingles(signature: str, k: int = 3) -> set:
+    tokens = signature.split()
+    if len(tokens) < k:
+        return {" ".join(tokens)}
+    return {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+
+def minhash(signature: str) -> Tuple[int, ...]:
+    hashed = [
+        int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little")
+        for s in _shingles(signature)
+    ]
+    return tuple(min((a * x + b) % _MERSENNE for x in hashed) for a, b in _PERMS)
+
+
+def _similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+@dataclass
+class Occurrence:
+    signature: str
+    line: str
+    step: Optional[str]
+    ts: str
+    edits: List[dict] = field(default_factory=list)
+
+
+@dataclass
+class Cluster:
+    members: List[Occurrence]
+
+    @property
+    def count(self) -> int:
+        return len(self.members)
+
+    def latest_fix(self) -> Optional[dict]:
+        for occ in sorted(self.members, key=lambda o: o.ts, reverse=True):
+            for edit in occ.edits:
+                if isinstance(edit, dict) and edit.get("file") and edit.get("after") is not None:
+                    return edit
+        return None
+
+
+def cluster(occurrences: List[Occurrence]) -> List[Cluster]:
+    """Group near-duplicate signatures (MinHash similarity >= SIMILARITY)."""
+    # Identical signatures collapse first, so LSH only sees distinct ones.
+    by_sig: Dict[str, List[Occurrence]] = {}
+    for occ in occurrences:
+        by_sig.setdefault(occ.signature, []).append(occ)
+    sigs = list(by_sig)
+    hashes = [minhash(s) for s in sigs]
+
+    parent = list(range(len(sigs)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    for idx, mh in enumerate(hashes):
+        for band in range(BANDS):
+            key = (band, mh[band * ROWS:(band + 1) * ROWS])
+            for other in buckets.get(key, ()):
+                if find(other) != find(idx) and _similarity(hashes[other], mh) >= SIMILARITY:
+                    parent[find(idx)] = find(other)
+            buckets.setdefault(key, []).append(idx)
+
+    groups: Dict[int, List[Occurrence]] = {}
+    for idx, sig in enumerate(sigs):
+        groups.setdefault(find(idx), []).extend(by_sig[sig])
+    return sorted((Cluster(m) for m in groups.values()), key=lambda c: c.count, reverse=True)
+
+
+# -- collection / promotion -------------------------------------------------
+
+def _when(ts: object) -> Optional[_dt.datetime]:
+    """Journal timestamps are UTC ("...Z"), AI log ones naive local time; both -> aware UTC."""
+    try:
+        when = _dt.datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return when.astimezone(_dt.timezone.utc)
+
+
+def _iso(when: Optional[_dt.datetime], raw: object) -> str:
+    return when.isoformat() if when is not None else str(raw or "")
+
+
+def collect_occurrences() -> List[Occurrence]:
+    """
+    One set of occurrences per failure. The wrappers journal a failure and
+    then log the AI session for it, with the same error in its excerpt; such
+    a session only lends its edits to the journal entry. Sessions with no
+    journal entry (a self-correction retry, or an entry compacted away)
+    count on their own.
+    """
+    failures: List[Tuple[Optional[str], Optional[_dt.datetime], List[Occurrence]]] = []
+    for err in read_errors():
+        if not isinstance(err, dict):
+            continue
+        when = _when(err.get("ts"))
+        occs = [
+            Occurrence(normalize_signature(line), line, err.get("step"), _iso(when, err.get("ts")))
+            for line in error_lines(str(err.get("details", "")))
+        ]
+        failures.append((err.get("step"), when, occs))
+
+    occurrences = [occ for _, _, occs in failures for occ in occs]
+    claimed = set()
+    for session in iter_sessions():
+        lines = error_lines(str(session.get("error_excerpt", "")))
+        if not lines:
+            continue
+        edits = session.get("edits") if isinstance(session.get("edits"), list) else []
+        step, when = session.get("failed_step"), _when(session.get("timestamp"))
+        match = None
+        if when is not None:
+            for i, (err_step, err_when, _) in enumerate(failures):
+                if (
+                    i not in claimed
+                    and err_step == step
+                    and err_when is not None
+                    and err_when <= when <= err_when + SESSION_WINDOW
+                    and (match is None or err_when > failures[match][1])
+                ):
+                    match = i
+        if match is not None:
+            claimed.add(match)
+            for occ in failures[match][2]:
+                occ.edits = edits
+            continue
+        occurrences.extend(
+            Occurrence(normalize_signature(line), line, step, _iso(when, session.get("timestamp")), edits)
+            for line in lines
+        )
+    return [o for o in occurrences if o.signature]
+
+
+def cluster_regex(c: Cluster) -> Optional[str]:
+    """
+    Regex matching every member of the cluster: the literal tokens common to
+    all member signatures (in order). Adjacent tokens are joined by
+    whitespace, gaps left by placeholders or differing tokens by a lazy
+    wildcard.
+    """
+    token_lists = [m.signature.split() for m in c.members]
+    common = set(token_lists[0])
+    for tokens in token_lists[1:]:
+        common &= set(tokens)
+
+    parts: List[str] = []
+    literal_chars = 0
+    gap = False
+    for token in token_lists[0]:
+        if token not in common or _PLACEHOLDER_RE.search(token):
+            gap = True
+            continue
+        if parts:
+            parts.append(r".*?" if gap else r"\s+")
+        parts.append(re.escape(token))
+        literal_chars += len(token)
+        gap = False
+    if literal_chars < 12:
+        return None
+    return "".join(parts)
+
+
+def _clip(text: str, limit: int = 300) -> str:
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def recommendation_for(c: Cluster) -> Tuple[str, Optional[dict]]:
+    steps = sorted({m.step for m in c.members if m.step})
+    where = f" in step {', '.join(steps)}" if steps else ""
+    fix = c.latest_fix()
+    if fix is None:
+        return f"Recurring failure (seen {c.count}x{where}). Example: {_clip(c.members[-1].line, 160)}", None
+    stored = {
+        "file": fix.get("file"),
+        "before": _clip(str(fix.get("before", ""))),
+        "after": _clip(str(fix.get("after", ""))),
+    }
+    return (
+        f"Recurring failure (seen {c.count}x{where}). It was previously fixed by editing "
+        f"{stored['file']}; apply the same kind of change instead of re-deriving it.",
+        stored,
+    )
+
+
+def promote(clusters: Iterable[Cluster], min_count: int, dry_run: bool = False) -> int:
+    """Add/refresh learned error_patterns in fetti_brain.json. Returns how many changed."""
+    changed = 0
+    with file_lock(BRAIN_PATH):
+        raw = json.loads(BRAIN_PATH.read_text()) if BRAIN_PATH.exists() else {}
+        patterns = raw.setdefault("error_patterns", [])
+        matcher = get_brain(BRAIN_PATH).matcher
+        by_signature = {p.get("signature"): p for p in patterns if isinstance(p, dict) and p.get("signature")}
+
+        for c in clusters:
+            if c.count < min_count:
+                continue
+            rep = max(c.members, key=lambda m: m.ts)
+            existing = by_signature.get(rep.signature)
+            if existing is not None:
+                if existing.get("count") != c.count:
+                    existing["count"] = c.count
+                    changed += 1
+                continue
+            # Already covered by a hand-written pattern
+            if matcher.scan_lines([rep.line]):
+                continue
+            regex = cluster_regex(c)
+            if regex is None:
+                continue
+            recommendation, fix = recommendation_for(c)
+            entry = {
+                "pattern": regex,
+                "regex": True,
+                "recommendation": recommendation,
+                "source": "learned",
+                "signature": rep.signature,
+                "count": c.count,
+            }
+            if fix:
+                entry["fix"] = fix
+            patterns.append(entry)
+            by_signature[rep.signature] = entry
+            changed += 1
+            print(f"[LEARN] + ({c.count}x) {rep.signature}")
+
+        if changed and not dry_run:
+            atomic_write_text(BRAIN_PATH, json.dumps(raw, indent=2, ensure_ascii=False) + "\n")
+    return changed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Promote recurring failures into fetti_brain.json")
+    parser.add_argument("--min-count", type=int, default=3, help="Promote clusters seen at least this often.")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would be promoted without writing.")
+    args = parser.parse_args(argv)
+
+    occurrences = collect_occurrences()
+    clusters = cluster(occurrences)
+    print(f"[LEARN] {len(occurrences)} error occurrence(s) in {len(clusters)} cluster(s).")
+    changed = promote(clusters, args.min_count, dry_run=args.dry_run)
+    verb = "would update" if args.dry_run else "updated"
+    print(f"[LEARN] {verb} {changed} error pattern(s) in {BRAIN_PATH.name}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
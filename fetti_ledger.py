@@ -0,0 +1,122 @@
+"""
+Fetti Validation Ledger – remembers which checks passed on which tree.
+
+The feature agent runs lint + build after each task, then the feature
+runner runs them again on the very same bytes, and the doctor/wrapper may
+do it a third time. Every caller now asks the ledger first: if a check
+(keyed by its command line) already passed for the current working-tree
+content hash (fetti_git.tree_hash), the npm run is skipped.
+
+Only passes are recorded – a failure is always re-run, since it may have
+been transient. A pass is recorded for the tree the check started on and,
+when the check itself rewrote files (`next build` regenerating
+next-env.d.ts, `lint --fix`), for the tree it left behind, which is the
+one the next run will look up. Set FETTI_LEDGER=0 to bypass the ledger
+entirely.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from fetti_fs import atomic_write_text, file_lock
+from fetti_git import git_state
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+STATE_DIR = PROJECT_ROOT / ".fetti"
+LEDGER_PATH = STATE_DIR / "validation_ledger.json"
+MAX_TREES = 64
+
+
+def enabled() -> bool:
+    return os.environ.get("FETTI_LEDGER", "1") != "0"
+
+
+def check_key(cmd: Sequence[str]) -> str:
+    """Checks are identified by their command line, e.g. 'npm run build'."""
+    return " ".join(cmd)
+
+
+_CACHE: Optional[Tuple[Tuple[int, int, int], Dict[str, Any]]] = None
+
+
+def _read(fresh: bool = False) -> Dict[str, Any]:
+    """
+    The ledger, cached by (inode, mtime, size) so a long-running process
+    only re-parses it after a write. Pass fresh=True to get a private copy
+    that is safe to modify.
+    """
+    global _CACHE
+    try:
+        st = LEDGER_PATH.stat()
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = None
+    if not fresh and key is not None and _CACHE is not None and _CACHE[0] == key:
+        return _CACHE[1]
+    data: Dict[str, Any] = {"version": 1, "trees": {}}
+    try:
+        raw = json.loads(LEDGER_PATH.read_text() or "{}")
+        if isinstance(raw, dict) and isinstance(raw.get("trees"), dict):
+            data = raw
+    except Exception:
+        pass
+    if not fresh and key is not None:
+        _CACHE = (key, data)
+    return data
+
+
+def tree_count() -> int:
+    """How many trees the ledger holds passes for (loads and caches it)."""
+    return len(_read()["trees"])
+
+
+def current_tree() -> Optional[str]:
+    return git_state().tree_hash() if enabled() else None
+
+
+def lookup(cmd: Sequence[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Return (already_passed, tree) for `cmd` on the current working tree.
+    Pass `tree` back to record() after running the check.
+    """
+    tree = current_tree()
+    if tree is None:
+        return False, None
+    entry = _read()["trees"].get(tree, {}).get(check_key(cmd))
+    return bool(entry and entry.get("ok")), tree
+
+
+def record(cmd: Sequence[str], tree: Optional[str], ok: bool, duration: Optional[float] = None) -> None:
+    """
+    Record a passing check for `tree`, and for the current tree if the check
+    changed it (failures are not cached).
+    """
+    if tree is None or not ok:
+        return
+    after = current_tree()
+    entry = {
+        "ok": True,
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "duration": round(duration, 2) if duration is not None else None,
+    }
+    with file_lock(LEDGER_PATH):
+        data = _read(fresh=True)
+        trees = data["trees"]
+        for key in dict.fromkeys([tree, after]):
+            if key is None:
+                continue
+            checks = trees.pop(key, {})
+            checks[check_key(cmd)] = dict(entry)
+            trees[key] = checks  # most recently used last
+        while len(trees) > MAX_TREES:
+            trees.pop(next(iter(trees)))
+        atomic_write_text(LEDGER_PATH, json.dumps(data, indent=2) + "\n")
+
+
+def describe(tree: Optional[str]) -> str:
+    return tree[:10] if tree else "unknown"
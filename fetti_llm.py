@@ -0,0 +1,144 @@
+"""
+Fetti LLM – the one place the model SDKs (and python-dotenv) are imported.
+
+google.generativeai and openai take hundreds of milliseconds to import and
+most Fetti runs (doctor, plan, stats, a green watch cycle) never call a
+model. Everything here imports lazily, on first use, and caches the
+configured client for the rest of the process.
+
+gemini_generate() and openai_respond() are the chokepoints for model calls:
+they go through fetti_replay, so FETTI_RECORD / FETTI_REPLAY capture or
+substitute every response (and a replay never imports an SDK).
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Optional
+
+import fetti_replay
+import fetti_trace
+
+DEFAULT_GEMINI_MODEL = "gemini-2.0-flash-thinking-exp"
+DEFAULT_OPENAI_MODEL = "gpt-4.1-mini"
+
+_DOTENV: Optional[Dict[str, str]] = None
+_GENAI: Any = None
+_OPENAI_CLIENT: Any = None
+
+
+def load_env() -> None:
+    """
+    Apply .env to os.environ without overriding variables that are already
+    set. The file is parsed once per process (python-dotenv is imported
+    here, not at startup); later calls re-apply it, which fetti_daemon
+    relies on after swapping in a client's environment.
+    """
+    global _DOTENV
+    if _DOTENV is None:
+        try:
+            from dotenv import dotenv_values
+        except ImportError:
+            print("[WARNING] python-dotenv is not installed; .env is ignored.")
+            _DOTENV = {}
+        else:
+            _DOTENV = {k: v for k, v in dotenv_values().items() if v is not None}
+    for key, value in _DOTENV.items():
+        os.environ.setdefault(key, value)
+
+
+def reset_env() -> None:
+    """Forget the parsed .env, so the next load_env() reads the file again (fettid does this per job)."""
+    global _DOTENV
+    _DOTENV = None
+
+
+def gemini_model_name() -> str:
+    load_env()
+    return os.environ.get("FETTI_WIZARD_MODEL", DEFAULT_GEMINI_MODEL)
+
+
+def openai_model_name() -> str:
+    load_env()
+    return os.environ.get("FETTI_WIZARD_MODEL", DEFAULT_OPENAI_MODEL)
+
+
+def genai_module() -> Any:
+    """google.generativeai, configured with GEMINI_API_KEY on first use."""
+    global _GENAI
+    if _GENAI is None:
+        load_env()
+        import google.generativeai as genai
+
+        api_key = os.environ.get("GEMINI_API_KEY")
+        try:
+            if not api_key:
+                print("[WARNING] GEMINI_API_KEY not set. Model calls will fail.")
+            else:
+                genai.configure(api_key=api_key)
+        except Exception as e:
+            print(f"[ERROR] Failed to configure Gemini client: {e}")
+        _GENAI = genai
+    return _GENAI
+
+
+def gemini_model(
+    system_instruction: str,
+    generation_config: Optional[Dict[str, Any]] = None,
+    model_name: Optional[str] = None,
+) -> Any:
+    return genai_module().GenerativeModel(
+        model_name=model_name or gemini_model_name(),
+        system_instruction=system_instruction,
+        generation_config=generation_config,
+    )
+
+
+def gemini_generate(
+    prompt: str,
+    system_instruction: str,
+    purpose: str,
+    generation_config: Optional[Dict[str, Any]] = None,
+    model_name: Optional[str] = None,
+) -> str:
+    """One Gemini generate_content() call; returns the response text."""
+    name = model_name or gemini_model_name()
+    with fetti_trace.span(f"gemini {purpose}", cat="model", model=name, prompt_chars=len(prompt)) as span:
+        text = fetti_replay.model_call(
+            "gemini",
+            name,
+            purpose,
+            prompt,
+            lambda: gemini_model(system_instruction, generation_config, name).generate_content(prompt).text,
+        )
+        span.set(response_chars=len(text or ""))
+    return text
+
+
+def openai_client() -> Any:
+    """OpenAI client (reads OPENAI_API_KEY from the environment), created on first use."""
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        load_env()
+        from openai import OpenAI
+
+        _OPENAI_CLIENT = OpenAI()
+    return _OPENAI_CLIENT
+
+
+def openai_respond(prompt: str, instructions: str, purpose: str, model_name: Optional[str] = None) -> str:
+    """One OpenAI Responses API call with a single user text input; returns output_text."""
+    name = model_name or openai_model_name()
+
+    def call() -> str:
+        response = openai_client().responses.create(
+            model=name,
+            instructions=instructions,
+            input=[{"role": "user", "content": [{"type": "input_text", "text": prompt}]}],
+        )
+        return response.output_text
+
+    with fetti_trace.span(f"openai {purpose}", cat="model", model=name, prompt_chars=len(prompt)) as span:
+        text = fetti_replay.model_call("openai", name, purpose, prompt, call)
+        span.set(response_chars=len(text or ""))
+    return text
@@ -1,32 +1,32 @@
-import json
-from pathlib import Path
 from typing import Any, Dict
 
-BRAIN_PATH = Path("fetti_brain.json")
-ERRORS_PATH = Path("fetti_last_errors.json")
+from fetti_brain import BRAIN_PATH, get_brain
+from fetti_error_logger import read_errors, record_error
 
 
 def load_brain() -> Dict[str, Any]:
-  if not BRAIN_PATH.exists():
-    return {"repo_laws": [], "file_laws": {}, "error_patterns": []}
-  try:
-    return json.loads(BRAIN_PATH.read_text())
-  except Exception:
-    # If brain file corrupt, fail soft
-    return {"repo_laws": [], "file_laws": {}, "error_patterns": []}
+  # Cached + schema-validated by fetti_brain; fails soft on a corrupt file.
+  return get_brain(BRAIN_PATH).data
 
 
 def load_last_errors() -> Dict[str, Any]:
-  if not ERRORS_PATH.exists():
-    return {"timestamp": None, "steps": []}
-  try:
-    return json.loads(ERRORS_PATH.read_text())
-  except Exception:
-    # If invalid, overwrite with empty structure
-    data = {"timestamp": None, "steps": []}
-    ERRORS_PATH.write_text(json.dumps(data, indent=2) + "\\n")
-    return data
+  # {"timestamp", "steps": [{step, file, summary}]} view of the error journal
+  errors = read_errors()
+  return {
+    "timestamp": errors[-1]["ts"] if errors else None,
+    "steps": [
+      {
+        "step": e.get("step"),
+        "file": e.get("file"),
+        "summary": e.get("summary") or (e.get("details") or "").strip()[-300:],
+      }
+      for e in errors
+    ],
+  }
 
 
 def save_last_errors(data: Dict[str, Any]) -> None:
-  ERRORS_PATH.write_text(json.dumps(data, indent=2) + "\\n")
+  # Each step becomes a journal entry; the journal itself is append-only.
+  for step in data.get("steps", []):
+    summary = step.get("summary") or ""
+    record_error("memory_utils", step.get("step"), summary, file=step.get("file"), summary=summary)
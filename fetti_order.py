@@ -0,0 +1,179 @@
+"""
+Fetti Order – fail-fast ordering of the doctor's and auto AI loop's steps.
+
+Lint, tests and build are independent checks, so the order only decides
+how long we wait before the first failure. With p = P(step fails) and c =
+its expected duration, running steps by ascending c / p (Smith's rule)
+minimises the expected time to the first failure.
+
+Both numbers come from the run history (fetti_history, steps table):
+
+  c  median duration of the step's last real runs (ledger skips excluded);
+  p  its failure rate, smoothed towards a Beta(1, 3) prior, and – for each
+     area of the tree that is currently changed (app/api, components/leads,
+     lib, …) – its failure rate on past runs that touched that area, shrunk
+     towards the step's base rate. The riskiest changed area wins.
+
+Every step run records the areas changed at the time (fetti_history
+.set_step_areas), which is what the per-area rates are built from.
+FETTI_STEP_ORDER=fixed (or the doctor's --fixed-order) keeps the
+hard-coded order; the chosen order is printed and stored in the run's meta.
+
+A resumed run puts the step that failed last time first: it is the one
+the fix was for. Whether the other steps run does not depend on where
+they sit in either order – fetti_steps.select_steps() skips a step only
+on a recorded pass for the current inputs.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import statistics
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import fetti_history
+import fetti_trace
+from fetti_git import SAFE_ROOTS, git_state
+
+PRIOR_FAIL = 1.0
+PRIOR_PASS = 3.0
+AREA_WEIGHT = 2.0      # pseudo-runs of the base rate mixed into each area's rate
+DEFAULT_COST = 60.0    # seconds, for a step with no timed history
+HISTORY_ROWS = 200
+COST_ROWS = 20
+MAX_AREAS = 20
+
+PlanEntry = Tuple[str, List[str], Optional[str]]
+
+
+@dataclass
+class Estimate:
+    name: str
+    p_fail: float
+    cost: float
+    runs: int
+    area: Optional[str] = None  # the changed area that drove p_fail, if any
+
+    @property
+    def rank(self) -> float:
+        return self.cost / max(self.p_fail, 1e-6)
+
+    def describe(self) -> str:
+        where = f" in {self.area}" if self.area else ""
+        return f"{self.name} (p={self.p_fail:.2f}{where}, ~{self.cost:.0f}s, n={self.runs})"
+
+
+def area_of(path: str) -> str:
+    """app/api/leads/route.ts -> app/api; lib/db.ts -> lib; package.json -> package.json."""
+    parts = path.strip("/").split("/")
+    if f"{parts[0]}/" in SAFE_ROOTS and len(parts) > 2:
+        return "/".join(parts[:2])
+    return parts[0]
+
+
+def changed_areas() -> List[str]:
+    """Areas of the uncommitted changes (vs HEAD), including untracked files."""
+    areas = sorted({area_of(p) for p in git_state().status()})
+    return areas[:MAX_AREAS]
+
+
+def estimate(cmd: Sequence[str], name: str, areas: Sequence[str], conn) -> Estimate:
+    rows = conn.execute(
+        "SELECT exit_code, duration, areas FROM steps WHERE cmd = ? AND skipped = 0 AND duration IS NOT NULL"
+        " ORDER BY started DESC LIMIT ?",
+        (" ".join(cmd), HISTORY_ROWS),
+    ).fetchall()
+    fails = sum(1 for code, _, _ in rows if code)
+    base = (fails + PRIOR_FAIL) / (len(rows) + PRIOR_FAIL + PRIOR_PASS)
+    cost = statistics.median([d for _, d, _ in rows[:COST_ROWS]]) if rows else DEFAULT_COST
+    est = Estimate(name, base, max(cost, 0.1), len(rows))
+
+    wanted = set(areas)
+    by_area: Dict[str, List[int]] = {}
+    for code, _, raw in rows:
+        try:
+            touched = set(json.loads(raw)) & wanted if raw else set()
+        except ValueError:
+            continue
+        for area in touched:
+            seen = by_area.setdefault(area, [0, 0])
+            seen[0] += 1
+            seen[1] += 1 if code else 0
+    for area, (n, f) in sorted(by_area.items()):
+        p = (f + AREA_WEIGHT * base) / (n + AREA_WEIGHT)
+        if p > est.p_fail:
+            est.p_fail, est.area = p, area
+    return est
+
+
+def expected_time_to_failure(estimates: Sequence[Estimate]) -> float:
+    """E[time until the first failing step finishes, or all steps pass]."""
+    total, reach = 0.0, 1.0
+    for est in estimates:
+        total += reach * est.cost
+        reach *= 1.0 - est.p_fail
+    return total
+
+
+def fixed_order_requested(flag: bool = False) -> bool:
+    return flag or os.environ.get("FETTI_STEP_ORDER", "adaptive").lower() == "fixed"
+
+
+def order_plan(
+    runner: str, plan: Sequence[PlanEntry], fixed: bool = False, first: Optional[str] = None
+) -> List[PlanEntry]:
+    """
+    Reorder the steps of a fetti_steps.select_steps() plan that will run;
+    skipped entries keep their slots, and `first` (the step a resumed run
+    retries) leads. Also tags this run's step records with the changed areas.
+    """
+    plan = list(plan)
+    areas = changed_areas()
+    fetti_history.set_step_areas(areas)
+    slots = [i for i, (_, _, reason) in enumerate(plan) if reason is None]
+    names = [plan[i][0] for i in slots]
+
+    if fixed_order_requested(fixed):
+        _log(runner, "fixed", names, "as configured (FETTI_STEP_ORDER=fixed)")
+        return plan
+    if len(slots) < 2:
+        return plan
+    if not (fetti_history.enabled() and fetti_history.DB_PATH.exists()):
+        _log(runner, "fixed", names, "no run history yet")
+        return plan
+
+    with fetti_trace.span("order steps", cat="plan"):
+        conn = fetti_history.connect()
+        try:
+            estimates = [estimate(plan[i][1], plan[i][0], areas, conn) for i in slots]
+        finally:
+            conn.close()
+        ranked = sorted(
+            zip(slots, estimates),
+            key=lambda pair: (pair[1].name.lower() != (first or "").lower(), pair[1].rank, pair[0]),
+        )
+
+    if areas:
+        print(f"[ORDER] Changed areas: {', '.join(areas)}")
+    before = expected_time_to_failure(estimates)
+    after = expected_time_to_failure([est for _, est in ranked])
+    order = [est.name for _, est in ranked]
+    _log(
+        runner,
+        "adaptive",
+        order,
+        " → ".join(est.describe() for _, est in ranked)
+        + f"; expected time to first failure ~{after:.0f}s (fixed order ~{before:.0f}s)",
+    )
+    reordered = list(plan)
+    for slot, (src, _) in zip(slots, ranked):
+        reordered[slot] = plan[src]
+    return reordered
+
+
+def _log(runner: str, mode: str, order: List[str], detail: str) -> None:
+    print(f"[ORDER] {runner}: {mode} step order – {detail}")
+    fetti_history.annotate_run({"step_order": order, "order_mode": mode})
+    fetti_trace.instant("step order", cat="plan", mode=mode, order=order)
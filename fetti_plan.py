@@ -0,0 +1,299 @@
+"""
+Fetti Plan – one parser for fetti_feature_plan.md.
+
+The feature agent, the feature runner and the smart agent all read the
+same plan. This module parses the markdown once into a task tree, caches
+it by (mtime, size), and updates a single task's checkbox in place under
+a file lock so overlapping fetti:watch runs don't clobber each other.
+
+Plan rules:
+- "- [ ] ..." is an OPEN task, "- [x] ..." / "- [X] ..." is DONE.
+- Bullets nested under a task are its children (sub-tasks / notes) and
+  are NOT tasks of their own; they are folded into the task description.
+- Indented lines without a bullet continue the previous bullet's text.
+- Bare bullets ("- ..." / "* ...") at the top level only count as tasks
+  when the plan has no checkbox items at all (legacy free-form plans).
+  The first status update of such a plan gives every one of them a
+  checkbox in the same write, so the rest stay open tasks.
+
+  python3 fetti_plan.py          list the tasks
+  python3 fetti_plan.py verify   round-trip check of the status updates
+- '#' headings, '---' rules and blank lines are ignored.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+import tempfile
+import textwrap
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fetti_fs import atomic_write_text, file_lock
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+PLAN_PATH = PROJECT_ROOT / "fetti_feature_plan.md"
+
+TEMPLATE = textwrap.dedent(
+    """\
+    # Fetti Feature Plan
+
+    - [ ] Define lead status enum (NEW, CONTACTED, ENGAGED, DEAD, NOT_QUALIFIED) and make Lead.status required with default NEW.
+    - [ ] Define application status enum (STARTED, IN_PROGRESS, SUBMITTED, INCOMPLETE, WITHDRAWN) and make Application.status required with default STARTED.
+    """
+)
+
+_BULLET_RE = re.compile(r"^(?P<indent>\s*)(?P<mark>[-*])\s+(?:\[(?P<box>[ xX])\]\s*)?(?P<text>.*)$")
+
+
+@dataclass
+class PlanItem:
+    """A single bullet in the plan (task, sub-task or note)."""
+
+    line_no: int  # 0-based index of the bullet line in the file
+    indent: int
+    text: str
+    checkbox: bool
+    done: bool
+    children: List["PlanItem"] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        """Normalized text used to find this item again after the file changes."""
+        return " ".join(self.text.split())
+
+    def description(self) -> str:
+        """Task text plus nested sub-bullets, for prompts and logs."""
+        lines = [self.text]
+
+        def walk(items: List["PlanItem"], depth: int) -> None:
+            for child in items:
+                box = ""
+                if child.checkbox:
+                    box = "[x] " if child.done else "[ ] "
+                lines.append(f"{'  ' * depth}- {box}{child.text}")
+                walk(child.children, depth + 1)
+
+        walk(self.children, 1)
+        return "\n".join(lines)
+
+
+@dataclass
+class Plan:
+    path: Path
+    lines: List[str]
+    roots: List[PlanItem]
+    tasks: List[PlanItem]
+
+    def open_tasks(self) -> List[PlanItem]:
+        return [t for t in self.tasks if not t.done]
+
+    def first_open_task(self) -> Optional[PlanItem]:
+        for task in self.tasks:
+            if not task.done:
+                return task
+        return None
+
+    def find(self, key: str) -> Optional[PlanItem]:
+        wanted = " ".join(key.split())
+        for task in self.tasks:
+            if task.key == wanted:
+                return task
+        return None
+
+
+_CACHE: Dict[Path, Tuple[int, int, Plan]] = {}
+
+
+def parse_plan(text: str, path: Path = PLAN_PATH) -> Plan:
+    """Parse plan markdown into a tree of PlanItems and pick out the tasks."""
+    lines = text.splitlines()
+    roots: List[PlanItem] = []
+    stack: List[PlanItem] = []
+    last: Optional[PlanItem] = None
+
+    for i, raw in enumerate(lines):
+        stripped = raw.strip()
+        if not stripped or stripped.startswith("#") or set(stripped) <= {"-", "*", "_"}:
+            last = None
+            continue
+
+        m = _BULLET_RE.match(raw)
+        if not m:
+            # Continuation of the previous bullet (wrapped text)
+            if last is not None and len(raw) - len(raw.lstrip()) > last.indent:
+                last.text = f"{last.text} {stripped}"
+            continue
+
+        box = m.group("box")
+        item = PlanItem(
+            line_no=i,
+            indent=len(m.group("indent").expandtabs(4)),
+            text=m.group("text").strip(),
+            checkbox=box is not None,
+            done=box in ("x", "X"),
+        )
+        while stack and stack[-1].indent >= item.indent:
+            stack.pop()
+        if stack:
+            stack[-1].children.append(item)
+        else:
+            roots.append(item)
+        stack.append(item)
+        last = item
+
+    has_checkboxes = any(item.checkbox for item in _walk(roots))
+    tasks: List[PlanItem] = []
+
+    def collect(items: List[PlanItem]) -> None:
+        for item in items:
+            if item.checkbox:
+                tasks.append(item)
+            else:
+                collect(item.children)
+
+    if has_checkboxes:
+        collect(roots)
+    else:
+        tasks = [item for item in roots if item.text]
+
+    return Plan(path=path, lines=lines, roots=roots, tasks=tasks)
+
+
+def _walk(items: List[PlanItem]):
+    for item in items:
+        yield item
+        yield from _walk(item.children)
+
+
+def ensure_plan(path: Path = PLAN_PATH) -> None:
+    """Create a template plan file if none exists yet."""
+    if path.exists():
+        return
+    with file_lock(path):
+        if not path.exists():
+            atomic_write_text(path, TEMPLATE)
+            print(f"[PLAN] Created template plan file at {path}")
+
+
+def load_plan(path: Path = PLAN_PATH) -> Optional[Plan]:
+    """
+    Return the parsed plan, re-parsing only when the file's mtime/size changed.
+    Returns None if the plan file does not exist.
+    """
+    path = Path(path)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        _CACHE.pop(path, None)
+        return None
+
+    cached = _CACHE.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+
+    plan = parse_plan(path.read_text(), path)
+    _CACHE[path] = (st.st_mtime_ns, st.st_size, plan)
+    return plan
+
+
+def _checked_line(line: str, done: bool) -> str:
+    m = _BULLET_RE.match(line)
+    if not m:
+        return line
+    mark = "x" if done else " "
+    return f"{m.group('indent')}{m.group('mark')} [{mark}] {m.group('text').strip()}"
+
+
+def _with_status(plan: Plan, task: PlanItem, done: bool) -> List[str]:
+    """The plan's lines with `task` set; a legacy plan's bare tasks all get a checkbox too."""
+    lines = list(plan.lines)
+    for other in plan.tasks:
+        if not other.checkbox and other is not task:
+            lines[other.line_no] = _checked_line(lines[other.line_no], False)
+    lines[task.line_no] = _checked_line(lines[task.line_no], done)
+    return lines
+
+
+def set_task_status(key: str, done: bool = True, path: Path = PLAN_PATH) -> bool:
+    """
+    Set the checkbox of the task whose text matches `key`, rewriting only
+    that line. The plan is re-read under the lock so concurrent updates to
+    other tasks are preserved. Returns True if the task was found.
+    """
+    path = Path(path)
+    if not path.exists():
+        return False
+
+    with file_lock(path):
+        _CACHE.pop(path, None)
+        plan = load_plan(path)
+        task = plan.find(key) if plan else None
+        if task is None:
+            return False
+        if task.checkbox and task.done == done:
+            return True
+
+        atomic_write_text(path, "\n".join(_with_status(plan, task, done)) + "\n")
+        _CACHE.pop(path, None)
+    return True
+
+
+def mark_first_open_done(path: Path = PLAN_PATH) -> Optional[PlanItem]:
+    """Mark the first open task as done. Returns the task, or None if none was open."""
+    path = Path(path)
+    with file_lock(path):
+        _CACHE.pop(path, None)
+        plan = load_plan(path)
+        task = plan.first_open_task() if plan else None
+        if task is None:
+            return None
+        atomic_write_text(path, "\n".join(_with_status(plan, task, True)) + "\n")
+        _CACHE.pop(path, None)
+    return task
+
+
+def verify() -> int:
+    """Mark tasks done one by one in a bare-bullet, a checkbox and a mixed plan; every task must stay reachable."""
+    cases = {
+        "bare bullets": "# Plan\n\n- a\n  - note on a\n* b\n- c\n",
+        "checkboxes": "- [ ] a\n  - note on a\n- [x] done\n- [ ] b\n- [ ] c\n",
+        "wrapped text": "- a\n  continued\n- b\n- c\n",
+    }
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, text in cases.items():
+            path = Path(tmp) / f"{name.replace(' ', '_')}.md"
+            path.write_text(text)
+            expected = [t.key for t in load_plan(path).open_tasks()]
+            seen = []
+            while True:
+                task = mark_first_open_done(path)
+                if task is None:
+                    break
+                seen.append(task.key)
+                if not set_task_status(task.key, True, path):
+                    seen.append("<lost>")
+            ok = seen == expected and not load_plan(path).open_tasks()
+            failures += not ok
+            print(f"[PLAN] verify {name}: {'ok' if ok else 'FAILED'} (marked {seen}, expected {expected})")
+    return 1 if failures else 0
+
+
+def main() -> None:
+    if sys.argv[1:] == ["verify"]:
+        sys.exit(verify())
+    plan = load_plan()
+    if plan is None:
+        print(f"[PLAN] {PLAN_PATH.name} not found.")
+        return
+    open_count = len(plan.open_tasks())
+    print(f"[PLAN] {len(plan.tasks)} task(s), {open_count} open:")
+    for task in plan.tasks:
+        print(f"  {'[x]' if task.done else '[ ]'} {task.text}")
+
+
+if __name__ == "__main__":
+    main()
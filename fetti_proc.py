@@ -0,0 +1,245 @@
+"""
+Fetti Proc – process-tree helpers built on /proc (Linux).
+
+npm runs `next build` as a grandchild, so signalling the direct child is
+not enough to stop a step. descendants() walks the parent links in /proc
+and kill_tree() signals a process and everything below it. On systems
+without /proc both degrade to the single pid.
+
+TreeMonitor does per-step resource accounting for the doctor: peak RSS of
+the whole tree, CPU and IO from the final rusage, and an optional memory
+ceiling that kills a runaway step (`next build` has OOMed the build box).
+"""
+
+from __future__ import annotations
+
+import os
+import signal
+import subprocess
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+PROC = Path("/proc")
+
+
+def _parent_map() -> Dict[int, List[int]]:
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir(PROC)
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            stat = (PROC / entry / "stat").read_text()
+        except OSError:
+            continue  # exited while we were looking
+        # Field 4 is the ppid; the command name (field 2) may contain spaces.
+        fields = stat[stat.rfind(")") + 2:].split()
+        if len(fields) > 1:
+            children.setdefault(int(fields[1]), []).append(int(entry))
+    return children
+
+
+def descendants(pid: int) -> List[int]:
+    """All live descendants of `pid` (not including pid itself), parents first."""
+    children = _parent_map()
+    out: List[int] = []
+    stack = list(children.get(pid, []))
+    while stack:
+        child = stack.pop()
+        out.append(child)
+        stack.extend(children.get(child, []))
+    return out
+
+
+def kill_tree(pid: int, sig: int = signal.SIGTERM, include_self: bool = True, grace: float = 5.0) -> List[int]:
+    """
+    Send `sig` to pid's descendants (and pid), then SIGKILL whatever is still
+    alive after `grace` seconds. Returns the pids that were signalled.
+    """
+    targets = descendants(pid) + ([pid] if include_self else [])
+    for target in targets:
+        try:
+            os.kill(target, sig)
+        except OSError:
+            pass
+    deadline = time.monotonic() + grace
+    alive = list(targets)
+    while alive and time.monotonic() < deadline:
+        time.sleep(0.1)
+        alive = [p for p in alive if _alive(p)]
+    for target in alive:
+        try:
+            os.kill(target, signal.SIGKILL)
+        except OSError:
+            pass
+    return targets
+
+
+def _alive(pid: int) -> bool:
+    try:
+        state = (PROC / str(pid) / "stat").read_text()
+    except OSError:
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            return False
+        return True
+    return state[state.rfind(")") + 2:][:1] != "Z"
+
+
+# ---------------------------------------------------------------- accounting
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+@dataclass
+class Usage:
+    """Resources used by one command and everything it spawned."""
+
+    peak_rss_kb: int = 0      # largest sampled sum of RSS over the whole tree
+    max_rss_kb: int = 0       # largest single process (rusage ru_maxrss)
+    cpu_user: float = 0.0     # seconds, from rusage (sampled if wait4 is unavailable)
+    cpu_sys: float = 0.0
+    read_bytes: int = 0
+    write_bytes: int = 0
+    procs: int = 0            # distinct processes seen in the tree
+    samples: int = 0
+    killed: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def summary(self) -> str:
+        text = (
+            f"peak RSS {_mb(self.peak_rss_kb * 1024)} (tree), CPU {self.cpu_user:.1f}s user / {self.cpu_sys:.1f}s sys, "
+            f"IO {_mb(self.read_bytes)} read / {_mb(self.write_bytes)} written, {self.procs} process(es)"
+        )
+        return text + (f" – KILLED: {self.killed}" if self.killed else "")
+
+
+def combine(usages: List[Usage]) -> Usage:
+    """Usage of several trees that ran side by side (peak RSS is the sum of their peaks, an upper bound)."""
+    total = Usage()
+    for u in usages:
+        total.peak_rss_kb += u.peak_rss_kb
+        total.max_rss_kb = max(total.max_rss_kb, u.max_rss_kb)
+        total.cpu_user += u.cpu_user
+        total.cpu_sys += u.cpu_sys
+        total.read_bytes += u.read_bytes
+        total.write_bytes += u.write_bytes
+        total.procs += u.procs
+        total.samples += u.samples
+    killed = [u.killed for u in usages if u.killed]
+    total.killed = "; ".join(killed) or None
+    return total
+
+
+def _mb(n: int) -> str:
+    return f"{n / 1024 / 1024:.0f} MB" if n < 1024 ** 3 else f"{n / 1024 ** 3:.2f} GB"
+
+
+def sample(pid: int) -> Optional[Tuple[int, float, float, int, int]]:
+    """(rss_kb, utime_s, stime_s, read_bytes, write_bytes) for one process, or None if gone."""
+    try:
+        stat = (PROC / str(pid) / "stat").read_text()
+        status = (PROC / str(pid) / "status").read_text()
+    except OSError:
+        return None
+    fields = stat[stat.rfind(")") + 2:].split()
+    utime, stime = int(fields[11]) / _CLK_TCK, int(fields[12]) / _CLK_TCK
+    rss = 0
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            rss = int(line.split()[1])
+            break
+    read = write = 0
+    try:
+        for line in (PROC / str(pid) / "io").read_text().splitlines():
+            key, _, value = line.partition(":")
+            if key == "read_bytes":
+                read = int(value)
+            elif key == "write_bytes":
+                write = int(value)
+    except (OSError, ValueError):
+        pass
+    return rss, utime, stime, read, write
+
+
+class TreeMonitor:
+    """
+    Sample a child's process tree from /proc every `interval` seconds while
+    it runs, and kill the tree if its total RSS exceeds `rss_limit_kb`.
+    Call wait() instead of proc.wait(): it reaps the child with os.wait4 so
+    the final rusage (CPU and block IO of the child and every descendant it
+    waited for) is exact rather than sampled.
+    """
+
+    def __init__(self, proc: subprocess.Popen, interval: float = 1.0, rss_limit_kb: Optional[int] = None) -> None:
+        self.proc = proc
+        self.interval = interval
+        self.rss_limit_kb = rss_limit_kb
+        self.usage = Usage()
+        self._last: Dict[int, Tuple[int, float, float, int, int]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if interval > 0:
+            self._thread = threading.Thread(target=self._loop, name="fetti-proc-monitor", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def _sample(self) -> None:
+        total = 0
+        for pid in [self.proc.pid, *descendants(self.proc.pid)]:
+            values = sample(pid)
+            if values is None:
+                continue
+            self._last[pid] = values
+            total += values[0]
+        usage = self.usage
+        usage.samples += 1
+        usage.procs = len(self._last)
+        usage.peak_rss_kb = max(usage.peak_rss_kb, total)
+        if self.rss_limit_kb and total > self.rss_limit_kb and usage.killed is None:
+            usage.killed = f"tree RSS {_mb(total * 1024)} over the {_mb(self.rss_limit_kb * 1024)} limit"
+            threading.Thread(target=kill_tree, args=(self.proc.pid,), daemon=True).start()
+
+    def wait(self) -> int:
+        """Reap the child and return its exit code; self.usage is final afterwards."""
+        rusage = None
+        if hasattr(os, "wait4"):
+            try:
+                _, status, rusage = os.wait4(self.proc.pid, 0)
+                self.proc.returncode = os.waitstatus_to_exitcode(status)
+            except ChildProcessError:
+                pass
+        code = self.proc.wait()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+        usage = self.usage
+        seen = list(self._last.values())
+        usage.read_bytes = sum(v[3] for v in seen)
+        usage.write_bytes = sum(v[4] for v in seen)
+        if rusage is not None:
+            usage.cpu_user = rusage.ru_utime
+            usage.cpu_sys = rusage.ru_stime
+            usage.max_rss_kb = rusage.ru_maxrss  # kilobytes on Linux
+            # Processes that exited between samples only show up in rusage.
+            usage.read_bytes = max(usage.read_bytes, rusage.ru_inblock * 512)
+            usage.write_bytes = max(usage.write_bytes, rusage.ru_oublock * 512)
+            usage.peak_rss_kb = max(usage.peak_rss_kb, usage.max_rss_kb)
+        else:
+            usage.cpu_user = sum(v[1] for v in seen)
+            usage.cpu_sys = sum(v[2] for v in seen)
+        return code
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Fetti Queue – single-instance, coalescing job queue for watch triggers.
+
+A burst of saves used to restart `npm run fetti:auto && npm run fetti:feature`
+over and over, leaving half-finished `next build` runs fighting over .next/
+and letting AI edits land in the middle of a build. Now the watcher only
+enqueues:
+
+  python3 fetti_queue.py add cycle [--follow]
+
+and one detached worker (single instance via a lock file) runs the jobs
+strictly one at a time, so there are never two builds on one checkout.
+
+- Coalescing: at most one pending job per type; a newer request replaces
+  the pending one (recorded as "superseded"), and a request whose SAFE-root
+  snapshot equals the running job's inputs is dropped as a duplicate.
+- Stale-run cancellation: when a request arrives for the type that is
+  running and its snapshot differs from the running job's (fetti_git
+  ChangeSet between root_trees), the running job is marked obsolete. The
+  worker then stops it cooperatively – SIGTERM to its process tree and
+  process group, SIGKILL after a grace period – but only while it is in a
+  read-only check step (doctor/auto); a step that edits files is allowed
+  to finish, and the rest of its chain is skipped. A cancellable step can
+  also hold off the kill for a phase that must not be cut short – the
+  auto-deploy after `fetti auto` – with `with fetti_queue.hold("deploy"):`;
+  the worker waits for the hold to end and stops the step after it.
+
+Job output goes to .fetti/queue.log; --follow streams the job's part of it
+and exits with its exit code. State lives in .fetti/queue.json.
+"""
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import fetti_proc
+import fetti_trace
+from fetti_fs import atomic_write_text, file_lock
+from fetti_git import RootTrees, git_state
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+STATE_DIR = PROJECT_ROOT / ".fetti"
+STATE_PATH = STATE_DIR / "queue.json"
+WORKER_LOCK = STATE_DIR / "queue-worker.pid"
+LOG_PATH = STATE_DIR / "queue.log"
+# Set in a step's environment: the id of the queue job it belongs to.
+JOB_ENV = "FETTI_QUEUE_JOB"
+
+# job type -> chain of `fetti.py` commands; a failing step ends the chain.
+JOB_TYPES: Dict[str, List[List[str]]] = {
+    "doctor": [["doctor"]],
+    "auto": [["auto"]],
+    "feature": [["feature"]],
+    "cycle": [["auto"], ["feature"]],
+}
+# Steps that only check the tree and may be killed once their inputs are stale.
+CANCELLABLE = {"doctor", "auto"}
+
+POLL_SECONDS = 0.25
+IDLE_SECONDS = 2.0
+KILL_GRACE = 10.0
+RECENT = 20
+LOG_MAX_BYTES = 5 * 1024 * 1024
+
+
+def _read() -> Dict[str, Any]:
+    try:
+        data = json.loads(STATE_PATH.read_text() or "{}")
+        if isinstance(data, dict):
+            data.setdefault("pending", {})
+            data.setdefault("recent", [])
+            return data
+    except Exception:
+        pass
+    return {"seq": 0, "pending": {}, "running": None, "recent": []}
+
+
+def _write(state: Dict[str, Any]) -> None:
+    atomic_write_text(STATE_PATH, json.dumps(state, indent=2) + "\n")
+
+
+def _finish(state: Dict[str, Any], job: Dict[str, Any], status: str, note: Optional[str] = None) -> None:
+    job["status"] = status
+    job["ended"] = time.time()
+    if note:
+        job["note"] = note
+    state["recent"] = (state["recent"] + [job])[-RECENT:]
+
+
+def snapshot() -> Optional[RootTrees]:
+    return git_state().root_trees()
+
+
+def obsolete(before: Optional[RootTrees], after: Optional[RootTrees]) -> Optional[str]:
+    """ChangeSet summary if `after` differs from `before`; None if equal or unknown."""
+    if before is None or after is None:
+        return None
+    changes = git_state().diff_root_trees(before, after)
+    return changes.summary() if changes else None
+
+
+# ---------------------------------------------------------------- enqueue
+
+
+def enqueue(job_type: str) -> Optional[Dict[str, Any]]:
+    """Add a job (replacing any pending one of the same type); None if it was a duplicate."""
+    snap = snapshot()
+    with file_lock(STATE_PATH):
+        state = _read()
+        running = state.get("running")
+        if running and running["type"] == job_type and not running.get("cancel"):
+            if snap is not None and snap == running.get("snapshot"):
+                print(f"[QUEUE] {job_type} #{running['id']} is already running on these inputs; nothing queued.")
+                return None
+            change = obsolete(running.get("snapshot"), snap)
+            if change:
+                running["cancel"] = f"inputs changed ({change})"
+                print(f"[QUEUE] {job_type} #{running['id']} is now stale ({change}); cancelling it.")
+
+        state["seq"] = state.get("seq", 0) + 1
+        job = {
+            "id": state["seq"],
+            "type": job_type,
+            "steps": JOB_TYPES[job_type],
+            "status": "pending",
+            "enqueued": time.time(),
+            "snapshot": snap,
+        }
+        previous = state["pending"].get(job_type)
+        if previous:
+            _finish(state, previous, "superseded", f"replaced by #{job['id']}")
+            print(f"[QUEUE] Pending {job_type} #{previous['id']} superseded by #{job['id']}.")
+        state["pending"][job_type] = job
+        _write(state)
+    print(f"[QUEUE] Queued {job_type} #{job['id']}.")
+    ensure_worker()
+    return job
+
+
+def _try_lock() -> Optional[int]:
+    STATE_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(WORKER_LOCK, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def worker_alive() -> bool:
+    fd = _try_lock()
+    if fd is None:
+        return True
+    os.close(fd)
+    return False
+
+
+def ensure_worker() -> None:
+    """Start a detached worker unless one holds the worker lock."""
+    fd = _try_lock()
+    if fd is None:
+        return
+    os.close(fd)  # releases the lock; the new worker takes it (extra workers just exit)
+    with open(LOG_PATH, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "worker"],
+            cwd=PROJECT_ROOT,
+            env=fetti_trace.untraced_env(),
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+
+# ---------------------------------------------------------------- worker
+
+
+def _running(job_id: int) -> Dict[str, Any]:
+    running = _read().get("running")
+    return running if running and running.get("id") == job_id else {}
+
+
+def _cancel_reason(job_id: int) -> Optional[str]:
+    return _running(job_id).get("cancel")
+
+
+def _set_hold(job_id: int, what: Optional[str]) -> None:
+    with file_lock(STATE_PATH):
+        state = _read()
+        running = state.get("running")
+        if running and running.get("id") == job_id:
+            running["hold"] = what
+            _write(state)
+
+
+@contextmanager
+def hold(what: str) -> Iterator[None]:
+    """
+    Keep the worker from stopping this step while the block runs, even if
+    the job goes stale meanwhile. A no-op outside a queue job.
+    """
+    raw = os.environ.get(JOB_ENV, "")
+    if not raw.isdigit():
+        yield
+        return
+    _set_hold(int(raw), what)
+    try:
+        yield
+    finally:
+        _set_hold(int(raw), None)
+
+
+def _stop(proc: subprocess.Popen) -> None:
+    """SIGTERM the step's process tree and group, SIGKILL what is left after the grace period."""
+    fetti_proc.kill_tree(proc.pid, signal.SIGTERM, grace=KILL_GRACE)
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)  # orphans that left the tree but not the group
+    except OSError:
+        pass
+    proc.wait()
+
+
+def _run_job(job: Dict[str, Any], log) -> None:
+    for argv in job["steps"]:
+        reason = _cancel_reason(job["id"])
+        if reason:
+            job["cancelled"] = reason
+            return
+        cmd = [sys.executable, str(PROJECT_ROOT / "fetti.py"), *argv]
+        print(f"[QUEUE] #{job['id']} $ {' '.join(['fetti', *argv])}")
+        proc = subprocess.Popen(
+            cmd, cwd=PROJECT_ROOT, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+            env={**os.environ, JOB_ENV: str(job["id"])}, start_new_session=True,
+        )
+        with file_lock(STATE_PATH):
+            state = _read()
+            if state.get("running") and state["running"]["id"] == job["id"]:
+                state["running"].update(pid=proc.pid, step=argv[0])
+                _write(state)
+        waiting = None
+        while proc.poll() is None:
+            time.sleep(POLL_SECONDS)
+            if argv[0] in CANCELLABLE:
+                running = _running(job["id"])
+                reason = running.get("cancel")
+                if reason and running.get("hold"):
+                    if waiting != running["hold"]:
+                        waiting = running["hold"]
+                        print(f"[QUEUE] #{job['id']} {reason}; waiting for `fetti {argv[0]}` to finish its {waiting}.")
+                    continue
+                if reason:
+                    print(f"[QUEUE] #{job['id']} {reason}; stopping `fetti {argv[0]}` (pid {proc.pid}).")
+                    _stop(proc)
+                    job["cancelled"] = reason
+                    return
+        job["exit_code"] = proc.returncode
+        if proc.returncode != 0:
+            return
+
+
+def worker() -> int:
+    lock_fd = _try_lock()
+    if lock_fd is None:
+        return 0
+    os.ftruncate(lock_fd, 0)
+    os.write(lock_fd, f"{os.getpid()}\n".encode())
+    sys.stdout.reconfigure(line_buffering=True)
+    with file_lock(STATE_PATH):
+        state = _read()
+        if state.get("running"):  # left behind by a worker that died
+            _finish(state, state["running"], "failed", "worker died")
+            state["running"] = None
+            _write(state)
+        if LOG_PATH.exists() and LOG_PATH.stat().st_size > LOG_MAX_BYTES:
+            os.truncate(LOG_PATH, 0)  # nothing is running, so no offsets point into it
+    print(f"[QUEUE] Worker {os.getpid()} started.")
+    idle_since = time.monotonic()
+    with open(LOG_PATH, "ab") as log:
+        while True:
+            with file_lock(STATE_PATH):
+                state = _read()
+                if not state["pending"]:
+                    if time.monotonic() - idle_since >= IDLE_SECONDS:
+                        # Release while holding the state lock: an enqueue either
+                        # happened before (and we saw it) or will find the lock free.
+                        os.close(lock_fd)
+                        print(f"[QUEUE] Worker {os.getpid()} idle; exiting.")
+                        return 0
+                    job = None
+                else:
+                    job = min(state["pending"].values(), key=lambda j: j["enqueued"])
+                    del state["pending"][job["type"]]
+                    job.update(status="running", started=time.time(), log_offset=LOG_PATH.stat().st_size)
+                    state["running"] = job
+                    _write(state)
+            if job is None:
+                time.sleep(POLL_SECONDS)
+                continue
+
+            job["snapshot"] = snapshot()  # the inputs this run actually sees
+            with file_lock(STATE_PATH):
+                state = _read()
+                if state.get("running") and state["running"]["id"] == job["id"]:
+                    state["running"]["snapshot"] = job["snapshot"]
+                    _write(state)
+            print(f"[QUEUE] Starting {job['type']} #{job['id']}.")
+            _run_job(job, log)
+
+            with file_lock(STATE_PATH):
+                state = _read()
+                running = state.get("running") or {}
+                job["cancel"] = running.get("cancel")
+                job["log_end"] = LOG_PATH.stat().st_size
+                state["running"] = None
+                if job.get("cancelled"):
+                    _finish(state, job, "cancelled", job["cancelled"])
+                else:
+                    _finish(state, job, "done" if job.get("exit_code") == 0 else "failed")
+                _write(state)
+            print(f"[QUEUE] {job['type']} #{job['id']} {job['status']}"
+                  + (f" (exit {job['exit_code']})" if "exit_code" in job else "") + ".")
+            idle_since = time.monotonic()
+
+
+# ---------------------------------------------------------------- client views
+
+
+def _find(state: Dict[str, Any], job_id: int) -> Optional[Dict[str, Any]]:
+    for job in [*state["pending"].values(), state.get("running") or {}, *state["recent"]]:
+        if job.get("id") == job_id:
+            return job
+    return None
+
+
+def follow(job_id: int) -> int:
+    """Stream a job's output from the queue log; exit code of the job (0 if superseded)."""
+    offset: Optional[int] = None
+    last_check = time.monotonic()
+    while True:
+        job = _find(_read(), job_id)
+        if job is None:
+            print(f"[QUEUE] Job #{job_id} is no longer tracked.")
+            return 0
+        if job.get("status") in ("pending", "running") and time.monotonic() - last_check > IDLE_SECONDS:
+            last_check = time.monotonic()
+            if not worker_alive():
+                if job["status"] == "running":
+                    print(f"[QUEUE] The worker died while running #{job_id}.")
+                    return 1
+                ensure_worker()
+        if offset is None and "log_offset" in job:
+            offset = job["log_offset"]
+        if offset is not None:
+            end = job.get("log_end")
+            with open(LOG_PATH, "rb") as f:
+                f.seek(offset)
+                data = f.read() if end is None else f.read(max(0, end - offset))
+            offset += len(data)
+            if data:
+                sys.stdout.write(data.decode("utf-8", errors="replace"))
+                sys.stdout.flush()
+        status = job.get("status")
+        if status == "superseded":
+            print(f"[QUEUE] #{job_id} was {job.get('note', 'superseded')}.")
+            return 0
+        if status in ("done", "failed", "cancelled"):
+            if status == "cancelled":
+                print(f"[QUEUE] #{job_id} cancelled: {job.get('note')}")
+                return 0
+            return int(job.get("exit_code") or 0)
+        time.sleep(POLL_SECONDS)
+
+
+def print_status() -> None:
+    state = _read()
+    running = state.get("running")
+    print(f"[QUEUE] Worker: {'running' if worker_alive() else 'not running'}")
+    if running:
+        age = time.time() - running.get("started", time.time())
+        extra = f", cancel requested: {running['cancel']}" if running.get("cancel") else ""
+        print(f"  running: {running['type']} #{running['id']} step {running.get('step', '?')} for {age:.0f}s{extra}")
+    for job in sorted(state["pending"].values(), key=lambda j: j["enqueued"]):
+        print(f"  pending: {job['type']} #{job['id']}")
+    for job in state["recent"][-5:]:
+        code = f" exit {job['exit_code']}" if job.get("exit_code") is not None else ""
+        note = f" ({job['note']})" if job.get("note") else ""
+        print(f"  {job['status']:<10} {job['type']} #{job['id']}{code}{note}")
+
+
+def cancel_running(reason: str = "cancelled by user") -> bool:
+    with file_lock(STATE_PATH):
+        state = _read()
+        running = state.get("running")
+        if not running:
+            return False
+        running["cancel"] = reason
+        _write(state)
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fetti coalescing job queue")
+    sub = parser.add_subparsers(dest="command")
+    p_add = sub.add_parser("add", help="Queue a job (newest pending request per type wins).")
+    p_add.add_argument("type", choices=sorted(JOB_TYPES))
+    p_add.add_argument("--follow", action="store_true", help="Stream the job's output and exit with its code.")
+    sub.add_parser("worker", help="Run queued jobs (started automatically).")
+    sub.add_parser("status", help="Show the running, pending and recent jobs.")
+    sub.add_parser("cancel", help="Cancel the running check job.")
+    args = parser.parse_args(argv)
+
+    if args.command == "add":
+        job = enqueue(args.type)
+        return follow(job["id"]) if job and args.follow else 0
+    if args.command == "worker":
+        return worker()
+    if args.command == "cancel":
+        print("[QUEUE] Cancellation requested." if cancel_running() else "[QUEUE] Nothing is running.")
+        return 0
+    print_status()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
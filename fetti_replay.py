@@ -0,0 +1,240 @@
+"""
+Fetti Replay – record npm steps and model calls into a fixture bundle, and
+play them back without npm or the network.
+
+  FETTI_RECORD=/path/bundle   run normally; every captured command (the
+                              auto-fix and feature loops' run_cmd) and every
+                              model call is appended to the bundle.
+  FETTI_REPLAY=/path/bundle   commands and model calls are answered from
+                              the bundle instead of being executed.
+  FETTI_REPLAY_LATENCY=1      while replaying, sleep for the recorded
+                              durations (any float scales them; default 0).
+  FETTI_REPLAY_STRICT=1       a model prompt that differs from the recorded
+                              one is an error instead of a warning.
+
+A bundle is a directory with manifest.json (commit, dirty flag, created)
+and events.jsonl, one JSON object per event:
+
+  {"kind": "cmd", "cmd": "npm run build", "exit_code": 1, "stdout": ..., "stderr": ..., "duration": 41.2}
+  {"kind": "model", "provider": "gemini", "purpose": "fix", "model": ...,
+   "prompt_sha": ..., "prompt_chars": ..., "response": ..., "duration": 7.9, "error": null}
+
+Replay is deterministic: the k-th `npm run build` of a session gets the
+k-th recorded `npm run build`, the k-th gemini/fix call the k-th recorded
+one. The per-key cursors live in the bundle (cursors/<session>.json), and
+the session id is exported in FETTI_REPLAY_SESSION so child processes (the
+feature runner's agent, the wrapper's doctor) continue the same sequence.
+Replays are only meaningful from the recorded commit; benchmarks/cycle.py
+checks out a scratch worktree at manifest["commit"] for each run.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import fetti_cancel
+
+import fetti_trace
+from fetti_fs import atomic_write_text, file_lock
+
+RECORD_ENV = "FETTI_RECORD"
+REPLAY_ENV = "FETTI_REPLAY"
+LATENCY_ENV = "FETTI_REPLAY_LATENCY"
+STRICT_ENV = "FETTI_REPLAY_STRICT"
+SESSION_ENV = "FETTI_REPLAY_SESSION"
+VERSION = 1
+
+_EVENTS: Optional[Dict[str, List[Dict[str, Any]]]] = None
+
+
+class ReplayMiss(RuntimeError):
+    """The bundle has no (more) recorded events for this command or model call."""
+
+
+def recording() -> Optional[Path]:
+    value = os.environ.get(RECORD_ENV)
+    return Path(value) if value else None
+
+
+def replaying() -> Optional[Path]:
+    value = os.environ.get(REPLAY_ENV)
+    return Path(value) if value else None
+
+
+def _prompt_sha(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8", "replace")).hexdigest()[:16]
+
+
+def _event_key(event: Dict[str, Any]) -> str:
+    if event.get("kind") == "model":
+        return f"model:{event.get('provider')}:{event.get('purpose')}"
+    return f"cmd:{event.get('cmd')}"
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+def _write_manifest(bundle: Path) -> None:
+    manifest = bundle / "manifest.json"
+    if manifest.exists():
+        return
+    from fetti_git import git_state
+
+    git = git_state()
+    info = {
+        "version": VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git.git("rev-parse", "HEAD").strip() or None,
+        "dirty": bool(git.status()),
+    }
+    if info["dirty"]:
+        print(f"[REPLAY] Warning: recording on a dirty tree; replays start from {info['commit']} without those changes.")
+    atomic_write_text(manifest, json.dumps(info, indent=2) + "\n")
+
+
+def _append(bundle: Path, event: Dict[str, Any]) -> None:
+    events = bundle / "events.jsonl"
+    with file_lock(events):
+        _write_manifest(bundle)
+        with events.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+# ---------------------------------------------------------------------------
+# Replaying
+# ---------------------------------------------------------------------------
+
+def reset_session() -> None:
+    """Forget the loaded bundle and the events already claimed (fettid, per job)."""
+    global _EVENTS
+    _EVENTS = None
+
+
+def _events(bundle: Path) -> Dict[str, List[Dict[str, Any]]]:
+    global _EVENTS
+    if _EVENTS is None:
+        by_key: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            lines = (bundle / "events.jsonl").read_text(encoding="utf-8").splitlines()
+        except OSError as e:
+            raise ReplayMiss(f"cannot read replay bundle {bundle}: {e}") from e
+        for line in lines:
+            if line.strip():
+                event = json.loads(line)
+                by_key.setdefault(_event_key(event), []).append(event)
+        _EVENTS = by_key
+    return _EVENTS
+
+
+def _next(bundle: Path, key: str) -> Dict[str, Any]:
+    """Claim the next recorded event for `key` in this replay session."""
+    session = os.environ.setdefault(SESSION_ENV, uuid.uuid4().hex[:12])
+    cursors = bundle / "cursors" / f"{session}.json"
+    recorded = _events(bundle).get(key, [])
+    with file_lock(cursors):
+        try:
+            positions = json.loads(cursors.read_text())
+        except (OSError, ValueError):
+            positions = {}
+        index = positions.get(key, 0)
+        if index >= len(recorded):
+            raise ReplayMiss(f"{key}: call #{index + 1} but the bundle recorded {len(recorded)}")
+        positions[key] = index + 1
+        atomic_write_text(cursors, json.dumps(positions))
+    return recorded[index]
+
+
+def _sleep(duration: Optional[float]) -> None:
+    try:
+        scale = float(os.environ.get(LATENCY_ENV, "0") or 0)
+    except ValueError:
+        scale = 0.0
+    if scale > 0 and duration:
+        time.sleep(duration * scale)
+
+
+# ---------------------------------------------------------------------------
+# Chokepoints
+# ---------------------------------------------------------------------------
+
+def run(cmd: Sequence[str], cwd: Optional[Path] = None) -> subprocess.CompletedProcess:
+    """subprocess.run(cmd, capture_output=True, text=True), recorded or replayed."""
+    fetti_cancel.check(f"running {' '.join(cmd)}")
+    bundle = replaying()
+    if bundle is not None:
+        event = _next(bundle, f"cmd:{' '.join(cmd)}")
+        with fetti_trace.span(" ".join(cmd), cat="cmd", replayed=True, exit_code=event["exit_code"]):
+            _sleep(event.get("duration"))
+        return subprocess.CompletedProcess(list(cmd), event["exit_code"], event.get("stdout", ""), event.get("stderr", ""))
+
+    started = time.monotonic()
+    with fetti_trace.span(" ".join(cmd), cat="cmd") as span:
+        proc = subprocess.run(list(cmd), cwd=cwd, capture_output=True, text=True)
+        span.set(exit_code=proc.returncode)
+    bundle = recording()
+    if bundle is not None:
+        _append(bundle, {
+            "kind": "cmd",
+            "cmd": " ".join(cmd),
+            "exit_code": proc.returncode,
+            "stdout": proc.stdout or "",
+            "stderr": proc.stderr or "",
+            "duration": round(time.monotonic() - started, 3),
+        })
+    return proc
+
+
+def model_call(provider: str, model: str, purpose: str, prompt: str, call: Callable[[], str]) -> str:
+    """
+    Return call()'s response text, recorded or replayed. A recorded failure
+    is replayed as a RuntimeError carrying the original message.
+    """
+    fetti_cancel.check(f"calling {provider} ({purpose})")
+    bundle = replaying()
+    if bundle is not None:
+        event = _next(bundle, f"model:{provider}:{purpose}")
+        if event.get("prompt_sha") != _prompt_sha(prompt):
+            message = f"{provider}/{purpose}: prompt differs from the recording"
+            if os.environ.get(STRICT_ENV) == "1":
+                raise ReplayMiss(message)
+            print(f"[REPLAY] Warning: {message}; replaying the recorded response anyway.")
+        _sleep(event.get("duration"))
+        if event.get("error"):
+            raise RuntimeError(event["error"])
+        return event.get("response") or ""
+
+    bundle = recording()
+    if bundle is None:
+        return call()
+    started = time.monotonic()
+    event: Dict[str, Any] = {
+        "kind": "model",
+        "provider": provider,
+        "model": model,
+        "purpose": purpose,
+        "prompt_sha": _prompt_sha(prompt),
+        "prompt_chars": len(prompt),
+        "response": None,
+        "error": None,
+    }
+    try:
+        event["response"] = call()
+        return event["response"]
+    except Exception as e:
+        event["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        event["duration"] = round(time.monotonic() - started, 3)
+        _append(bundle, event)
+
+
+def manifest(bundle: Path) -> Dict[str, Any]:
+    return json.loads((Path(bundle) / "manifest.json").read_text())
@@ -0,0 +1,229 @@
+"""
+Fetti Repo Map – a compact tree of the SAFE roots for model prompts.
+
+The feature agent used to list every file by its full path, 200 per root.
+This renders the whole SAFE tree as an indented trie instead:
+
+  app/ (212 files)
+    {layout,page}.tsx
+    api/
+      {deals,users,webhooks/stripe}/ route.ts
+      leads/ route.ts
+        [id]/ route.ts
+  components/ (57 files)
+    {LeadCard,LeadTable,Sidebar}.tsx
+    ui/ (41 files: 38 .tsx, 3 .ts)
+
+  - directories with a single subdirectory and no files are merged (a/b/c/);
+  - files sharing an extension are brace-grouped ({a,b}.tsx), and sibling
+    directories with identical contents share one line ({deals,users}/);
+  - a directory's own files are listed while there are at most FILE_LIMITS[0]
+    of them, otherwise summarised by count and extension.
+
+If the result is over the token budget (FETTI_REPO_HINT_TOKENS, default
+2000, at ~4 characters per token), the file limit drops through
+FILE_LIMITS, then directories below a shrinking depth are summarised as a
+whole, so every file is still accounted for.
+
+Files come from the per-root tree ids of the working tree
+(fetti_git.root_trees: tracked + untracked, .gitignore respected), and the
+rendered map is cached per set of tree ids, so asking again for an
+unchanged tree costs one tree hash. Outside a git checkout the roots are
+walked instead.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import fetti_trace
+
+from fetti_git import SAFE_ROOTS, git_state
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+DEFAULT_TOKENS = 2000
+CHARS_PER_TOKEN = 4
+FILE_LIMITS = (200, 50, 12)  # own files listed per directory, from most to least detailed
+SKIP_DIRS = {"node_modules", ".next", ".turbo", "dist", "build", ".git"}
+_CACHE: Dict[Tuple, str] = {}
+LEGEND = "({a,b} = each of a and b; (N files: …) = summarised by count)"
+
+
+class Node:
+    __slots__ = ("dirs", "files", "count", "exts")
+
+    def __init__(self) -> None:
+        self.dirs: Dict[str, Node] = {}
+        self.files: List[str] = []
+        self.count = 0  # files in this subtree
+        self.exts: Optional[Counter] = None  # extension -> files in this subtree (set by _tally)
+
+
+def token_budget() -> int:
+    try:
+        return max(100, int(os.environ.get("FETTI_REPO_HINT_TOKENS", DEFAULT_TOKENS)))
+    except ValueError:
+        return DEFAULT_TOKENS
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def list_files(roots: Sequence[str] = SAFE_ROOTS, trees: Optional[Dict[str, Optional[str]]] = None) -> List[str]:
+    """Repo-relative files under `roots`, from their root_trees() ids when given."""
+    names = [r.rstrip("/") for r in roots]
+    files: List[str] = []
+    if trees is not None:
+        for name in names:
+            tree = trees.get(name)
+            if tree:
+                out = git_state().git("ls-tree", "-r", "-z", "--name-only", tree)
+                files.extend(f"{name}/{p}" for p in out.split("\0") if p)
+        return sorted(files)
+    for name in names:
+        for dirpath, dirnames, filenames in os.walk(PROJECT_ROOT / name):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+            rel = Path(dirpath).relative_to(PROJECT_ROOT)
+            files.extend(str(rel / f) for f in filenames)
+    return sorted(files)
+
+
+def build_trie(paths: Sequence[str]) -> Node:
+    top = Node()
+    for path in paths:
+        *dirs, name = path.split("/")
+        node = top
+        for d in dirs:
+            child = node.dirs.get(d)
+            if child is None:
+                child = node.dirs[d] = Node()
+            node = child
+        node.files.append(name)
+    _tally(top)
+    return top
+
+
+def _tally(node: Node) -> None:
+    node.exts = Counter(_split(f)[1] or f for f in node.files)
+    for child in node.dirs.values():
+        _tally(child)
+        node.exts.update(child.exts)
+    node.count = sum(node.exts.values())
+
+
+def _split(name: str) -> Tuple[str, str]:
+    """route.ts -> (route, .ts); a.test.tsx -> (a, .test.tsx); .env -> (.env, '')."""
+    dot = name.find(".", 1)
+    return (name, "") if dot < 0 else (name[:dot], name[dot:])
+
+
+def _braces(items: Sequence[str]) -> str:
+    return items[0] if len(items) == 1 else "{" + ",".join(items) + "}"
+
+
+def format_files(files: Sequence[str]) -> str:
+    """[page.tsx, layout.tsx, utils.ts] -> '{layout,page}.tsx, utils.ts'."""
+    groups: Dict[str, List[str]] = {}
+    for name in sorted(files):
+        stem, ext = _split(name)
+        groups.setdefault(ext, []).append(stem)
+    return ", ".join(_braces(stems) + ext for ext, stems in groups.items())
+
+
+def summarize(count: int, exts: Counter) -> str:
+    """(38 files: 35 .tsx, 3 .ts)"""
+    top = ", ".join(f"{n} {ext}" for ext, n in exts.most_common(3))
+    more = ", …" if len(exts) > 3 else ""
+    return f"({count} file{'s' if count != 1 else ''}: {top}{more})"
+
+
+def _content(node: Node, depth: int, file_limit: int, max_depth: Optional[int]) -> List[str]:
+    """Lines describing a directory's contents; the first one goes on the directory's own line."""
+    if max_depth is not None and depth >= max_depth and node.dirs:
+        return [summarize(node.count, node.exts)]
+    if len(node.files) <= file_limit:
+        files = format_files(node.files)
+    else:
+        files = summarize(len(node.files), Counter(_split(f)[1] or f for f in node.files))
+    if not node.dirs:
+        return [files]
+
+    children: List[Tuple[str, List[str]]] = []
+    for name in sorted(node.dirs):
+        child, label = node.dirs[name], name
+        while not child.files and len(child.dirs) == 1:
+            (sub, child), = child.dirs.items()
+            label += "/" + sub
+        children.append((label, _content(child, depth + 1, file_limit, max_depth)))
+
+    grouped: Dict[Tuple[str, ...], List[str]] = {}
+    for label, lines in children:
+        grouped.setdefault(tuple(lines), []).append(label)
+    out = [files] if node.files else [""]
+    for lines, labels in grouped.items():
+        out.append(f"  {_braces(labels)}/ {lines[0]}".rstrip())
+        out.extend("  " + line for line in lines[1:])
+    return out
+
+
+def render(
+    top: Node,
+    roots: Sequence[str] = SAFE_ROOTS,
+    file_limit: int = FILE_LIMITS[0],
+    max_depth: Optional[int] = None,
+) -> str:
+    lines: List[str] = [LEGEND]
+    missing = []
+    for root in roots:
+        name = root.rstrip("/")
+        node = top.dirs.get(name)
+        if node is None:
+            missing.append(root)
+            continue
+        content = _content(node, 1, file_limit, max_depth)
+        lines.append(f"{root} ({node.count} file{'s' if node.count != 1 else ''})")
+        if content[0]:
+            lines.append("  " + content[0])
+        lines.extend(content[1:])
+    if missing:
+        lines.append(f"(absent: {', '.join(missing)})")
+    return "\n".join(lines)
+
+
+def depth_of(node: Node) -> int:
+    return 1 + max((depth_of(c) for c in node.dirs.values()), default=0)
+
+
+def repo_map(budget: Optional[int] = None, roots: Sequence[str] = SAFE_ROOTS) -> str:
+    """The SAFE tree in at most `budget` tokens (FETTI_REPO_HINT_TOKENS), coarsened as needed."""
+    budget = budget or token_budget()
+    trees = git_state().root_trees(roots)
+    key = (tuple(roots), budget, tuple(sorted(trees.items())) if trees is not None else None)
+    if trees is not None and key in _CACHE:
+        return _CACHE[key]
+    with fetti_trace.span("repo map", cat="prompt", budget=budget):
+        text = _fit(build_trie(list_files(roots, trees)), roots, budget)
+    if trees is not None:
+        _CACHE.clear()
+        _CACHE[key] = text
+    return text
+
+
+def _fit(top: Node, roots: Sequence[str], budget: int) -> str:
+    levels = [(limit, None) for limit in FILE_LIMITS]
+    levels += [(FILE_LIMITS[-1], depth) for depth in range(depth_of(top) - 1, 0, -1)]
+    # Each level renders no longer than the one before it: binary-search the most detailed that fits.
+    lo, hi = 0, len(levels) - 1
+    best = render(top, roots, *levels[hi])
+    while lo < hi:
+        mid = (lo + hi) // 2
+        text = render(top, roots, *levels[mid])
+        if estimate_tokens(text) <= budget:
+            best, hi = text, mid
+        else:
+            lo = mid + 1
+    return best
@@ -0,0 +1,308 @@
+"""
+Fetti Shard – split the doctor's `npm test` into timing-balanced shards
+that run in parallel.
+
+Only a Jest or Vitest suite is sharded: the package.json test script must
+invoke `jest` or `vitest` as its last command, where the shard's files end
+up (or FETTI_TEST_RUNNER names one, for scripts that hide it). Anything else – Playwright, a custom runner – runs as one
+process. The files are the ones the runner itself would run (`jest
+--listTests`, `vitest list --filesOnly`, with the script's own arguments),
+so specs another runner owns never land in a shard; git ls-files only
+serves as a quick check that there is anything to split.
+
+The files are packed into N shards with the greedy longest-processing-time
+rule: files sorted by recorded duration, each into the currently lightest
+shard. Each shard runs as its own `npm test -- <files>` (Jest with
+--runTestsByPath, Vitest takes them as filters), and the step fails with
+the first failing shard's exit code.
+
+  FETTI_TEST_SHARDS   number of shards (default: the usable cores; 1 = off)
+  FETTI_TEST_RUNNER   jest | vitest, when the test script does not name it
+
+Per-file durations live in .fetti/test_timings.json and are updated after
+every sharded run: from the runner's own per-file times where its output
+has them (Jest "PASS path (1.2 s)", Vitest "✓ path (3 tests) 45ms"), and
+otherwise by spreading the shard's remaining wall time over its untimed
+files. Files with no history count as the median known duration.
+
+Each shard is a separate runner process, so a runner that parallelises
+internally (Jest workers) should be told to run in band, or the shard
+count lowered, to avoid oversubscribing the cores.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import queue
+import re
+import shlex
+import statistics
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import fetti_cancel
+import fetti_trace
+from fetti_fs import atomic_write_text, file_lock
+from fetti_git import git_state
+from fetti_proc import TreeMonitor, Usage
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+TIMINGS_PATH = PROJECT_ROOT / ".fetti" / "test_timings.json"
+DEFAULT_FILE_SECONDS = 1.0
+ALPHA = 0.5  # weight of the newest measurement in a file's running duration
+RUNNERS = ("jest", "vitest")
+LIST_TIMEOUT = 120
+
+TEST_FILE = re.compile(r"(^|/)(__tests__/.*|[^/]+\.(test|spec))\.[cm]?[jt]sx?$")
+FILE_TIMES = (
+    # Jest: "PASS app/api/leads/route.test.ts (5.123 s)" – only slow files carry a time
+    re.compile(r"^\s*(?:PASS|FAIL)\s+(?P<path>\S+)(?:\s+\((?P<value>\d+(?:\.\d+)?)\s*(?P<unit>m?s)\))?"),
+    # Vitest: " ✓ lib/score.test.ts (3 tests) 45ms"
+    re.compile(r"^\s*[✓×❯↓]\s+(?P<path>\S+)\s+\(\d+ tests?[^)]*\)\s+(?P<value>\d+(?:\.\d+)?)(?P<unit>m?s)"),
+)
+
+
+@dataclass
+class Shard:
+    index: int
+    files: List[str] = field(default_factory=list)
+    runner: str = ""
+    estimate: float = 0.0
+    exit_code: Optional[int] = None
+    duration: float = 0.0
+    output: str = ""
+    usage: Optional[Usage] = None
+
+
+def shard_count() -> int:
+    raw = os.environ.get("FETTI_TEST_SHARDS", "")
+    try:
+        return max(1, int(raw))
+    except ValueError:
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def discover() -> List[str]:
+    """Tracked and untracked (not ignored) test files, repo-relative."""
+    out = git_state().git("ls-files", "-z", "--cached", "--others", "--exclude-standard")
+    return sorted({p for p in out.split("\0") if p and TEST_FILE.search(p) and "node_modules/" not in p})
+
+
+def test_script() -> str:
+    try:
+        scripts = json.loads((PROJECT_ROOT / "package.json").read_text()).get("scripts") or {}
+        return str(scripts.get("test") or "")
+    except Exception:
+        return ""
+
+
+def _runner_in(part: str) -> Optional[List[str]]:
+    try:
+        tokens = shlex.split(part)
+    except ValueError:
+        return None
+    for i, token in enumerate(tokens):
+        if Path(token).name in RUNNERS:
+            return [Path(token).name, *tokens[i + 1:]]
+    return None
+
+
+def runner_argv(script: Optional[str] = None) -> Optional[List[str]]:
+    """
+    The jest/vitest invocation in the test script with its own arguments
+    ("cross-env CI=1 jest --ci" -> ["jest", "--ci"]), else [FETTI_TEST_RUNNER],
+    else None.
+
+    `npm test -- <files>` appends the files to the end of the whole script,
+    so the runner must be its last command: in "jest --ci && eslint ." the
+    files would go to eslint and every shard would run the full suite. Such
+    a script is not sharded.
+    """
+    script = test_script() if script is None else script
+    *before, last = re.split(r"&&|\|\|?|;", script)
+    argv = _runner_in(last)
+    if argv is not None:
+        return argv
+    if any(_runner_in(part) for part in before):
+        print("[SHARD] The test script runs its test runner before other commands; not sharding.")
+        return None
+    forced = os.environ.get("FETTI_TEST_RUNNER", "").strip().lower()
+    return [forced] if forced in RUNNERS else None
+
+
+def list_tests(argv: Sequence[str]) -> Optional[List[str]]:
+    """Repo-relative files the runner would run, or None if it could not list them."""
+    runner, args = argv[0], list(argv[1:])
+    if runner == "jest":
+        cmd = ["npx", "--no-install", "jest", *args, "--listTests"]
+    else:
+        if args and args[0] in ("run", "watch", "dev"):
+            args = args[1:]
+        cmd = ["npx", "--no-install", "vitest", "list", *args, "--filesOnly"]
+    fetti_cancel.check(f"running {' '.join(cmd)}")
+    try:
+        with fetti_trace.span("list tests", cat="cmd", runner=runner):
+            proc = subprocess.run(
+                cmd, cwd=PROJECT_ROOT, capture_output=True, text=True, errors="replace", timeout=LIST_TIMEOUT
+            )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"[SHARD] Could not list {runner} tests: {e}")
+        return None
+    if proc.returncode != 0:
+        print(f"[SHARD] `{' '.join(cmd)}` exited with {proc.returncode}; not sharding.")
+        return None
+    root = PROJECT_ROOT.resolve()
+    files = set()
+    for line in proc.stdout.splitlines():
+        path = line.strip().split(" > ")[0]  # vitest without --filesOnly: "file > suite > test"
+        if not path:
+            continue
+        full = Path(path) if Path(path).is_absolute() else root / path
+        try:
+            rel = full.resolve().relative_to(root)
+        except ValueError:
+            continue
+        if full.is_file() and "node_modules" not in rel.parts:
+            files.add(rel.as_posix())
+    return sorted(files)
+
+
+def load_timings() -> Dict[str, float]:
+    try:
+        data = json.loads(TIMINGS_PATH.read_text() or "{}")
+        return {k: float(v) for k, v in data.items()} if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def plan(files: Sequence[str], timings: Dict[str, float], n: int) -> List[Shard]:
+    """Greedy LPT packing of `files` into at most n shards (empty shards dropped)."""
+    known = [timings[f] for f in files if f in timings]
+    fallback = statistics.median(known) if known else DEFAULT_FILE_SECONDS
+    shards = [Shard(i + 1) for i in range(max(1, min(n, len(files))))]
+    heap = [(0.0, s.index) for s in shards]
+    for path in sorted(files, key=lambda f: (-timings.get(f, fallback), f)):
+        load, index = heapq.heappop(heap)
+        shard = shards[index - 1]
+        shard.files.append(path)
+        shard.estimate = load + timings.get(path, fallback)
+        heapq.heappush(heap, (shard.estimate, index))
+    return [s for s in shards if s.files]
+
+
+def plan_for(cmd: Sequence[str]) -> Optional[List[Shard]]:
+    """Shards for the doctor's test command, or None to run it as one process."""
+    n = shard_count()
+    if n < 2:
+        return None
+    argv = runner_argv()
+    if argv is None or len(discover()) < 2:
+        return None
+    # The runner's own list is what gets run; discover() above only saves spawning it for nothing.
+    files = list_tests(argv)
+    if not files or len(files) < 2:
+        return None
+    shards = plan(files, load_timings(), n)
+    for shard in shards:
+        shard.runner = argv[0]
+    return shards
+
+
+def shard_cmd(cmd: Sequence[str], shard: Shard) -> List[str]:
+    exact = ["--runTestsByPath"] if shard.runner == "jest" else []  # paths, not regexes
+    return [*cmd, *([] if "--" in cmd else ["--"]), *exact, *shard.files]
+
+
+def run(
+    cmd: Sequence[str],
+    shards: Sequence[Shard],
+    on_done: Callable[[Shard], None],
+    interval: float = 1.0,
+    rss_limit_kb: Optional[int] = None,
+) -> int:
+    """
+    Run every shard at once. on_done(shard) is called from this thread as
+    each one finishes, so output and events never interleave. Returns the
+    merged exit code: 0, or the first failing shard's code. rss_limit_kb
+    is for the whole step and split evenly across the shards.
+    """
+    fetti_cancel.check(f"running {len(shards)} test shard(s)")
+    finished: "queue.Queue[Shard]" = queue.Queue()
+    per_shard = rss_limit_kb // len(shards) if rss_limit_kb else None
+
+    def worker(shard: Shard) -> None:
+        started = time.monotonic()
+        try:
+            with fetti_trace.span(f"shard {shard.index}", cat="cmd", files=len(shard.files)) as span:
+                proc = subprocess.Popen(
+                    shard_cmd(cmd, shard),
+                    cwd=PROJECT_ROOT,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    errors="replace",
+                )
+                monitor = TreeMonitor(proc, interval, per_shard)
+                shard.output = proc.stdout.read()
+                code = monitor.wait()
+                shard.usage = monitor.usage
+                span.set(exit_code=code)
+            # A killed shard is a failure even if npm swallowed the signal.
+            shard.exit_code = code or (137 if shard.usage.killed else 0)
+        except Exception as e:
+            shard.output += f"\n[SHARD] {type(e).__name__}: {e}\n"
+            shard.exit_code = shard.exit_code or 1
+        shard.duration = time.monotonic() - started
+        finished.put(shard)
+
+    for shard in shards:
+        threading.Thread(target=worker, args=(shard,), name=f"fetti-shard-{shard.index}", daemon=True).start()
+    for _ in shards:
+        on_done(finished.get())
+    return next((s.exit_code for s in shards if s.exit_code), 0)
+
+
+def file_times(output: str) -> Dict[str, Optional[float]]:
+    """path -> seconds (None when the runner listed the file without a time)."""
+    times: Dict[str, Optional[float]] = {}
+    for line in output.splitlines():
+        for pattern in FILE_TIMES:
+            m = pattern.match(line)
+            if m:
+                value = m.group("value")
+                seconds = None if value is None else float(value) / (1000 if m.group("unit") == "ms" else 1)
+                times[m.group("path").removeprefix("./")] = seconds
+                break
+    return times
+
+
+def update_timings(shards: Sequence[Shard]) -> None:
+    """Fold this run's per-file durations into the stored ones; prune files that are gone."""
+    measured: Dict[str, float] = {}
+    for shard in shards:
+        reported = file_times(shard.output)
+        timed = {f: reported[f] for f in shard.files if reported.get(f) is not None}
+        untimed = [f for f in shard.files if f not in timed]
+        measured.update(timed)
+        if untimed:
+            rest = max(shard.duration - sum(timed.values()), 0.0) / len(untimed)
+            measured.update((f, rest) for f in untimed)
+
+    with file_lock(TIMINGS_PATH):
+        timings = load_timings()
+        current = {f for s in shards for f in s.files}
+        timings = {f: t for f, t in timings.items() if f in current}
+        for path, seconds in measured.items():
+            old = timings.get(path)
+            timings[path] = round(seconds if old is None else ALPHA * seconds + (1 - ALPHA) * old, 3)
+        atomic_write_text(TIMINGS_PATH, json.dumps(timings, indent=1, sort_keys=True) + "\n")
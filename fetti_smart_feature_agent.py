@@ -1,27 +1,18 @@
 import json
-from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 from fetti_memory_utils import load_brain, load_last_errors
-
-PLAN_PATH = Path("fetti_feature_plan.md")
+from fetti_plan import PLAN_PATH, load_plan
 
 
 def get_first_open_task() -> Optional[str]:
     """
-    Returns the first open (non-[x]) bullet line from fetti_feature_plan.md,
-    or None if no tasks are open.
+    Returns the first open task from fetti_feature_plan.md (with its nested
+    sub-bullets), or None if no tasks are open.
     """
-    if not PLAN_PATH.exists():
-        return None
-
-    lines = PLAN_PATH.read_text().splitlines()
-    for line in lines:
-        stripped = line.strip()
-        # Open task: "- something"
-        if stripped.startswith("- ") and not stripped.startswith("- [x]"):
-            return stripped[2:].strip()
-    return None
+    plan = load_plan(PLAN_PATH)
+    task = plan.first_open_task() if plan else None
+    return task.description() if task else None
 
 
 def summarize_last_errors(errors: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -0,0 +1,150 @@
+"""
+Fetti Steps – per-step results and input fingerprints for resumable runs.
+
+The doctor and the auto AI loop run an ordered list of (name, cmd) steps.
+After each step its result is stored in .fetti/doctor_state.json under the
+runner's name, together with the step's input fingerprint (command line +
+working-tree content hash):
+
+  {"doctor": {"failed_step": "Build",
+              "steps": {"Lint": {"ok": true, "exit_code": 0, "fingerprint": "…",
+                                 "duration": 12.3, "ts": "…"}, …}}}
+
+select_steps() turns that into a plan: run everything, start at a named
+step, run only some steps, or resume – rerun the step that failed last time
+and skip only the steps whose recorded pass was on the same inputs. Any
+other step runs again (and is skipped there if the validation ledger has a
+pass for this tree), wherever it sits relative to the failed step: the
+steps may have run in another order, and their last pass may predate the
+edits since. unverified() names the steps a plan skips without such proof,
+so a partial run is never reported as a full pass.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fetti_fs import atomic_write_text, file_lock
+from fetti_git import git_state
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+STATE_PATH = PROJECT_ROOT / ".fetti" / "doctor_state.json"
+
+Step = Tuple[str, List[str]]
+UNCHANGED = "inputs unchanged since it passed"  # the only skip backed by a recorded pass
+
+
+def fingerprint(cmd: Sequence[str], tree: Optional[str]) -> Optional[str]:
+    """Input fingerprint of a step: its command line on a given working tree."""
+    if tree is None:
+        return None
+    return hashlib.sha1(f"{' '.join(cmd)}\0{tree}".encode()).hexdigest()[:16]
+
+
+def current_tree() -> Optional[str]:
+    return git_state().tree_hash()
+
+
+def _read() -> Dict[str, Any]:
+    try:
+        data = json.loads(STATE_PATH.read_text() or "{}")
+        if isinstance(data, dict):
+            return data
+    except Exception:
+        pass
+    return {}
+
+
+def load_state(runner: str) -> Dict[str, Any]:
+    state = _read().get(runner)
+    if not isinstance(state, dict):
+        return {"failed_step": None, "steps": {}}
+    state.setdefault("steps", {})
+    return state
+
+
+def record_result(
+    runner: str,
+    name: str,
+    cmd: Sequence[str],
+    exit_code: int,
+    fp: Optional[str],
+    duration: Optional[float] = None,
+) -> None:
+    """Store one step's result; a failure becomes the runner's failed_step, a pass clears it."""
+    with file_lock(STATE_PATH):
+        data = _read()
+        state = data.setdefault(runner, {"failed_step": None, "steps": {}})
+        state.setdefault("steps", {})[name] = {
+            "ok": exit_code == 0,
+            "exit_code": exit_code,
+            "cmd": " ".join(cmd),
+            "fingerprint": fp,
+            "duration": round(duration, 2) if duration is not None else None,
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if exit_code != 0:
+            state["failed_step"] = name
+        elif state.get("failed_step") == name:
+            state["failed_step"] = None
+        atomic_write_text(STATE_PATH, json.dumps(data, indent=2) + "\n")
+
+
+def failed_step(runner: str) -> Optional[str]:
+    """The step the runner's last run failed at (what a resume retries)."""
+    return load_state(runner).get("failed_step")
+
+
+def _index_of(steps: Sequence[Step], name: str) -> Optional[int]:
+    for i, (step_name, _) in enumerate(steps):
+        if step_name.lower() == name.lower():
+            return i
+    return None
+
+
+def select_steps(
+    runner: str,
+    steps: Sequence[Step],
+    start_at: Optional[str] = None,
+    only: Optional[Iterable[str]] = None,
+    resume: bool = False,
+    tree: Optional[str] = None,
+) -> List[Tuple[str, List[str], Optional[str]]]:
+    """
+    [(name, cmd, skip_reason)] for every step; skip_reason is None for the
+    steps to run. Raises ValueError for an unknown step name.
+    """
+    wanted = [s.strip() for s in only or [] if s.strip()]
+    for name in wanted + ([start_at] if start_at else []):
+        if _index_of(steps, name) is None:
+            raise ValueError(f"unknown step '{name}' (known: {', '.join(n for n, _ in steps)})")
+
+    state = load_state(runner) if resume else {"failed_step": None, "steps": {}}
+    start = (_index_of(steps, start_at) or 0) if start_at else 0
+    failed = (state.get("failed_step") or "").lower()
+
+    plan = []
+    for i, (name, cmd) in enumerate(steps):
+        reason = None
+        if wanted:
+            if all(name.lower() != w.lower() for w in wanted):
+                reason = "not selected"
+        elif i < start:
+            reason = f"before '{steps[start][0]}'"
+        elif resume and name.lower() != failed:
+            # The failed step always reruns; any other step only if it has no pass on these inputs.
+            prev = state["steps"].get(name) or {}
+            fp = fingerprint(cmd, tree)
+            if prev.get("ok") and fp is not None and prev.get("fingerprint") == fp:
+                reason = UNCHANGED
+        plan.append((name, list(cmd), reason))
+    return plan
+
+
+def unverified(plan: Sequence[Tuple[str, List[str], Optional[str]]]) -> List[str]:
+    """Steps the plan skips without a recorded pass on the current inputs."""
+    return [name for name, _, reason in plan if reason is not None and reason != UNCHANGED]
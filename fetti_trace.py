@@ -0,0 +1,205 @@
+"""
+Fetti Trace – spans in Chrome trace-event format (Perfetto, chrome://tracing).
+
+  python3 fetti.py --trace out.json run          # or FETTI_TRACE=out.json
+
+Instrumented code wraps its phases in spans:
+
+  with fetti_trace.span("model", cat="model", provider="gemini"):
+      ...
+
+  @fetti_trace.traced("build_repo_hint")
+  def build_repo_hint(): ...
+
+When tracing is off (no FETTI_TRACE), span() returns a shared no-op object
+and costs one global lookup and a call.
+
+Child processes inherit FETTI_TRACE and trace themselves: each writes its
+events to <out>.parts/<pid>.json on exit, and the process that started the
+trace (FETTI_TRACE_ROOT) merges every part into <out> when it exits.
+Timestamps come from CLOCK_MONOTONIC, which all processes on the machine
+share, so a child's spans nest under the parent span that spawned it.
+npm and git are not traced themselves; their callers wrap them in "cmd"
+spans.
+"""
+
+from __future__ import annotations
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+TRACE_ENV = "FETTI_TRACE"
+ROOT_ENV = "FETTI_TRACE_ROOT"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_PATH: Optional[Path] = None
+_EVENTS: List[Dict[str, Any]] = []
+_LOCK = threading.Lock()
+
+
+def _now_us() -> float:
+    return time.monotonic_ns() / 1000.0
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+    def set(self, **args: Any) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name: str, cat: str, args: Dict[str, Any]) -> None:
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        end = _now_us()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _EVENTS.append({
+            "name": self.name,
+            "cat": self.cat,
+            "ph": "X",
+            "ts": self.start,
+            "dur": end - self.start,
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+            "args": self.args,
+        })
+
+    def set(self, **args: Any) -> None:
+        """Attach results (exit codes, sizes) to the span before it closes."""
+        self.args.update(args)
+
+
+def enabled() -> bool:
+    return _PATH is not None
+
+
+def span(name: str, cat: str = "fetti", **args: Any) -> Any:
+    """Context manager timing the block as one complete ("X") event."""
+    if _PATH is None:
+        return _NO_SPAN
+    return _Span(name, cat, args)
+
+
+def traced(name: Optional[str] = None, cat: str = "fetti") -> Callable[[F], F]:
+    """Decorator form of span(); the name defaults to the function's."""
+    def wrap(func: F) -> F:
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def inner(*a: Any, **kw: Any) -> Any:
+            if _PATH is None:
+                return func(*a, **kw)
+            with _Span(label, cat, {}):
+                return func(*a, **kw)
+        return inner  # type: ignore[return-value]
+    return wrap
+
+
+def instant(name: str, cat: str = "fetti", **args: Any) -> None:
+    if _PATH is not None:
+        _EVENTS.append({
+            "name": name, "cat": cat, "ph": "i", "s": "p", "ts": _now_us(),
+            "pid": os.getpid(), "tid": threading.get_native_id(), "args": args,
+        })
+
+
+def untraced_env() -> Dict[str, str]:
+    """os.environ without the trace variables, for long-lived detached processes."""
+    return {k: v for k, v in os.environ.items() if k not in (TRACE_ENV, ROOT_ENV)}
+
+
+def _metadata() -> List[Dict[str, Any]]:
+    label = Path(sys.argv[0]).name if sys.argv and sys.argv[0] else "python"
+    if label in ("-c", ""):
+        label = "python"
+    return [
+        {"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": f"{label} ({os.getpid()})"}},
+        {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": threading.get_native_id(),
+         "args": {"name": "main"}},
+    ]
+
+
+def _parts_dir(path: Path) -> Path:
+    return path.with_name(path.name + ".parts")
+
+
+def start(path: Optional[str] = None) -> None:
+    """
+    Enable tracing for this process (and, via the environment, its
+    children). The first process to call this becomes the root and writes
+    the merged trace file at exit.
+    """
+    global _PATH
+    raw = path or os.environ.get(TRACE_ENV)
+    if not raw or _PATH is not None:
+        return
+    _PATH = Path(raw).resolve()
+    os.environ[TRACE_ENV] = str(_PATH)
+    if os.environ.get(ROOT_ENV) is None:
+        os.environ[ROOT_ENV] = str(os.getpid())
+    _EVENTS.extend(_metadata())
+    atexit.register(finish)
+
+
+def finish() -> None:
+    """Write this process's events (a part, or the merged trace for the root)."""
+    global _PATH
+    path = _PATH
+    if path is None:
+        return
+    _PATH = None
+    with _LOCK:
+        events = list(_EVENTS)
+        _EVENTS.clear()
+    parts = _parts_dir(path)
+    if os.environ.get(ROOT_ENV) != str(os.getpid()):
+        parts.mkdir(parents=True, exist_ok=True)
+        (parts / f"{os.getpid()}.json").write_text(json.dumps(events, default=str))
+        return
+
+    if parts.is_dir():
+        for part in sorted(parts.glob("*.json")):
+            try:
+                events.extend(json.loads(part.read_text()))
+            except (OSError, ValueError):
+                pass
+            part.unlink(missing_ok=True)
+        try:
+            parts.rmdir()
+        except OSError:
+            pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str))
+    print(f"[TRACE] Wrote {len(events)} events to {path}", file=sys.stderr)
+
+
+start()